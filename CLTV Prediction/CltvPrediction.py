@@ -14,15 +14,17 @@
 import pandas as pd
 import numpy as np
 import datetime as dt
-import matplotlib.pyplot as plt
-from lifetimes import BetaGeoFitter
-from lifetimes import GammaGammaFitter
-from lifetimes.plotting import plot_period_transactions
 
 pd.set_option('display.max_columns', None)
 pd.set_option('display.width', 500)
 pd.set_option('display.float_format', lambda x: '%.4f' % x)
 from sklearn.preprocessing import MinMaxScaler
+from crmUtils.loader import load_online_retail
+from crmUtils.summary import cltv_summary
+from crmUtils.bgnbd import BGNBDFitter
+from crmUtils.gamma_gamma import GammaGammaModel
+from crmUtils.prediction import predict_horizons
+from crmUtils.pipeline import cltv_p_dag
 
 def outlier_thresholds(dataframe, variable):
     quartile1 = dataframe[variable].quantile(0.01)
@@ -39,7 +41,7 @@ def replace_with_thresholds(dataframe, variable):
 
 
 
-df_ = pd.read_excel(r"C:\Users\alioz\Documents\crmAnalytics-221211-020816\crmAnalytics\datasets\online_retail_II.xlsx", sheet_name="Year 2010-2011")
+df_ = load_online_retail(r"C:\Users\alioz\Documents\crmAnalytics-221211-020816\crmAnalytics\datasets\online_retail_II.xlsx", sheet_name="Year 2010-2011")
 df = df_.copy()
 df.head()
 df_.describe().T
@@ -69,60 +71,44 @@ today_date = dt.datetime(2011,12,11)
 #frequency: Total number of recurring purchases (frequency must be bigger than 1)
 #monetary: Average earning per purchase
 
-cltv_df = df.groupby("Customer ID").agg({"InvoiceDate": [
-lambda date: (date.max() - date.min()).days,
-lambda date: (today_date - date.min()).days],
-"Invoice": lambda date: date.nunique(),
-"TotalPrice": lambda price: price.sum()})
-
-cltv_df.columns = cltv_df.columns.droplevel(0)
-
-cltv_df.columns = ["recency", "T", "frequency", "monetary"]
-cltv_df["monetary"] = cltv_df["monetary"] / cltv_df["frequency"]
+# One pass over the transactions instead of the lambda groupby, frequency > 1 only and weekly units in float32.
+# tests/test_summary.py checks it against the lambda version.
+cltv_df = cltv_summary(df, today_date, freq="W")
 cltv_df.describe().T
-
-cltv_df = cltv_df[cltv_df["frequency"] > 1]
-cltv_df["recency"] = cltv_df["recency"] / 7
-cltv_df["T"] = cltv_df["T"] / 7
 #endregion
 
 #region Establishment of BG-NBD Model
 
-bgf = BetaGeoFitter(penalizer_coef=0.001)
+# In-project fitter: unique (frequency, recency, T) tuples, analytic gradients and L-BFGS.
+# It reaches the lifetimes BetaGeoFitter optimum (tests/test_bgnbd.py)
+bgf = BGNBDFitter(penalizer_coef=0.001)
 
 bgf.fit(cltv_df["frequency"], cltv_df["recency"], cltv_df["T"])
 
-### Who are the 10 customers we expect to purchase the most within 1 week?
+# The 1 week, 1 month and 3 month expected purchases from one shared evaluation of the BG/NBD terms
+purchases = predict_horizons(bgf, None, cltv_df["frequency"], cltv_df["recency"], cltv_df["T"], cltv_df["monetary"],
+                             horizons=(1, 4, 4*3), clv_months=())
 
-bgf.conditional_expected_number_of_purchases_up_to_time(1,
-                                                        cltv_df["frequency"],
-                                                        cltv_df["recency"],
-                                                        cltv_df["T"]).sort_values(ascending=False).head(10)
+### Who are the 10 customers we expect to purchase the most within 1 week?
 
-bgf.predict(1, cltv_df["T"]).sort_values(ascending=False).head(10)
+purchases["expected_purc_1"].sort_values(ascending=False).head(10)
 
-cltv_df["expected_purc_1_week"] = bgf.predict(1,
- cltv_df["frequency"],
- cltv_df["recency"],
-cltv_df["T"])
+cltv_df["expected_purc_1_week"] = purchases["expected_purc_1"]
 
-cltv_df["expected_purc_1_month"] = bgf.predict(4, cltv_df["frequency"], cltv_df["recency"], cltv_df["T"])
+cltv_df["expected_purc_1_month"] = purchases["expected_purc_4"]
 
-bgf.predict(4, cltv_df["frequency"], cltv_df["recency"], cltv_df["T"]).sum()
+cltv_df["expected_purc_1_month"].sum()
 
 ##
-bgf.predict(4*3, cltv_df["frequency"], cltv_df["recency"], cltv_df["T"]).sum()
-cltv_df["expected_purc_3_month"] = bgf.predict(4*3, cltv_df["frequency"], cltv_df["recency"], cltv_df["T"])
-
-## Eveluate of Predict Results
-
-plot_period_transactions(bgf)
-plt.show()
+cltv_df["expected_purc_3_month"] = purchases["expected_purc_12"]
+cltv_df["expected_purc_3_month"].sum()
 #endregion
 
 #region Establishment of Gamma-Gamma Model
 
-ggf = GammaGammaFitter(penalizer_coef=0.001)
+# Fitted on unique (frequency, monetary) pairs with weights, the GammaGammaFitter optimum
+# (tests/test_gamma_gamma.py)
+ggf = GammaGammaModel(penalizer_coef=0.001)
 ggf.fit(cltv_df["frequency"], cltv_df["monetary"])
 
 ggf.conditional_expected_average_profit( cltv_df["frequency"], cltv_df["monetary"]).sort_values(ascending=False).head(10)
@@ -134,12 +120,14 @@ cltv_df.sort_values("expected_average_profit", ascending=False).head(10)
 #endregion
 
 #region Calculation of CLTV with BG-NBD and Gamma-Gamma
-cltv = ggf.customer_lifetime_value(bgf,
-                                   cltv_df["frequency"], cltv_df["recency"], cltv_df["T"],
-                                   cltv_df["monetary"],
-                                   time=3,
-                                   freq="W",
-                                   discount_rate=0.01)
+# The discounted 3 month CLTV, the month by month sum of customer_lifetime_value in one vectorized pass
+cltv = predict_horizons(bgf, ggf,
+                        cltv_df["frequency"], cltv_df["recency"], cltv_df["T"],
+                        cltv_df["monetary"],
+                        horizons=(),
+                        clv_months=(3,),
+                        freq="W",
+                        discount_rate=0.01)["clv_3"].rename("clv")
 
 cltv.head()
 cltv.reset_index()
@@ -158,60 +146,50 @@ cltv_final.groupby("segment").agg({"count", "mean", "sum"})
 
 #region Functioning whole Process
 
-def create_cltv_p(dataframe, month = 3):
-    dataframe.dropna(inplace=True)
-    dataframe = dataframe[~dataframe["Invoice"].str.contains("C", na=False)]
-    dataframe = dataframe[dataframe["Quantity"] > 0]
-    dataframe = dataframe[dataframe["Price"] > 0]
-    replace_with_thresholds(dataframe, "Quantity")
-    replace_with_thresholds(dataframe, "Price")
-    dataframe["TotalPrice"] = dataframe["Quantity"] * dataframe["Price"]
-    today_date = dt.datetime(2011,12,11)
-
-    cltv_df = dataframe.groupby("Customer ID").agg({"InvoiceDate": [
-    lambda date: (date.max() - date.min()).days,
-    lambda date: (today_date - date.min()).days],
-    "Invoice": lambda date: date.nunique(),
-    "TotalPrice": lambda price: price.sum()})
-
-    cltv_df.columns = cltv_df.columns.droplevel(0)
-    cltv_df.columns = ["recency", "T", "frequency", "monetary"]
-    cltv_df["monetary"] = cltv_df["monetary"] / cltv_df["frequency"]
-    cltv_df = cltv_df[cltv_df["frequency"] > 1]
-    cltv_df["recency"] = cltv_df["recency"] / 7
-    cltv_df["T"] = cltv_df["T"] / 7
-
-    bgf = BetaGeoFitter(penalizer_coef=0.001)
-    bgf.fit(cltv_df["frequency"], cltv_df["recency"], cltv_df["T"])
-
-    cltv_df["expected_purc_1_week"] = bgf.predict(1,
-                                                  cltv_df["frequency"],
-                                                     cltv_df["recency"],
-                                                     cltv_df["T"])
-
-    cltv_df["expected_purc_1_month"] = bgf.predict(4, cltv_df["frequency"], cltv_df["recency"], cltv_df["T"])
-
-    cltv_df["expected_purc_3_month"] = bgf.predict(4*3, cltv_df["frequency"], cltv_df["recency"], cltv_df["T"])
-
-    ggf = GammaGammaFitter(penalizer_coef=0.001)
-    ggf.fit(cltv_df["frequency"], cltv_df["monetary"])
-    cltv_df["expected_average_profit"] = ggf.conditional_expected_average_profit(cltv_df["frequency"], cltv_df["monetary"])
-
-    cltv = ggf.customer_lifetime_value(bgf,
-                                       cltv_df["frequency"], cltv_df["recency"], cltv_df["T"],
-                                       cltv_df["monetary"],
-                                       time=month,
-                                       freq="W",
-                                       discount_rate=0.01)
-
-    cltv = cltv.reset_index()
-
-    cltv_final = cltv_df.merge(cltv, on="Customer ID", how="left")
-    cltv_final["segment"] = pd.qcut(cltv_final["clv"], 4, labels=["D", "C", "B", "A"])
-
-    return cltv_final
-df = df_.copy()
-
-cltv_final2 = create_cltv_p(df)
-
-cltv_final2.to_csv("cltv_prediction.csv")
\ No newline at end of file
+# create_cltv_p is a DAG of the stages clean -> outliers -> summary -> fit -> predict -> segment (crmUtils.pipeline).
+# Stage results are cached by content, a rerun with another month only predicts and segments again,
+# another penalizer_coef refits. cltv_p_dag(cache_dir=".crm_cache/cltv_p") also keeps them on disk.
+cltv_p_stages = cltv_p_dag()
+
+def create_cltv_p(dataframe, month = 3, n_workers = 1, registry = None, profiler = None):
+    # One combined mask and both outlier thresholds from one quantile call, TotalPrice is added after the capping
+    # Per-customer summary, hash-partitioned by Customer ID over n_workers processes
+    # (n_workers=None uses every core, on Windows call it under if __name__ == "__main__":)
+    # With a registry, stored parameters are reused when the summary table and the penalizer did not change
+    # All horizons and the discounted CLTV come from one shared evaluation of the BG/NBD terms
+    return cltv_p_stages.run(dataframe, month=month, n_workers=n_workers, registry=registry, profiler=profiler)
+
+cltv_final2 = create_cltv_p(df_)
+
+# With a model registry, a rerun on the same data loads the fitted parameters instead of fitting again
+# from crmUtils.registry import ModelRegistry, models_from_record
+# cltv_final2 = create_cltv_p(df_, registry=ModelRegistry("models"))
+
+# Where the time of a run goes, one log line per stage and one JSON line per stage in profile.jsonl:
+# from crmUtils.profiling import Profiler, LogSink, JSONSink, StatsSink
+# stats = StatsSink()
+# cltv_final2 = create_cltv_p(df_, profiler=Profiler(LogSink(), JSONSink("profile.jsonl"), stats))
+# stats.summary()
+# The load can be timed the same way: df_ = Profiler(LogSink()).call("load", load_online_retail, path, ...)
+
+# Scenarios: each penalizer is fitted once (in parallel), every month / discount rate / margin reuses the fits
+# from crmUtils.sweep import cltv_sweep, sweep_summary
+# summary = cltv_p_stages.run(df_, target="summary")
+# sweep = cltv_sweep(summary["frequency"], summary["recency"], summary["T"], summary["monetary"],
+#                    months=(1, 3, 6, 12), discount_rates=(0.0, 0.01, 0.02), penalizers=(0.001, 0.01, 0.1),
+#                    profit_margins=(0.1, 0.2, 1.0), n_workers=None)
+# sweep_summary(sweep)
+
+# Scoring one customer at checkout from the stored parameters and frozen quartiles of the segments:
+# from crmUtils.scoring import CLTVScorer, serve, benchmark_latency
+# bgf, ggf = models_from_record(ModelRegistry("models").load("online_retail"))
+# scorer = CLTVScorer.from_models(bgf, ggf, cltv_final2["clv"], month=3)
+# scorer.save("cltv_scorer.json")
+# CLTVScorer.load("cltv_scorer.json").score(frequency=5, recency=30.5, T=52.0, monetary=180.0)
+# serve(scorer, port=8000)   POST /score with the same four fields, single values or lists
+# benchmark_latency(scorer)
+
+cltv_final2.to_csv("cltv_prediction.csv")
+# Columnar export, one Parquet file per segment:
+# from crmUtils.export import export_frame
+# export_frame(cltv_final2, "cltv_prediction", format="parquet", partition_by="segment")
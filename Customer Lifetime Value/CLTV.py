@@ -17,11 +17,14 @@ import pandas as pd
 import numpy as np
 from joblib import PrintTime
 from sklearn.preprocessing import MinMaxScaler
+from crmUtils.loader import load_online_retail
+from crmUtils.streaming import stream_state, cltv_c_from_state
+from crmUtils.pipeline import cltv_c_dag
 pd.set_option('display.max_columns', None)
 pd.set_option('display.max_rows', 20)
 pd.set_option('display.float_format', lambda x: '%.5f' % x)
 
-df_ = pd.read_excel(r"C:\Users\alioz\Documents\crmAnalytics-221211-020816\crmAnalytics\datasets\online_retail_II.xlsx", sheet_name="Year 2009-2010")
+df_ = load_online_retail(r"C:\Users\alioz\Documents\crmAnalytics-221211-020816\crmAnalytics\datasets\online_retail_II.xlsx", sheet_name="Year 2009-2010", compact=True, verbose=True)
 df = df_.copy()
 df.head()
 
@@ -90,42 +93,28 @@ cltv_c.to_csv("cltv_c.csv")
 
 #region  BONUS: Functioning all operations
 
-def create_cltv_c(dataframe, profit=10):
-    # Data Preparation
-    dataframe.dropna(inplace=True)
-    dataframe = dataframe[~dataframe["Invoice"].str.contains("C", na=False)]
-    dataframe = dataframe[dataframe["Quantity"] > 0]
-    dataframe["TotalPrice"] = dataframe["Quantity"] * dataframe["Price"]
-    cltv_c = dataframe.groupby("Customer ID").agg({"Invoice": lambda x: x.nunique(),
-                                                   "Quantity": lambda x: x.sum(),
-                                                   "TotalPrice": lambda x: x.sum()})
-    cltv_c.columns = ["total_transaction", "total_unit", "total_price"]
-
-    # avg_order_value
-    cltv_c["average_order_value"] = cltv_c["total_price"] / cltv_c["total_transaction"]
-
-    # purchase_frequency
-    cltv_c["purchase_frequency"] = cltv_c["total_transaction"] / cltv_c.shape[0]
-
-    # repeat rate & churn rate
-    repeat_rate = cltv_c[cltv_c.total_transaction > 1].shape[0] / cltv_c.shape[0]
-    churnRate = 1 - repeat_rate
-
-    # profit_margin
-    cltv_c["profit_margin"] = cltv_c["total_price"] * profit
-
-    # Customer Value
-    cltv_c["customer_value"] = (cltv_c["average_order_value"] * cltv_c["purchase_frequency"])
-
-    # Customer Lifetime Value
-    cltv_c["cltv"] = (cltv_c["customer_value"] / churnRate) * cltv_c["profit_margin"]
-
-    # Segment
-    cltv_c["segment"] = pd.qcut(cltv_c["cltv"], 4, labels=["D", "C", "B", "A"])
-
-    return cltv_c
-df = df_.copy()
-
-clv = create_cltv_c(df)
+# create_cltv_c is a DAG of the stages clean -> aggregate -> value (crmUtils.pipeline), value is
+# cltv_c_from_state, the same table and segments as create_cltv_c_streaming.
+# Stage results are cached by content, a rerun with another profit only recomputes value.
+cltv_c_stages = cltv_c_dag()
+
+def create_cltv_c(dataframe, profit=10, n_workers=1, net_cancelled=False, profiler=None):
+    # Data Preparation, one combined mask, the input frame is not modified
+    # net_cancelled=True subtracts the returns from the purchases they cancel instead of only dropping them
+    # Per-customer aggregates, hash-partitioned by Customer ID over n_workers processes
+    # (n_workers=None uses every core, on Windows call it under if __name__ == "__main__":)
+    # then average order value, purchase frequency, churn rate, profit margin, customer value, cltv and segment
+    return cltv_c_stages.run(dataframe, profit=profit, n_workers=n_workers, net_cancelled=net_cancelled,
+                             profiler=profiler)
+
+def create_cltv_c_streaming(source, profit=10, chunksize=1000000):
+    # Same output as create_cltv_c, the source (CSV or Parquet path) is read in chunks
+    # and only a per-customer state is kept in memory
+    state = stream_state(source, chunksize=chunksize, positive_quantity=True)
+    return cltv_c_from_state(state, profit=profit)
+
+clv = create_cltv_c(df_)
+
+# clv_stream = create_cltv_c_streaming(r"...\online_retail_II.parquet")
 
 #endregion
\ No newline at end of file
@@ -19,18 +19,22 @@ from itertools import groupby
 ### The dataset contains the sales of a UK-based online store between 01/12/2009 and 09/12/2011.
 
 import pandas as pd
-df = pd.read_excel(r"C:\Users\alioz\Documents\crmAnalytics-221211-020816\crmAnalytics\datasets\online_retail_II.xlsx")
+from crmUtils.loader import load_online_retail
+from crmUtils.rfm import rfm_metrics, rfm_scores
+from crmUtils.streaming import stream_rfm_metrics
+from crmUtils.segments import SEG_MAP, assign_segments
+from crmUtils.pipeline import rfm_dag
+df = load_online_retail(r"C:\Users\alioz\Documents\crmAnalytics-221211-020816\crmAnalytics\datasets\online_retail_II.xlsx")
 #endregion
 
 #region Data Understanding
 
 import datetime as dt
-import pandas as pd
 pd.set_option('display.max_columns', None)
 # pd.set_option('display.max_rows', None)
 pd.set_option('display.float_format', lambda x: '%.5f' % x)
 
-df_ = pd.read_excel(r"C:\Users\alioz\Documents\crmAnalytics-221211-020816\crmAnalytics\datasets\online_retail_II.xlsx", sheet_name="Year 2009-2010")
+df_ = load_online_retail(r"C:\Users\alioz\Documents\crmAnalytics-221211-020816\crmAnalytics\datasets\online_retail_II.xlsx", sheet_name="Year 2009-2010", compact=True, verbose=True)
 df = df_.copy()
 df.head()
 df.shape
@@ -76,6 +80,11 @@ rfm.head()
 rfm.columns = ["Recency", "Frequency", "Monetary"]
 rfm.describe().T
 
+# Same metrics with built-in reductions only, the lambdas above run once per customer
+rfm_fast = rfm_metrics(df, today_date)
+pd.testing.assert_frame_equal(rfm_fast, rfm)
+pd.testing.assert_frame_equal(rfm_metrics(df, today_date, method="numpy"), rfm)
+
 rfm = rfm[rfm["Monetary"] > 0]
 
 #endregion
@@ -112,7 +121,10 @@ r'51': 'new_customers',
 r'[4-5][2-3]': 'potential_loyalists',
 r'5[4-5]': 'champions'}
 
-rfm["segment"] = rfm["RFM_Score"].replace(seg_map, regex=True)
+# Segments from a lookup table indexed by the integer scores, a categorical column.
+# tests/test_segments.py checks it against the regex replace on the score strings.
+rfm["segment"] = assign_segments(rfm["recency_score"], rfm["frequency_score"], seg_map=seg_map)
+
 rfm[["segment", "Recency",  "Frequency", "Monetary"]].groupby("segment").agg(["mean", "count"])
 
 rfm[rfm["segment"] == "need_attention"].head()
@@ -128,41 +140,32 @@ new_df.to_csv("new_customers.csv")
 
 #region Functioning Whole Process
 
-def create_rfm(dataframe, csv=False):
+# create_rfm is a DAG of the stages clean -> metrics -> scores -> segment (crmUtils.pipeline).
+# Stage results are cached by content, a rerun with another seg_map only segments again and
+# net_cancelled=True reruns every stage. rfm_dag(cache_dir=".crm_cache/rfm") also keeps them on disk.
+rfm_stages = rfm_dag()
+
+def create_rfm(dataframe, csv=False, net_cancelled=False, seg_map=SEG_MAP, profiler=None):
+
+ # DATA PREPARATION (ONE COMBINED MASK, THE INPUT FRAME IS NOT MODIFIED), RFM METRICS, RFM SCORES AND SEGMENTS
+ # net_cancelled=True SUBTRACTS THE RETURNS FROM THE PURCHASES THEY CANCEL INSTEAD OF ONLY DROPPING THEM
+ # SEGMENTS ARE LOOKED UP FROM THE INTEGER SCORES, NO SCORE STRINGS ARE BUILT
+ rfm = rfm_stages.run(dataframe, net_cancelled=net_cancelled, seg_map=seg_map, profiler=profiler)
+ if csv:
+  rfm.to_csv("rfm_scores.csv")
+
+ return rfm
 
- # DATA PREPARATION
- dataframe["TotalPrice"] = dataframe["Quantity"] * dataframe["Price"]
- dataframe.dropna(inplace=True)
- dataframe = dataframe[~dataframe["Invoice"].str.contains("C", na=False)]
+def create_rfm_streaming(source, csv=False, chunksize=1000000):
 
- # CALCULATING RFM METRICS
+ # SAME OUTPUT AS create_rfm, THE SOURCE (CSV OR PARQUET PATH) IS READ IN CHUNKS
+ # ONLY A PER-CUSTOMER STATE IS KEPT IN MEMORY
  today_date = dt.datetime(2011,12,11)
- rfm = dataframe.groupby("Customer ID").agg({"InvoiceDate": lambda InvoiceDate: (today_date - InvoiceDate.max()).days,
- "Invoice": lambda Invoice: Invoice.nunique(),
-  "TotalPrice": lambda TotalPrice: TotalPrice.sum()})
- rfm.columns = ["Recency", "Frequency", "Monetary"]
- rfm = rfm[rfm["Monetary"] > 0]
-
- # CALCULATING RFM SCORES
- rfm["recency_score"] = pd.qcut(rfm["Recency"], 5, labels=[5, 4, 3, 2, 1])
- rfm["frequency_score"] = pd.qcut(rfm["Frequency"].rank(method="first"), 5, labels=[1, 2, 3, 4, 5])
- rfm["monetary_score"] = pd.qcut(rfm["Monetary"], 5, labels=[1, 2, 3, 4, 5])
-
- # SCORES BE TRANSFORMED TO CATEGORIC VAL AND ADDED TO DF
- rfm["RFM_Score"] = (rfm["recency_score"].astype(str) +  rfm["frequency_score"].astype(str))
-
- # NAMING SEGMENTS
- seg_map = {r'[1-2][1-2]': 'hibernating',
-           r'[1-2][3-4]': 'at_Risk',
-                        r'[1-2]5': 'cant_loose',
-                        r'3[1-2]': 'about_to_sleep',
-                        r'33': 'need_attention',
-                        r'[3-4][4-5]': 'loyal_customers',
-                        r'41': 'promising',
-                        r'51': 'new_customers',
-                        r'[4-5][2-3]': 'potential_loyalists',
-                        r'5[4-5]': 'champions'}
- rfm["segment"] = rfm["RFM_Score"].replace(seg_map, regex=True)
+ rfm = stream_rfm_metrics(source, today_date, chunksize=chunksize)
+ rfm = rfm[rfm["Monetary"] > 0].copy()
+
+ # CALCULATING RFM SCORES AND NAMING SEGMENTS
+ rfm = rfm_scores(rfm)
  rfm = rfm[["segment", "Recency",  "Frequency", "Monetary"]]
  rfm.index = rfm.index.astype(int)
  if csv:
@@ -170,8 +173,25 @@ def create_rfm(dataframe, csv=False):
 
  return rfm
 
-df = df_.copy()
-rfm_new = create_rfm(df, csv=True)
+rfm_new = create_rfm(df_, csv=True)
+
+# rfm_stream = create_rfm_streaming(r"...\online_retail_II.parquet")
+
+# Columnar export, one Parquet file per segment, readable back with pd.read_parquet("rfm_scores"):
+# from crmUtils.export import export_frame, export_many
+# export_frame(rfm_new, "rfm_scores", format="parquet", partition_by="segment")
+# export_many({"rfm_scores": {"frame": rfm_new, "path": "rfm_scores", "format": "csv.zst"},
+#              "new_customers": {"frame": new_df, "path": "new_customers", "format": "parquet"}}, verbose=True)
+
+# Nightly runs only fold the new day of invoices into the saved per-customer state:
+# from crmUtils.state import CustomerStateStore
+# store = CustomerStateStore("customer_state.parquet")
+# store.update(todays_transactions).save()
+# rfm_new = store.rfm(dt.datetime(2011,12,11))
+
+# create_rfm only needs its columns, the others do not have to be read from the cache:
+# from crmUtils.loader import RFM_COLUMNS
+# df = load_online_retail(r"...\online_retail_II.xlsx", sheet_name="Year 2010-2011", columns=RFM_COLUMNS)
 #endregion
 
 
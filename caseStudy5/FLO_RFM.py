@@ -5,6 +5,10 @@
 import pandas as pd
 import numpy as np
 import datetime as dt
+from crmUtils.rfm import rfm_metrics
+from crmUtils.segments import assign_segments
+from crmUtils.categories import CategoryIndex
+from crmUtils.flo import flo_rfm_analysis, preprocess_flo
 pd.set_option('display.max_columns', None)
 pd.set_option('display.width', 500)
 pd.set_option('display.float_format', lambda x: '%.4f' % x)
@@ -106,15 +110,8 @@ def preprocess_flo_data(df):
     tuple: Processed DataFrame, channel distribution, top revenue customers, top order customers
     """
 
-    df["TotalPrice"] = df["customer_value_total_ever_offline"] + df["customer_value_total_ever_online"]
-    df["TotalOrder"] = df["order_num_total_ever_offline"] + df["order_num_total_ever_online"]
-
-    # Convert date columns to datetime
-    date_columns = ['first_order_date', 'last_order_date',
-                    'last_order_date_online', 'last_order_date_offline']
-    for col in date_columns:
-        df[col] = pd.to_datetime(df[col])
-    [col for col in df.columns if col in date_columns ]
+    # Totals and datetime dates (crmUtils.flo), the input frame is not modified
+    df = preprocess_flo(df)
 
     # Analyze distribution across shopping channels
     channel_distribution = df.groupby("order_channel").agg(
@@ -147,6 +144,18 @@ rfm = df.groupby("master_id").agg({
 rfm.head()
 rfm.columns = ["recency", "frequency", "monetary"]
 rfm.describe().T
+
+# Same metrics with built-in reductions only, the lambdas above run once per customer
+rfm_fast = rfm_metrics(df, today_date, customer_col="master_id", date_col="last_order_date",
+                       frequency_col="TotalOrder", monetary_col="TotalPrice", frequency_agg="sum",
+                       columns=("recency", "frequency", "monetary"))
+pd.testing.assert_frame_equal(rfm_fast, rfm)
+
+# flo_data_20k has one row per master_id, so the metrics are the columns themselves and no groupby is needed
+rfm_direct = rfm_metrics(df, today_date, customer_col="master_id", date_col="last_order_date",
+                         frequency_col="TotalOrder", monetary_col="TotalPrice", frequency_agg="sum",
+                         columns=("recency", "frequency", "monetary"), customer_level=True)
+pd.testing.assert_frame_equal(rfm_direct, rfm)
 #endregion
 
 
@@ -178,7 +187,10 @@ seg_map = {r'[1-2][1-2]': 'hibernating',
            r'[4-5][2-3]': 'potential_loyalists',
            r'5[4-5]': 'champions'}
 
-rfm["segment"] = rfm["RF_Score"].replace(seg_map, regex=True)
+# Segments from a lookup table indexed by the integer scores, a categorical column.
+# tests/test_segments.py checks it against the regex replace on the score strings.
+rfm["segment"] = assign_segments(rfm["recency_score"], rfm["frequency_score"], seg_map=seg_map)
+
 rfm = rfm[["segment", "recency",  "frequency", "monetary"]]
 
 #endregion
@@ -215,12 +227,24 @@ discount_target_customer = rfm_final[(rfm_final["segment"].isin(["cant_loose","h
 discount_target_customer_id = discount_target_customer["master_id"]
 
 discount_target_customer_id.to_csv("discount_target_customer_id.csv")
+
+# Same targets from category bitsets: the lists are parsed once and an inverted index keeps
+# the customers of each category, so a campaign no longer rescans every string
+categories = CategoryIndex(rfm_final["master_id"], rfm_final["interested_in_categories_12"])
+categories.postings.keys()
+np.testing.assert_array_equal(
+    categories.select(any_of=["KADIN"], within=rfm_final["segment"].isin(["loyal_customers", "champions"])),
+    new_brand_target_customer_id.to_numpy())
+np.testing.assert_array_equal(
+    categories.select(any_of=["ERKEK", "COCUK", "AKTIFCOCUK"],
+                      within=rfm_final["segment"].isin(["cant_loose", "hibernating", "new_customers"])),
+    discount_target_customer_id.to_numpy())
 #endregion
 
 
 # TASK 6: Functionalize the entire process
 
-def create_rfm_analysis(dataframe, csv_path=False):
+def create_rfm_analysis(dataframe, csv_path=False, profiler=None):
     """
     Perform complete RFM analysis on customer data:
     1. Preprocess the data
@@ -234,88 +258,21 @@ def create_rfm_analysis(dataframe, csv_path=False):
         Input dataframe containing customer purchase data
     csv_path: bool, optional
         Whether to save target customer lists to CSV files
+    profiler: crmUtils.profiling.Profiler, optional
+        Times each step
 
     Returns:
     --------
     tuple:
         processed_df: Processed dataframe with total metrics
-        rfm: RFM dataframe with segments
+        rfm: RFM dataframe with scores, RF_Score and segments
         new_brand_targets: Target customers for new women's brand
         discount_targets: Target customers for men's/children's discount
     """
 
-    # Copy the dataframe to avoid modifying the original
-    df = dataframe.copy()
-
-    # 1. Preprocess the data
-    # Calculate totals
-    df["TotalPrice"] = df["customer_value_total_ever_offline"] + df["customer_value_total_ever_online"]
-    df["TotalOrder"] = df["order_num_total_ever_offline"] + df["order_num_total_ever_online"]
-
-    # Convert date columns
-    date_columns = ['first_order_date', 'last_order_date',
-                    'last_order_date_online', 'last_order_date_offline']
-    for col in date_columns:
-        df[col] = pd.to_datetime(df[col])
-
-    # 2. Calculate RFM metrics
-    today_date = dt.datetime(2021, 6, 1)
-
-    rfm = df.groupby("master_id").agg({
-        "last_order_date": lambda date: (today_date - date.max()).days,
-        "TotalOrder": lambda order: order.sum(),
-        "TotalPrice": lambda price: price.sum()
-    })
-
-    rfm.columns = ["recency", "frequency", "monetary"]
-
-    # 3. Calculate RFM scores
-    rfm["recency_score"] = pd.qcut(rfm["recency"], 5, labels=[5, 4, 3, 2, 1])
-    rfm["frequency_score"] = pd.qcut(rfm["frequency"].rank(method="first"), 5, labels=[1, 2, 3, 4, 5])
-    rfm["monetary_score"] = pd.qcut(rfm["monetary"], 5, labels=[1, 2, 3, 4, 5])
-
-    rfm["RF_Score"] = (rfm["recency_score"].astype(str) +
-                       rfm["frequency_score"].astype(str))
-
-    # 4. Define segments
-    seg_map = {
-        r'[1-2][1-2]': 'hibernating',
-        r'[1-2][3-4]': 'at_Risk',
-        r'[1-2]5': 'cant_loose',
-        r'3[1-2]': 'about_to_sleep',
-        r'33': 'need_attention',
-        r'[3-4][4-5]': 'loyal_customers',
-        r'41': 'promising',
-        r'51': 'new_customers',
-        r'[4-5][2-3]': 'potential_loyalists',
-        r'5[4-5]': 'champions'
-    }
-
-    rfm["segment"] = rfm["RF_Score"].replace(seg_map, regex=True)
-
-    # 5. Merge with original data for category information
-    rfm_final = rfm.merge(df[["master_id", "interested_in_categories_12"]],
-                          on="master_id", how="left")
-
-    # 6. Generate target customer lists
-    # New women's brand targets
-    new_brand_targets = rfm_final[
-        (rfm_final["segment"].isin(["loyal_customers", "champions"])) &
-        (rfm_final["interested_in_categories_12"].str.contains("KADIN"))
-        ]["master_id"]
-
-    # Discount targets
-    discount_targets = rfm_final[
-        (rfm_final["segment"].isin(["cant_loose", "hibernating", "new_customers"])) &
-        (rfm_final["interested_in_categories_12"].str.contains("ERKEK|COCUK|AKTIFCOCUK", na=False))
-        ]["master_id"]
-
-    # Save to CSV if requested
-    if csv_path:
-        new_brand_targets.to_csv("new_brand_target_customer_id.csv", index=False)
-        discount_targets.to_csv("discount_target_customer_id.csv", index=False)
-
-    return df, rfm_final, new_brand_targets, discount_targets
+    # Preprocessing, customer-level RFM metrics, scores, segments from the integer scores and the
+    # campaign targets from category bitsets, every step a stage of the profiler (crmUtils.flo)
+    return flo_rfm_analysis(dataframe, csv_path=csv_path, profiler=profiler)
 
 # Example usage:
 # df_ = pd.read_csv("flo_data_20k.csv")
@@ -5,9 +5,11 @@ import pandas as pd
 import numpy as np
 import datetime as dt
 import matplotlib.pyplot as plt
-from lifetimes import BetaGeoFitter
-from lifetimes import GammaGammaFitter
-from lifetimes.plotting import plot_period_transactions
+from crmUtils.bgnbd import BGNBDFitter
+from crmUtils.gamma_gamma import GammaGammaModel
+from crmUtils.prediction import predict_horizons
+from crmUtils.outliers import OutlierCapper
+from crmUtils.campaigns import CampaignEngine
 
 pd.set_option('display.max_columns', None)
 pd.set_option('display.width', 500)
@@ -77,10 +79,12 @@ def replace_with_thresholds(dataframe, variable):
 
 #region 3. Suppress outlier values, if any, for the variables "order_num_total_ever_online", "order_num_total_ever_offline", "customer_value_total_ever_offline", "customer_value_total_ever_online"
 
-replace_with_thresholds(df, "order_num_total_ever_online")
-replace_with_thresholds(df, "order_num_total_ever_offline")
-replace_with_thresholds(df, "customer_value_total_ever_offline")
-replace_with_thresholds(df, "customer_value_total_ever_online")
+# The four columns are capped with one quantile call, the rounded limits keep the order counts integer.
+# capper.save("flo_thresholds.json") lets later snapshots be capped with the same limits.
+capper = OutlierCapper(round_limits=True)
+df = capper.fit_transform(df, ["order_num_total_ever_online", "order_num_total_ever_offline",
+                               "customer_value_total_ever_offline", "customer_value_total_ever_online"])
+capper.thresholds_
 
 #endregion
 
@@ -126,21 +130,30 @@ cltv_df = (pd.DataFrame(
 # TASK 3: Establishing BG/NBD, Gamma-Gamma Models, Calculating CLTV
 #region 1. Fit the BG/NBD model.
 
-bgf = BetaGeoFitter(penalizer_coef=0.001)
+# In-project fitter: unique (frequency, recency, T) tuples, analytic gradients and L-BFGS.
+# It reaches the lifetimes BetaGeoFitter optimum (tests/test_bgnbd.py)
+bgf = BGNBDFitter(penalizer_coef=0.001)
 bgf.fit(cltv_df["frequency"], cltv_df["recency_cltv_weekly"], cltv_df["T_weekly"])
+
+# The 3 and 6 month expected sales from one shared evaluation of the BG/NBD terms
+sales = predict_horizons(bgf, None, cltv_df["frequency"], cltv_df["recency_cltv_weekly"], cltv_df["T_weekly"],
+                         cltv_df["monetary_cltv_avg"], horizons=(12, 24), clv_months=(), freq="W")
+
 # a. Predict expected purchases from customers within 3 months and add to CLTV dataframe as exp_sales_3_month.
 
-cltv_df["exp_sales_3_month"] = bgf.predict(12, cltv_df["frequency"], cltv_df["recency_cltv_weekly"], cltv_df["T_weekly"])
+cltv_df["exp_sales_3_month"] = sales["expected_purc_12"]
 
 # b. Predict expected purchases from customers within 6 months and add to CLTV dataframe as exp_sales_6_month.
 
-cltv_df["exp_sales_6_month"] = bgf.predict(24, cltv_df["frequency"], cltv_df["recency_cltv_weekly"], cltv_df["T_weekly"])
+cltv_df["exp_sales_6_month"] = sales["expected_purc_24"]
 
 #endregion
 
 #region 2. Fit the Gamma-Gamma model. Predict customers' expected average value and add to CLTV dataframe as exp_average_value.
 
-ggf = GammaGammaFitter(penalizer_coef=0.001)
+# Fitted on unique (frequency, monetary) pairs with weights, the GammaGammaFitter optimum
+# (tests/test_gamma_gamma.py)
+ggf = GammaGammaModel(penalizer_coef=0.001)
 ggf.fit(cltv_df["frequency"], cltv_df["monetary_cltv_avg"])
 
 cltv_df["exp_average_value"] = ggf.conditional_expected_average_profit(cltv_df["frequency"], cltv_df["monetary_cltv_avg"]).sort_values(ascending=False).head(10)
@@ -148,14 +161,16 @@ cltv_df["exp_average_value"] = ggf.conditional_expected_average_profit(cltv_df["
 #endregion
 
 #region 3. Calculate 6-month CLTV and add to dataframe as cltv.
-calc_cltv = ggf.customer_lifetime_value(bgf,
-                                         cltv_df["frequency"],
-                                         cltv_df["recency_cltv_weekly"],
-                                         cltv_df["T_weekly"],
-                                         cltv_df["monetary_cltv_avg"],
-                                         time=6,
-                                        freq="W",
-                                        discount_rate = 0.01)
+# The month by month discounted sum of customer_lifetime_value in one vectorized pass
+calc_cltv = predict_horizons(bgf, ggf,
+                             cltv_df["frequency"],
+                             cltv_df["recency_cltv_weekly"],
+                             cltv_df["T_weekly"],
+                             cltv_df["monetary_cltv_avg"],
+                             horizons=(),
+                             clv_months=(6,),
+                             freq="W",
+                             discount_rate = 0.01)["clv_6"]
 
 cltv_df["cltv"] = calc_cltv
 
@@ -173,6 +188,9 @@ cltv_df.reset_index()
 
 cltv_df["cltv_segment"] = pd.qcut(cltv_df["cltv"], 4, ["D", "C", "B", "A"])
 
+# The whole process above is one function, crmUtils.flo.flo_cltv_prediction(df_, month=6).
+# tests/test_flo.py checks it against these steps with the lifetimes models.
+
 # 2. Provide brief 6-month action recommendations to management for 2 groups of your choice from the 4 groups
 
 #region 1. VIP Programme for High Value and Frequent Shoppers
@@ -189,12 +207,10 @@ cltv_df["monetary_cltv_avg"].describe()
 # 75%  182.4500
 
 # In the ‘A’ segment, we select customers who shop frequently and spend more than 75 percent of the average
-vip_customers = cltv_df[(cltv_df['cltv_segment'] == 'A') &
-                   (cltv_df['frequency'] > cltv_df['frequency'].median()) &
-                   (cltv_df['monetary_cltv_avg'] > 182.4500)]
-
-# We save VIP customer ids to CSV file
-vip_customers['customer_id'].to_csv('vip_program_customers.csv', index=False)
+vip_campaign = {"name": "vip_program_customers",
+                "where": [["cltv_segment", "==", "A"],
+                          ["frequency", ">", "median"],
+                          ["monetary_cltv_avg", ">", 182.4500]]}
 
 #endregion
 
@@ -212,9 +228,20 @@ frequency_threshold = 2  # Must have made at least 2 purchases.
 loyal_segment = ['A', 'B']  # Loyal Customers
 
 # We are choosing new customers.
-new_customers = cltv_df[(cltv_df['recency_cltv_weekly'] <= recent_threshold) &
-                   (cltv_df['frequency'] >= frequency_threshold) &
-                   (~cltv_df['cltv_segment'].isin(loyal_segment))]
+welcome_campaign = {"name": "new_customer_welcome_campaign",
+                    "where": [["recency_cltv_weekly", "<=", recent_threshold],
+                              ["frequency", ">=", frequency_threshold],
+                              ["cltv_segment", "not in", loyal_segment]]}
+#endregion
+
+
+#region 5. Evaluate the campaigns in one batch and save their customer ids
+# The campaigns are declarative definitions, new campaigns are new entries (or a JSON file read with
+# crmUtils.campaigns.load_campaigns), not new filtering code
+campaigns = [vip_campaign, welcome_campaign]
+engine = CampaignEngine(cltv_df, "customer_id")
 
-new_customers['customer_id'].to_csv('new_customer_welcome_campaign.csv', index=False)
+# One CSV file of customer ids per campaign: vip_program_customers.csv and new_customer_welcome_campaign.csv
+engine.export(campaigns, ".", format="csv")
+# engine.run(campaigns) returns the ids without writing them, format="parquet" writes Parquet files
 #endregion
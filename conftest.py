@@ -0,0 +1,2 @@
+# pytest puts the directory of this file on sys.path, so a plain `pytest` from the repository root
+# imports crmUtils like `python -m pytest` does.
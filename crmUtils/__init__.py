@@ -0,0 +1 @@
+"""Shared helpers for the RFM and CLTV scripts of this repository."""
@@ -0,0 +1,252 @@
+###############################################################
+# End-to-End Benchmarks of the RFM and CLTV Pipelines
+###############################################################
+
+# Runs create_rfm, create_cltv_c and create_cltv_p (the DAGs of crmUtils.pipeline), create_rfm_analysis and
+# the FLO CLTV prediction (crmUtils.flo) on synthetic data of 10k, 1M or 50M rows (crmUtils.synthetic).
+# These are the functions the scripts call, so a slowdown or a wrong result in them shows up here.
+# Every stage they run under their profiler is recorded with its wall time, CPU time, peak RSS and
+# rows in / out (crmUtils.profiling), next to a load stage, an export stage and a "pipeline" stage
+# timing the whole function call. The data is written to Parquet once and the load stage reads it back,
+# which is what load_online_retail does on a warm cache.
+# The results are written to a JSON file, compare() lines up two of them, e.g. of two commits.
+#
+# python -m crmUtils.benchmark --sizes 10k 1M
+# python -m crmUtils.benchmark --sizes 10k 1M --compare benchmark_results/<baseline>.json
+#
+# 50M rows of transactions take about 2 GB in memory and the cleaned copies and sort orders several
+# times that, so run the 50M size on a machine with 16 GB or more.
+
+import argparse
+import datetime as dt
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from crmUtils.export import export_frame, export_many
+from crmUtils.flo import flo_cltv_prediction, flo_rfm_analysis
+from crmUtils.loader import RFM_COLUMNS
+from crmUtils.pipeline import cltv_c_dag, cltv_p_dag, rfm_dag
+from crmUtils.profiling import Profiler
+from crmUtils.synthetic import flo_customers, online_retail_transactions
+
+SIZES = {"10k": 10_000, "1M": 1_000_000, "50M": 50_000_000}
+
+
+class BenchmarkRun:
+    """
+    Collects one crmUtils.profiling record per executed stage.
+
+    Parameters:
+    -----------
+    pipeline, size: str
+        Labels of the records, e.g. "rfm" and "1M"
+    """
+
+    def __init__(self, pipeline, size):
+        self.pipeline = pipeline
+        self.size = size
+        self.records = []
+        self.profiler = Profiler(self._record, pipeline=pipeline, size=size)
+
+    def _record(self, record):
+        # The pipeline functions bind their own name (e.g. create_rfm), the records keep the benchmark's
+        self.records.append({**record, "pipeline": self.pipeline})
+
+    def stage(self, name, func, *args, **kwargs):
+        """Run func(*args, **kwargs) as the stage name and return its result."""
+        gc.collect()
+        return self.profiler.call(name, func, *args, **kwargs)
+
+
+def rfm_pipeline(run, path, out):
+    """create_rfm"""
+    df = run.stage("load", pd.read_parquet, path, columns=RFM_COLUMNS)
+    rfm = run.stage("pipeline", rfm_dag().run, df, profiler=run.profiler)
+    run.stage("export", export_frame, rfm, os.path.join(out, "rfm_scores"))
+
+
+def cltv_c_pipeline(run, path, out):
+    """create_cltv_c"""
+    df = run.stage("load", pd.read_parquet, path, columns=RFM_COLUMNS)
+    cltv_c = run.stage("pipeline", cltv_c_dag().run, df, profiler=run.profiler)
+    run.stage("export", export_frame, cltv_c, os.path.join(out, "cltv_c"))
+
+
+def cltv_p_pipeline(run, path, out):
+    """create_cltv_p"""
+    df = run.stage("load", pd.read_parquet, path, columns=RFM_COLUMNS)
+    cltv = run.stage("pipeline", cltv_p_dag().run, df, profiler=run.profiler)
+    run.stage("export", export_frame, cltv, os.path.join(out, "cltv_prediction"))
+
+
+def _export_targets(targets, out):
+    report = export_many({name: {"frame": ids, "path": os.path.join(out, name)} for name, ids in targets.items()})
+    return {"rows": int(report.loc["total", "rows"])}
+
+
+def flo_rfm_pipeline(run, path, out):
+    """create_rfm_analysis"""
+    df = run.stage("load", pd.read_parquet, path)
+    _, _, new_brand, discount = run.stage("pipeline", flo_rfm_analysis, df, profiler=run.profiler)
+    run.stage("export", _export_targets, {"new_brand_target_customer_id": new_brand,
+                                          "discount_target_customer_id": discount}, out)
+
+
+def flo_cltv_pipeline(run, path, out):
+    """FLO_CLTV_Prediction"""
+    df = run.stage("load", pd.read_parquet, path)
+    cltv_df = run.stage("pipeline", flo_cltv_prediction, df, profiler=run.profiler)
+    run.stage("export", export_frame, cltv_df, os.path.join(out, "flo_cltv_prediction"))
+
+
+# Pipeline -> (function, data set)
+PIPELINES = {"rfm": (rfm_pipeline, "online_retail"),
+             "cltv_c": (cltv_c_pipeline, "online_retail"),
+             "cltv_p": (cltv_p_pipeline, "online_retail"),
+             "flo_rfm": (flo_rfm_pipeline, "flo"),
+             "flo_cltv": (flo_cltv_pipeline, "flo")}
+
+GENERATORS = {"online_retail": online_retail_transactions, "flo": flo_customers}
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    """Commit, library versions and machine of a benchmark run."""
+    import pyarrow
+    return {"commit": _git_commit(),
+            "timestamp": dt.datetime.now(dt.timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "pyarrow": pyarrow.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count()}
+
+
+def run_benchmarks(sizes=("10k", "1M"), pipelines=tuple(PIPELINES), repeat=1, seed=0, workdir=None,
+                   verbose=True):
+    """
+    Run the pipelines on synthetic data of each size.
+
+    Parameters:
+    -----------
+    sizes: iterable
+        Keys of SIZES or row counts
+    pipelines: iterable
+        Keys of PIPELINES
+    repeat: int
+        Runs of every pipeline, compare() takes the fastest run of each stage
+    seed: int
+        Seed of the synthetic data, the same seed gives the same data on every commit
+    workdir: str, optional
+        Directory of the Parquet inputs and the exports, a temporary directory by default
+    verbose: bool
+        Print one line per stage
+
+    Returns:
+    --------
+    dict: "environment" (see environment()) and "results", one record per stage and run
+    """
+    results = []
+    with tempfile.TemporaryDirectory(dir=workdir) as tmp:
+        for size in sizes:
+            label, n_rows = (size, SIZES[size]) if size in SIZES else (str(size), int(size))
+            datasets = {}
+            for name in pipelines:
+                pipeline, dataset = PIPELINES[name]
+                if dataset not in datasets:
+                    setup = BenchmarkRun("generate", label)
+                    frame = setup.stage(dataset, GENERATORS[dataset], n_rows, seed=seed)
+                    datasets[dataset] = os.path.join(tmp, f"{dataset}_{label}.parquet")
+                    setup.stage(f"{dataset}_parquet", frame.to_parquet, datasets[dataset], index=False)
+                    del frame
+                    results.extend(setup.records)
+                for i in range(repeat):
+                    run = BenchmarkRun(name, label)
+                    out = os.path.join(tmp, f"{name}_{label}_{i}")
+                    os.makedirs(out)
+                    pipeline(run, datasets[dataset], out)
+                    for record in run.records:
+                        record["run"] = i
+                        if verbose:
+                            print("{pipeline:>9} {size:>4} {stage:>10} {seconds:9.3f}s "
+                                  "cpu {cpu_seconds:9.3f}s  rows {rows_in} -> {rows_out}".format(**record))
+                    results.extend(run.records)
+    return {"environment": environment(), "results": results}
+
+
+def save_results(report, path=None, directory="benchmark_results"):
+    """Write a run_benchmarks report as JSON, by default to <directory>/<commit>-<timestamp>.json."""
+    if path is None:
+        environment_ = report["environment"]
+        stamp = environment_["timestamp"].replace(":", "").replace("-", "")[:15]
+        path = os.path.join(directory, f"{(environment_['commit'] or 'local')[:10]}-{stamp}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(report, f, indent=1)
+    return path
+
+
+def load_results(path):
+    """The records of a saved report as a DataFrame."""
+    with open(path) as f:
+        return pd.DataFrame(json.load(f)["results"])
+
+
+def compare(baseline, current, tolerance=0.1):
+    """
+    Line up the stages of two reports (paths or load_results frames).
+
+    The fastest run of each pipeline, size and stage is compared. A stage is flagged as a regression
+    when it is more than tolerance slower than the baseline.
+
+    Returns:
+    --------
+    pandas.DataFrame: seconds and peak_rss_mb of both reports, their ratios and the regression flag
+    """
+    frames = [load_results(report) if isinstance(report, str) else report for report in (baseline, current)]
+    keys = ["pipeline", "size", "stage"]
+    best = [frame.groupby(keys, sort=False)[["seconds", "peak_rss_mb"]].min() for frame in frames]
+    table = best[0].join(best[1], how="inner", lsuffix="_baseline")
+    table["time_ratio"] = table["seconds"] / table["seconds_baseline"]
+    table["memory_ratio"] = table["peak_rss_mb"] / table["peak_rss_mb_baseline"]
+    table["regression"] = table["time_ratio"] > 1 + tolerance
+    return table
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the RFM and CLTV pipelines on synthetic data.")
+    parser.add_argument("--sizes", nargs="+", default=["10k", "1M"],
+                        help=f"{', '.join(SIZES)} or a row count")
+    parser.add_argument("--pipelines", nargs="+", default=list(PIPELINES), choices=list(PIPELINES))
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="JSON file of the results, benchmark_results/<commit>-<time>.json by default")
+    parser.add_argument("--compare", help="JSON file of a baseline run to compare against")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(sizes=args.sizes, pipelines=args.pipelines, repeat=args.repeat, seed=args.seed)
+    path = save_results(report, args.output)
+    print(f"Results written to {path}")
+    if args.compare:
+        with pd.option_context("display.max_rows", None, "display.max_columns", None, "display.width", 200):
+            print(compare(args.compare, pd.DataFrame(report["results"])))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+###############################################################
+# BG/NBD Fitter with Analytic Gradients
+###############################################################
+
+# lifetimes.BetaGeoFitter evaluates the log-likelihood once per customer and differentiates it with autograd.
+# Here customers are compressed into unique (frequency, recency, T) tuples with counts, the log-likelihood
+# and its analytic gradient are evaluated vectorized over those tuples, and L-BFGS-B minimizes it.
+# The objective is the one of lifetimes: log parameters, time scaled so that max(T) = 1,
+# mean negative log-likelihood plus penalizer_coef * sum(params ** 2). The parameters therefore
+# agree with BetaGeoFitter(penalizer_coef=...) within the optimizer tolerance (4e-7 relative measured).
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import minimize
+from scipy.special import digamma, gammaln
+
+from crmUtils.predictors import BGNBDPredictor
+
+PARAM_NAMES = BGNBDPredictor.param_names
+
+
+def compress_customers(*columns):
+    """
+    Group identical customer rows together.
+
+    Returns:
+    --------
+    tuple: The unique values of each column and the number of customers of each unique row
+    """
+    grouped = pd.DataFrame({i: np.asarray(col) for i, col in enumerate(columns)}).value_counts(sort=False)
+    uniques = [grouped.index.get_level_values(i).to_numpy(dtype=np.float64) for i in range(len(columns))]
+    return (*uniques, grouped.to_numpy(dtype=np.float64))
+
+
+def _negative_log_likelihood(log_params, x, t_x, T, weights, penalizer_coef):
+    """Mean negative log-likelihood of the BG/NBD model and its gradient with respect to log_params."""
+    params = np.exp(log_params)
+    r, alpha, a, b = params
+    repeat = x > 0
+
+    A_1 = gammaln(r + x) - gammaln(r) + r * np.log(alpha)
+    A_2 = gammaln(a + b) + gammaln(b + x) - gammaln(b) - gammaln(a + b + x)
+    A_3 = -(r + x) * np.log(alpha + T)
+    A_4 = np.log(a) - np.log(b + np.maximum(x, 1) - 1) - (r + x) * np.log(t_x + alpha)
+
+    # log(exp(A_3) + exp(A_4)) for repeat customers and A_3 otherwise, with softmax weights for the gradient
+    max_A = np.where(repeat, np.maximum(A_3, A_4), A_3)
+    e_3 = np.exp(A_3 - max_A)
+    e_4 = np.where(repeat, np.exp(A_4 - max_A), 0.0)
+    total = e_3 + e_4
+    w_3 = e_3 / total
+    w_4 = e_4 / total
+
+    ll = A_1 + A_2 + np.log(total) + max_A
+    weight_sum = weights.sum()
+    value = -(weights * ll).sum() / weight_sum + penalizer_coef * (params ** 2).sum()
+
+    d_r = digamma(r + x) - digamma(r) + np.log(alpha) - w_3 * np.log(alpha + T) - w_4 * np.log(alpha + t_x)
+    d_alpha = r / alpha - w_3 * (r + x) / (alpha + T) - w_4 * (r + x) / (alpha + t_x)
+    d_a = digamma(a + b) - digamma(a + b + x) + w_4 / a
+    d_b = (digamma(a + b) + digamma(b + x) - digamma(b) - digamma(a + b + x)
+           - w_4 / (b + np.maximum(x, 1) - 1))
+
+    gradient = np.array([-(weights * d).sum() / weight_sum for d in (d_r, d_alpha, d_a, d_b)])
+    gradient += 2 * penalizer_coef * params
+    # d/d log(p) = p * d/dp
+    return value, gradient * params
+
+
+class BGNBDFitter(BGNBDPredictor):
+    """
+    BG/NBD model with the fit / predict interface of lifetimes.BetaGeoFitter, the predictions come from
+    crmUtils.predictors.BGNBDPredictor.
+
+    Parameters:
+    -----------
+    penalizer_coef: float
+        Coefficient of the l2 penalty on the parameters, the scripts use 0.001
+
+    Example:
+    --------
+    bgf = BGNBDFitter(penalizer_coef=0.001)
+    bgf.fit(cltv_df["frequency"], cltv_df["recency"], cltv_df["T"])
+    cltv_df["expected_purc_1_week"] = bgf.predict(1, cltv_df["frequency"], cltv_df["recency"], cltv_df["T"])
+    """
+
+    def __init__(self, penalizer_coef=0.0):
+        super().__init__()
+        self.penalizer_coef = penalizer_coef
+
+    def fit(self, frequency, recency, T, weights=None, initial_params=None, warm_start=False, ftol=1e-14, gtol=1e-10,
+            maxiter=1000):
+        """
+        Fit the model.
+
+        Parameters:
+        -----------
+        frequency, recency, T: array_like
+            Customer summary, frequency is truncated to integers like lifetimes does
+        weights: array_like, optional
+            Number of customers of each row. If not given, identical rows are compressed first.
+        initial_params: dict or pandas.Series, optional
+            Starting values of r, alpha, a, b, e.g. the parameters of yesterday's fit
+        warm_start: bool
+            Start from the current params_ if the model is already fitted
+        ftol, gtol: float
+            L-BFGS-B stopping tolerances. The defaults reach the optimum of BetaGeoFitter, the parameters
+            agree within 4e-7 relative on synthetic online_retail data, tol=1e-7 stopped up to 7e-4 away.
+
+        Returns:
+        --------
+        BGNBDFitter: self
+        """
+        x = np.asarray(frequency).astype(int).astype(np.float64)
+        t_x = np.asarray(recency, dtype=np.float64)
+        T = np.asarray(T, dtype=np.float64)
+        if np.any(t_x > T):
+            raise ValueError("Some values in recency vector are larger than T vector.")
+
+        if weights is None:
+            x, t_x, T, weights = compress_customers(x, t_x, T)
+        else:
+            weights = np.asarray(weights, dtype=np.float64)
+
+        self._scale = 1.0 / T.max()
+        if warm_start and self.params_ is not None:
+            initial_params = self.params_
+        if initial_params is None:
+            x0 = 0.1 * np.ones(4)
+        else:
+            initial_params = pd.Series(initial_params)[PARAM_NAMES].to_numpy(dtype=np.float64)
+            x0 = np.log(initial_params * np.array([1, self._scale, 1, 1]))
+
+        output = minimize(_negative_log_likelihood, x0, jac=True, method="L-BFGS-B",
+                          args=(x, t_x * self._scale, T * self._scale, weights, self.penalizer_coef),
+                          options={"ftol": ftol, "gtol": gtol, "maxiter": maxiter})
+        # With these tolerances the line search can run out of float64 precision at the optimum itself,
+        # that stop (status 2) is accepted when the gradient is already flat
+        if not output.success and not (output.status == 2 and np.abs(output.jac).max() < 1e-6):
+            raise RuntimeError(f"The model did not converge: {output.message}")
+
+        self.params_ = pd.Series(np.exp(output.x), index=PARAM_NAMES)
+        self.params_["alpha"] /= self._scale
+        self._negative_log_likelihood_ = output.fun
+        self.n_customers_ = weights.sum()
+        self.n_unique_ = len(weights)
+        return self
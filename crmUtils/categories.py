@@ -0,0 +1,113 @@
+###############################################################
+# Category-Interest Bitsets and Inverted Index for FLO Targeting
+###############################################################
+
+# interested_in_categories_12 holds strings like "[KADIN, AKTIFSPOR]", and every campaign rescans
+# all of them with str.contains. There are only a handful of categories and a few dozen distinct lists,
+# so each distinct string is parsed once into a bitmask (one bit per category), the customers get the
+# bitmask of their string, and an inverted index keeps the sorted customer positions of each category.
+# A campaign is then a bitwise test or a sorted-array intersection with the segment members.
+
+import numpy as np
+import pandas as pd
+
+
+def parse_category_list(text):
+    """"[KADIN, AKTIFSPOR]" -> ["KADIN", "AKTIFSPOR"], an empty list for "[]" or a missing value."""
+    if not isinstance(text, str):
+        return []
+    return [item.strip() for item in text.strip("[]").split(",") if item.strip()]
+
+
+class CategoryIndex:
+    """
+    Per-customer category bitsets with an inverted index.
+
+    Categories are matched as whole items of the list. For the FLO categories this selects the same
+    customers as the regexes of the script, e.g. str.contains("ERKEK|COCUK|AKTIFCOCUK") is
+    any_of=["ERKEK", "COCUK", "AKTIFCOCUK"].
+
+    Parameters:
+    -----------
+    customer_ids: array_like
+        Customer id of each row, e.g. rfm_final["master_id"]
+    category_lists: array_like
+        The interested_in_categories_12 strings of the same rows
+
+    Example:
+    --------
+    index = CategoryIndex(rfm_final["master_id"], rfm_final["interested_in_categories_12"])
+    loyal = rfm_final["segment"].isin(["loyal_customers", "champions"]).to_numpy()
+    index.select(any_of=["KADIN"], within=loyal)
+    """
+
+    def __init__(self, customer_ids, category_lists):
+        self.customer_ids = np.asarray(customer_ids)
+        codes, uniques = pd.factorize(pd.Series(category_lists), use_na_sentinel=True)
+        parsed = [parse_category_list(text) for text in uniques]
+
+        self.categories = sorted({category for items in parsed for category in items})
+        if len(self.categories) > 64:
+            raise ValueError(f"At most 64 categories fit a bitset, got {len(self.categories)}")
+        # The smallest unsigned type with a bit per category, uint8 for the five FLO categories
+        self._dtype = next(dtype for dtype in (np.uint8, np.uint16, np.uint32, np.uint64)
+                           if np.iinfo(dtype).bits >= len(self.categories))
+        self._bit = {category: self._dtype(1 << i) for i, category in enumerate(self.categories)}
+
+        # One bitmask per distinct string, the missing values (code -1) get the empty mask at the end
+        unique_masks = np.zeros(len(uniques) + 1, dtype=self._dtype)
+        for i, items in enumerate(parsed):
+            for category in items:
+                unique_masks[i] |= self._bit[category]
+        self.bits = unique_masks[codes]
+        self.postings = {category: np.flatnonzero(self.bits & bit) for category, bit in self._bit.items()}
+
+    def __len__(self):
+        return len(self.bits)
+
+    def mask_of(self, categories):
+        """Bitmask of the given categories, unknown categories match nobody."""
+        mask = self._dtype(0)
+        for category in categories:
+            mask |= self._bit.get(category, self._dtype(0))
+        return mask
+
+    def match(self, any_of=None, all_of=None, none_of=None, within=None):
+        """
+        Boolean mask of the rows matching the category predicates.
+
+        Parameters:
+        -----------
+        any_of: list, optional
+            At least one of these categories
+        all_of: list, optional
+            Every one of these categories
+        none_of: list, optional
+            None of these categories
+        within: array_like of bool, optional
+            Restrict to these rows, e.g. the members of the target segments
+        """
+        result = np.ones(len(self.bits), dtype=bool) if within is None else np.asarray(within, dtype=bool).copy()
+        if any_of is not None:
+            result &= (self.bits & self.mask_of(any_of)) != 0
+        if all_of is not None:
+            if all(category in self._bit for category in all_of):
+                all_mask = self.mask_of(all_of)
+                result &= (self.bits & all_mask) == all_mask
+            else:
+                result[:] = False
+        if none_of is not None:
+            result &= (self.bits & self.mask_of(none_of)) == 0
+        return result
+
+    def positions(self, category):
+        """Sorted row positions of the customers interested in category, from the inverted index."""
+        return self.postings.get(category, np.empty(0, dtype=np.int64))
+
+    def intersect(self, category, members):
+        """Row positions of the sorted members (e.g. np.flatnonzero of a segment mask) also in category."""
+        return np.intersect1d(self.positions(category), members, assume_unique=True)
+
+    def select(self, any_of=None, all_of=None, none_of=None, within=None):
+        """Customer ids of the rows matching the predicates of match, in row order."""
+        return self.customer_ids[self.match(any_of=any_of, all_of=all_of, none_of=none_of, within=within)]
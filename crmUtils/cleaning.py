@@ -0,0 +1,166 @@
+###############################################################
+# Single-Mask Data Preparation of Transaction Frames
+###############################################################
+
+# create_rfm, create_cltv_c and create_cltv_p drop nulls in place, then filter cancellations,
+# Quantity > 0 and Price > 0 one after the other, so every step materializes another copy of the frame
+# and the callers copy the input first to protect it. Here the conditions are combined into one
+# boolean mask, the surviving rows are taken once, and TotalPrice is computed on them only.
+# The input frame is never modified.
+
+import numpy as np
+import pandas as pd
+
+
+def parse_invoices(invoices):
+    """
+    Split invoice numbers like "C489449" into the integer number and the cancellation flag.
+
+    The column is factorized first and only the distinct invoices are parsed as strings, an invoice has
+    several lines, and a categorical column is already factorized. A number containing "C" is cancelled,
+    as in the scripts. Missing invoices get number -1 and are not cancelled.
+
+    Returns:
+    --------
+    tuple: (numpy int64 array of invoice numbers, numpy bool array of cancellation flags)
+    """
+    if isinstance(invoices.dtype, pd.CategoricalDtype):
+        codes, uniques = invoices.cat.codes.to_numpy(), invoices.cat.categories
+    else:
+        codes, uniques = pd.factorize(invoices)
+    uniques = pd.Series(uniques.astype(str))
+    flags = uniques.str.contains("C", regex=False).to_numpy(dtype=bool)
+    # "A" (bad debt adjustment) and "C" prefixes are dropped, the digits remain
+    numbers = pd.to_numeric(uniques.str.replace(r"\D", "", regex=True), errors="coerce")
+    numbers = numbers.fillna(-1).to_numpy(dtype=np.int64)
+
+    missing = codes < 0
+    return np.where(missing, -1, numbers[codes]), np.where(missing, False, flags[codes])
+
+
+def add_invoice_columns(dataframe, invoice_col="Invoice"):
+    """
+    Add InvoiceNo (int32) and Cancelled (bool) from parse_invoices, e.g. once when the data is cached.
+
+    Returns a new frame, dataframe is not modified.
+    """
+    numbers, cancelled = parse_invoices(dataframe[invoice_col])
+    return dataframe.assign(InvoiceNo=numbers.astype(np.int32), Cancelled=cancelled)
+
+
+def cancelled_invoices(invoices):
+    """
+    Boolean mask of the cancelled invoices, those whose number contains "C" as in the scripts.
+
+    Missing invoices are not cancelled, like str.contains(..., na=False).
+    """
+    return pd.Series(parse_invoices(invoices)[1], index=invoices.index)
+
+
+def _cancelled_flags(dataframe, invoice_col, cancelled_col):
+    # The Cancelled column of the cache is used when the frame has it
+    if cancelled_col in dataframe.columns:
+        return dataframe[cancelled_col].to_numpy(dtype=bool)
+    return parse_invoices(dataframe[invoice_col])[1]
+
+
+def _null_mask(dataframe, subset):
+    mask = np.ones(len(dataframe), dtype=bool)
+    for col in subset if subset is not None else dataframe.columns:
+        mask &= dataframe[col].notna().to_numpy()
+    return mask
+
+
+def net_cancellations(purchases, cancellations, customer_col="Customer ID", stock_col="StockCode",
+                      date_col="InvoiceDate", quantity_col="Quantity"):
+    """
+    Subtract the cancelled quantities from the purchase lines they return.
+
+    A cancellation line is matched to the latest purchase line of the same customer and StockCode
+    at or before its date. Lines that are returned completely are dropped, so an invoice that is
+    cancelled entirely no longer counts as a purchase. Quantity returned beyond the matched line,
+    and cancellations of purchases before the data starts, are ignored.
+
+    Returns:
+    --------
+    pandas.DataFrame: The purchase lines with the net quantity, purchases is not modified
+    """
+    if not len(cancellations):
+        return purchases
+    lines = pd.DataFrame({"row": np.arange(len(purchases)),
+                          customer_col: purchases[customer_col].to_numpy(),
+                          stock_col: purchases[stock_col].astype(str).to_numpy(),
+                          date_col: purchases[date_col].to_numpy()})
+    returns = pd.DataFrame({customer_col: cancellations[customer_col].to_numpy(),
+                            stock_col: cancellations[stock_col].astype(str).to_numpy(),
+                            date_col: cancellations[date_col].to_numpy(),
+                            # Cancellation lines carry negative quantities
+                            "returned": np.maximum(-cancellations[quantity_col].to_numpy(dtype=np.float64), 0)})
+    matched = pd.merge_asof(returns.sort_values(date_col), lines.sort_values(date_col), on=date_col,
+                            by=[customer_col, stock_col], direction="backward").dropna(subset=["row"])
+
+    returned = np.bincount(matched["row"].to_numpy(dtype=np.int64), weights=matched["returned"].to_numpy(),
+                           minlength=len(purchases))
+    quantity = purchases[quantity_col].to_numpy()
+    # Only the matched lines change, other lines keep their quantity even if it is not positive
+    net_quantity = np.where(returned > 0, np.maximum(quantity - returned, 0), quantity).astype(quantity.dtype)
+    netted = purchases.assign(**{quantity_col: net_quantity})
+    return netted[(returned == 0) | (net_quantity > 0)]
+
+
+def clean_mask(dataframe, subset=None, drop_cancelled=True, positive_quantity=False, positive_price=False,
+               invoice_col="Invoice", quantity_col="Quantity", price_col="Price", cancelled_col="Cancelled"):
+    """
+    Boolean mask of the rows that survive the data preparation of the scripts.
+
+    Parameters:
+    -----------
+    dataframe: pandas.DataFrame
+        Raw transactions
+    subset: list, optional
+        Columns that must not be null, all columns by default like dataframe.dropna()
+    drop_cancelled: bool
+        Drop the invoices containing "C", read from the Cancelled column if the frame has one
+    positive_quantity, positive_price: bool
+        Keep only Quantity > 0 and Price > 0
+
+    Returns:
+    --------
+    numpy.ndarray: One flag per row
+    """
+    mask = _null_mask(dataframe, subset)
+    if drop_cancelled:
+        mask &= ~_cancelled_flags(dataframe, invoice_col, cancelled_col)
+    if positive_quantity:
+        mask &= (dataframe[quantity_col] > 0).to_numpy(dtype=bool, na_value=False)
+    if positive_price:
+        mask &= (dataframe[price_col] > 0).to_numpy(dtype=bool, na_value=False)
+    return mask
+
+
+def clean_transactions(dataframe, subset=None, drop_cancelled=True, positive_quantity=False,
+                       positive_price=False, total_price=True, net_cancelled=False, invoice_col="Invoice",
+                       quantity_col="Quantity", price_col="Price", cancelled_col="Cancelled"):
+    """
+    Data preparation of create_rfm / create_cltv_c / create_cltv_p in one pass.
+
+    The arguments are those of clean_mask. total_price adds TotalPrice = Quantity * Price
+    for the surviving rows only. net_cancelled subtracts the cancellation lines from the purchases
+    they return (see net_cancellations) instead of only dropping them, so Monetary reflects returns.
+
+    Returns:
+    --------
+    pandas.DataFrame: A new frame with the surviving rows, a shallow copy if every row survives.
+                      Under copy-on-write, changing it later never writes through to dataframe.
+    """
+    mask = clean_mask(dataframe, subset=subset, drop_cancelled=drop_cancelled,
+                      positive_quantity=positive_quantity, positive_price=positive_price,
+                      invoice_col=invoice_col, quantity_col=quantity_col, price_col=price_col,
+                      cancelled_col=cancelled_col)
+    cleaned = dataframe.copy(deep=False) if mask.all() else dataframe[mask]
+    if net_cancelled:
+        cancelled = _null_mask(dataframe, subset) & _cancelled_flags(dataframe, invoice_col, cancelled_col)
+        cleaned = net_cancellations(cleaned, dataframe[cancelled], quantity_col=quantity_col)
+    if total_price:
+        cleaned = cleaned.assign(TotalPrice=cleaned[quantity_col] * cleaned[price_col])
+    return cleaned
@@ -0,0 +1,89 @@
+###############################################################
+# Compact Dtypes for Transaction Frames
+###############################################################
+
+# read_excel gives object Invoice, StockCode, Description and Country columns, and float64 ids and prices.
+# The strings repeat a lot (a few thousand products, a few dozen countries, one invoice per several lines),
+# so they are stored as categoricals: one small dictionary plus integer codes per row.
+# Ids and quantities fit int32. Prices fit float32, which keeps the two decimals of the workbook
+# to about 1e-7 relative, so sums of TotalPrice can differ from float64 in the last digits.
+# The RFM and CLTV functions of crmUtils accept the compact frame as it is.
+
+import pandas as pd
+
+ONLINE_RETAIL_COMPACT = {"Invoice": "category",
+                         "StockCode": "category",
+                         "Description": "category",
+                         "Quantity": "int32",
+                         "InvoiceDate": "datetime64[ns]",
+                         "Price": "float32",
+                         # Nullable, the guest checkouts have no Customer ID
+                         "Customer ID": "Int32",
+                         "Country": "category",
+                         "InvoiceNo": "int32",
+                         "Cancelled": "bool"}
+
+FLO_COMPACT = {"order_channel": "category",
+               "last_order_channel": "category",
+               "first_order_date": "datetime64[ns]",
+               "last_order_date": "datetime64[ns]",
+               "last_order_date_online": "datetime64[ns]",
+               "last_order_date_offline": "datetime64[ns]",
+               "order_num_total_ever_online": "int32",
+               "order_num_total_ever_offline": "int32",
+               "customer_value_total_ever_offline": "float32",
+               "customer_value_total_ever_online": "float32",
+               "interested_in_categories_12": "category"}
+
+
+def memory_report(before, after):
+    """
+    Deep memory usage of each column before and after a dtype change.
+
+    Returns:
+    --------
+    pandas.DataFrame: Columns bytes_before, bytes_after and ratio per column, with a total row
+    """
+    report = pd.DataFrame({"bytes_before": before.memory_usage(deep=True, index=False),
+                           "bytes_after": after.memory_usage(deep=True, index=False)})
+    report.loc["total"] = report.sum()
+    report["ratio"] = report["bytes_before"] / report["bytes_after"]
+    return report
+
+
+def compact_dtypes(dataframe, dtypes=ONLINE_RETAIL_COMPACT, verbose=False):
+    """
+    Cast the columns of dataframe to a compact dtype plan.
+
+    Only the columns that are in both dataframe and dtypes and that are not already of the planned dtype
+    are converted, the other columns are shared with the input, which is not modified.
+
+    Parameters:
+    -----------
+    dataframe: pandas.DataFrame
+    dtypes: dict
+        Column to dtype, ONLINE_RETAIL_COMPACT or FLO_COMPACT
+    verbose: bool
+        Print the bytes saved per column, see memory_report
+
+    Returns:
+    --------
+    pandas.DataFrame
+    """
+    converted = {}
+    for col, dtype in dtypes.items():
+        if col not in dataframe.columns or dataframe[col].dtype == dtype:
+            continue
+        if str(dtype).startswith("datetime64"):
+            # The FLO dates are strings in the csv
+            converted[col] = pd.to_datetime(dataframe[col]).astype(dtype)
+        else:
+            converted[col] = dataframe[col].astype(dtype)
+
+    compact = dataframe.assign(**converted) if converted else dataframe
+    if verbose:
+        report = memory_report(dataframe, compact)
+        saved = report.loc["total", "bytes_before"] - report.loc["total", "bytes_after"]
+        print(report)
+        print(f"Saved {saved / 2**20:.1f} MiB, {report.loc['total', 'ratio']:.1f}x smaller")
+    return compact
@@ -0,0 +1,185 @@
+###############################################################
+# FLO Whole-Process Functions: RFM Targeting and CLTV Prediction
+###############################################################
+
+# The FLO case studies ran their whole process inside the scripts, which read the csv at import, so
+# nothing else could call (or benchmark) that code. Here are the preprocessing, create_rfm_analysis of
+# caseStudy5 and the CLTV prediction of caseStudy6 as functions. The scripts and crmUtils.benchmark both
+# call them. flo_data_20k has one row per master_id, so RFM uses the customer-level path of rfm_metrics.
+# Like the other pipeline functions, every step runs as a profiler stage.
+
+import datetime as dt
+
+import pandas as pd
+
+from crmUtils.bgnbd import BGNBDFitter
+from crmUtils.categories import CategoryIndex
+from crmUtils.gamma_gamma import GammaGammaModel
+from crmUtils.outliers import OutlierCapper
+from crmUtils.prediction import predict_horizons
+from crmUtils.profiling import NULL_PROFILER
+from crmUtils.quantiles import qcut_scores
+from crmUtils.rfm import rfm_metrics, rfm_scores
+from crmUtils.segments import SEG_MAP, assign_segments
+
+FLO_TODAY = dt.datetime(2021, 6, 1)
+
+FLO_DATE_COLUMNS = ["first_order_date", "last_order_date", "last_order_date_online", "last_order_date_offline"]
+
+FLO_OUTLIER_COLUMNS = ["order_num_total_ever_online", "order_num_total_ever_offline",
+                       "customer_value_total_ever_offline", "customer_value_total_ever_online"]
+
+FLO_RFM_COLUMNS = ("recency", "frequency", "monetary")
+
+
+def preprocess_flo(dataframe):
+    """
+    TotalPrice and TotalOrder over the online and offline channels, and the date columns as datetimes.
+
+    The input is not modified. Dates that are already datetimes (FLO_COMPACT) are kept as they are.
+    """
+    dates = {col: pd.to_datetime(dataframe[col]) for col in FLO_DATE_COLUMNS if col in dataframe.columns}
+    return dataframe.assign(
+        TotalPrice=dataframe["customer_value_total_ever_offline"] + dataframe["customer_value_total_ever_online"],
+        TotalOrder=dataframe["order_num_total_ever_offline"] + dataframe["order_num_total_ever_online"],
+        **dates)
+
+
+def _campaign_targets(rfm, df):
+    rfm_final = rfm.merge(df[["master_id", "interested_in_categories_12"]], on="master_id", how="left")
+    # The category lists are parsed once into bitsets, each campaign is a bitwise test within its segments
+    categories = CategoryIndex(rfm_final["master_id"], rfm_final["interested_in_categories_12"])
+    segments = rfm_final["segment"]
+    new_brand_targets = rfm_final.loc[
+        categories.match(any_of=["KADIN"], within=segments.isin(["loyal_customers", "champions"])),
+        "master_id"]
+    discount_targets = rfm_final.loc[
+        categories.match(any_of=["ERKEK", "COCUK", "AKTIFCOCUK"],
+                         within=segments.isin(["cant_loose", "hibernating", "new_customers"])),
+        "master_id"]
+    return rfm_final, new_brand_targets, discount_targets
+
+
+def flo_rfm_analysis(dataframe, today_date=FLO_TODAY, seg_map=SEG_MAP, csv_path=False, profiler=None):
+    """
+    create_rfm_analysis of caseStudy5: RFM segments and the two campaign target lists.
+
+    Parameters:
+    -----------
+    dataframe: pandas.DataFrame
+        flo_data_20k, as read from the csv or cast to FLO_COMPACT
+    today_date: datetime
+        Analysis date
+    seg_map: dict
+        Regex of the RF scores -> segment name
+    csv_path: bool
+        Write the target lists to new_brand_target_customer_id.csv and discount_target_customer_id.csv
+    profiler: crmUtils.profiling.Profiler, optional
+        Times the stages clean, metrics, scores, segment, target (and export)
+
+    Returns:
+    --------
+    tuple:
+        processed_df: The input with TotalPrice, TotalOrder and datetime dates
+        rfm_final: RFM table with the scores, RF_Score, segment and interested_in_categories_12,
+                   one row per master_id
+        new_brand_targets: master_id of the targets of the new women's brand
+        discount_targets: master_id of the targets of the men's / children's discount
+    """
+    profiler = (profiler or NULL_PROFILER).bind(pipeline="create_rfm_analysis")
+    df = profiler.call("clean", preprocess_flo, dataframe)
+
+    # One row per master_id: column arithmetic after a uniqueness check, no groupby
+    rfm = profiler.call("metrics", rfm_metrics, df, today_date, customer_col="master_id",
+                        date_col="last_order_date", frequency_col="TotalOrder", monetary_col="TotalPrice",
+                        frequency_agg="sum", columns=FLO_RFM_COLUMNS, customer_level=True)
+    rfm = profiler.call("scores", rfm_scores, rfm, columns=FLO_RFM_COLUMNS, seg_map=None)
+    # Segments are looked up from the integer scores, RF_Score is kept for the output only,
+    # built with one integer operation instead of concatenating strings
+    with profiler.stage("segment", rows_in=len(rfm)) as stage:
+        rfm["RF_Score"] = (rfm["recency_score"].astype(int) * 10 + rfm["frequency_score"].astype(int)).astype(str)
+        rfm["segment"] = assign_segments(rfm["recency_score"], rfm["frequency_score"], seg_map=seg_map)
+        stage.rows_out = len(rfm)
+
+    rfm_final, new_brand_targets, discount_targets = profiler.call("target", _campaign_targets, rfm, df)
+
+    if csv_path:
+        with profiler.stage("export", rows_in=len(new_brand_targets) + len(discount_targets)):
+            new_brand_targets.to_csv("new_brand_target_customer_id.csv", index=False)
+            discount_targets.to_csv("discount_target_customer_id.csv", index=False)
+
+    return df, rfm_final, new_brand_targets, discount_targets
+
+
+def _flo_clean(dataframe):
+    # Rounded limits keep the order counts integer, the totals are taken after the capping
+    df = OutlierCapper(round_limits=True).fit_transform(dataframe, FLO_OUTLIER_COLUMNS)
+    dates = {col: pd.to_datetime(df[col]) for col in FLO_DATE_COLUMNS if col in df.columns}
+    return df.assign(
+        total_customer_value=df["customer_value_total_ever_offline"] + df["customer_value_total_ever_online"],
+        total_customer_order=df["order_num_total_ever_offline"] + df["order_num_total_ever_online"],
+        **dates)
+
+
+def flo_cltv_table(dataframe, today_date=FLO_TODAY):
+    """
+    The CLTV table of caseStudy6: customer_id, recency_cltv_weekly, T_weekly, frequency and monetary_cltv_avg.
+
+    dataframe needs the total_customer_value and total_customer_order columns and datetime dates.
+    """
+    return pd.DataFrame({"customer_id": dataframe["master_id"],
+                         "recency_cltv_weekly": (dataframe["last_order_date"]
+                                                 - dataframe["first_order_date"]).dt.days / 7,
+                         "T_weekly": (pd.Timestamp(today_date) - dataframe["first_order_date"]).dt.days / 7,
+                         "frequency": dataframe["total_customer_order"],
+                         "monetary_cltv_avg": dataframe["total_customer_value"] / dataframe["total_customer_order"]})
+
+
+def _fit(cltv_df, penalizer_coef):
+    bgf = BGNBDFitter(penalizer_coef=penalizer_coef).fit(cltv_df["frequency"], cltv_df["recency_cltv_weekly"],
+                                                         cltv_df["T_weekly"])
+    ggf = GammaGammaModel(penalizer_coef=penalizer_coef).fit(cltv_df["frequency"], cltv_df["monetary_cltv_avg"])
+    return bgf, ggf
+
+
+def _predict(cltv_df, models, month, discount_rate):
+    predictions = predict_horizons(*models, cltv_df["frequency"], cltv_df["recency_cltv_weekly"],
+                                   cltv_df["T_weekly"], cltv_df["monetary_cltv_avg"], horizons=(12, 24),
+                                   clv_months=(month,), freq="W", discount_rate=discount_rate)
+    return cltv_df.assign(exp_sales_3_month=predictions["expected_purc_12"],
+                          exp_sales_6_month=predictions["expected_purc_24"],
+                          exp_average_value=predictions["expected_average_profit"],
+                          cltv=predictions[f"clv_{month}"])
+
+
+def flo_cltv_prediction(dataframe, month=6, today_date=FLO_TODAY, penalizer_coef=0.001, discount_rate=0.01,
+                        profiler=None):
+    """
+    The CLTV prediction of caseStudy6 as one function.
+
+    The steps are: cap the outliers, build the weekly CLTV table, fit BG/NBD and Gamma-Gamma, predict the
+    3 and 6 month sales and the CLTV, and cut the segments.
+
+    Parameters:
+    -----------
+    dataframe: pandas.DataFrame
+        flo_data_20k, as read from the csv or cast to FLO_COMPACT
+    month: int
+        CLTV horizon in months
+    profiler: crmUtils.profiling.Profiler, optional
+        Times the stages clean, summary, fit, predict and segment
+
+    Returns:
+    --------
+    pandas.DataFrame: flo_cltv_table with exp_sales_3_month, exp_sales_6_month, exp_average_value, cltv
+                      and cltv_segment (D / C / B / A)
+    """
+    profiler = (profiler or NULL_PROFILER).bind(pipeline="flo_cltv_prediction")
+    df = profiler.call("clean", _flo_clean, dataframe)
+    cltv_df = profiler.call("summary", flo_cltv_table, df, today_date)
+    models = profiler.call("fit", _fit, cltv_df, penalizer_coef)
+    cltv_df = profiler.call("predict", _predict, cltv_df, models, month, discount_rate)
+    with profiler.stage("segment", rows_in=len(cltv_df)) as stage:
+        cltv_df["cltv_segment"] = qcut_scores(cltv_df["cltv"], 4, labels=["D", "C", "B", "A"])
+        stage.rows_out = len(cltv_df)
+    return cltv_df
@@ -0,0 +1,115 @@
+###############################################################
+# Gamma-Gamma Fitter on Sufficient Statistics
+###############################################################
+
+# GammaGammaFitter.fit evaluates the log-likelihood once per customer with autograd.
+# The likelihood only depends on the (frequency, monetary) pair, so customers are grouped into
+# unique pairs with weights, and the fit runs on those with an analytic gradient.
+# The objective is the one of lifetimes (log parameters, mean negative log-likelihood plus
+# penalizer_coef * sum(params ** 2)), so the parameters agree with GammaGammaFitter(penalizer_coef=...).
+
+import numpy as np
+import pandas as pd
+from scipy.optimize import minimize
+from scipy.special import digamma, gammaln
+
+from crmUtils.bgnbd import compress_customers
+from crmUtils.predictors import GammaGammaPredictor
+
+PARAM_NAMES = GammaGammaPredictor.param_names
+
+
+def _negative_log_likelihood(log_params, x, m, weights, penalizer_coef):
+    """Mean negative log-likelihood of the Gamma-Gamma model and its gradient with respect to log_params."""
+    params = np.exp(log_params)
+    p, q, v = params
+    px = p * x
+    log_xm_v = np.log(x * m + v)
+
+    ll = (gammaln(px + q) - gammaln(px) - gammaln(q) + q * np.log(v)
+          + (px - 1) * np.log(m) + px * np.log(x) - (px + q) * log_xm_v)
+    weight_sum = weights.sum()
+    value = -(weights * ll).sum() / weight_sum + penalizer_coef * (params ** 2).sum()
+
+    psi_pxq = digamma(px + q)
+    d_p = x * (psi_pxq - digamma(px) + np.log(m) + np.log(x) - log_xm_v)
+    d_q = psi_pxq - digamma(q) + np.log(v) - log_xm_v
+    d_v = q / v - (px + q) / (x * m + v)
+
+    gradient = np.array([-(weights * d).sum() / weight_sum for d in (d_p, d_q, d_v)])
+    gradient += 2 * penalizer_coef * params
+    return value, gradient * params
+
+
+class GammaGammaModel(GammaGammaPredictor):
+    """
+    Gamma-Gamma model with the fit / conditional_expected_average_profit interface of lifetimes.GammaGammaFitter,
+    the predictions come from crmUtils.predictors.GammaGammaPredictor.
+
+    Example:
+    --------
+    ggf = GammaGammaModel(penalizer_coef=0.001)
+    ggf.fit(cltv_df["frequency"], cltv_df["monetary"])
+    cltv_df["expected_average_profit"] = ggf.conditional_expected_average_profit(cltv_df["frequency"], cltv_df["monetary"])
+    """
+
+    def __init__(self, penalizer_coef=0.0):
+        super().__init__()
+        self.penalizer_coef = penalizer_coef
+
+    def fit(self, frequency, monetary_value, weights=None, initial_params=None, warm_start=False,
+            q_constraint=False, ftol=1e-14, gtol=1e-10, maxiter=1000):
+        """
+        Fit the model.
+
+        Parameters:
+        -----------
+        frequency, monetary_value: array_like
+            Number of purchases and average value per purchase, float32 or float64
+        weights: array_like, optional
+            Number of customers of each (frequency, monetary_value) pair. If not given,
+            the pairs are grouped first, so only the sufficient statistics reach the optimizer.
+        initial_params: dict or pandas.Series, optional
+            Starting values of p, q, v
+        warm_start: bool
+            Start from the current params_ if the model is already fitted
+        q_constraint: bool
+            Keep q above 1 so that the population mean exists, as in lifetimes
+        ftol, gtol: float
+            L-BFGS-B stopping tolerances, the defaults agree with GammaGammaFitter within 2e-7 relative
+
+        Returns:
+        --------
+        GammaGammaModel: self
+        """
+        x = np.asarray(frequency)
+        m = np.asarray(monetary_value)
+        if np.any(m <= 0):
+            raise ValueError("There exist non-positive (<= 0) values in the monetary_value vector.")
+
+        if weights is None:
+            x, m, weights = compress_customers(x, m)
+        else:
+            x, m = x.astype(np.float64), m.astype(np.float64)
+            weights = np.asarray(weights, dtype=np.float64)
+
+        if warm_start and self.params_ is not None:
+            initial_params = self.params_
+        if initial_params is None:
+            x0 = 0.1 * np.ones(3)
+        else:
+            x0 = np.log(pd.Series(initial_params)[PARAM_NAMES].to_numpy(dtype=np.float64))
+
+        output = minimize(_negative_log_likelihood, x0, jac=True, method="L-BFGS-B",
+                          args=(x, m, weights, self.penalizer_coef),
+                          bounds=((None, None), (0, None), (None, None)) if q_constraint else None,
+                          options={"ftol": ftol, "gtol": gtol, "maxiter": maxiter})
+        # Line search out of precision at a flat optimum, as in BGNBDFitter.fit
+        if not output.success and not (output.status == 2 and np.abs(output.jac).max() < 1e-6):
+            raise RuntimeError(f"The model did not converge: {output.message}")
+
+        self.params_ = pd.Series(np.exp(output.x), index=PARAM_NAMES)
+        self._negative_log_likelihood_ = output.fun
+        self.n_customers_ = weights.sum()
+        self.n_unique_ = len(weights)
+        return self
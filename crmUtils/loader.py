@@ -0,0 +1,157 @@
+###############################################################
+# Cached Loading of the online_retail_II Workbook
+###############################################################
+
+# Parsing online_retail_II.xlsx with pd.read_excel takes tens of seconds on every run.
+# Each sheet is converted once to a typed Parquet file and later runs read that file instead.
+# The cache is keyed on the source file's mtime and content hash, so an edited workbook is converted again.
+
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+from crmUtils.cleaning import add_invoice_columns
+from crmUtils.dtypes import ONLINE_RETAIL_COMPACT, compact_dtypes
+
+ONLINE_RETAIL_SHEETS = ["Year 2009-2010", "Year 2010-2011"]
+
+# StockCode matches the cancellations to their purchase lines (create_rfm(..., net_cancelled=True))
+RFM_COLUMNS = ["Invoice", "StockCode", "InvoiceDate", "Quantity", "Price", "Customer ID", "Cancelled"]
+
+# Changes when the layout of the cached Parquet files changes, older caches are converted again
+CACHE_VERSION = 2
+
+ONLINE_RETAIL_DTYPES = {"Invoice": "string",
+                        "StockCode": "string",
+                        "Description": "string",
+                        "Quantity": "int64",
+                        "Price": "float64",
+                        "Customer ID": "float64",
+                        "Country": "string"}
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """Return the sha1 hex digest of a file, read in chunks."""
+    sha1 = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+
+def _cache_paths(path, sheet_name, cache_dir):
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(path)), ".crm_cache")
+    stem = os.path.splitext(os.path.basename(path))[0]
+    sheet = str(sheet_name).replace(" ", "_")
+    base = os.path.join(cache_dir, f"{stem}__{sheet}")
+    return cache_dir, base + ".parquet", base + ".json"
+
+
+def _source_key(path, manifest):
+    """
+    Return the (mtime, size, sha1) key of the source file.
+
+    The file is hashed again only when its mtime or size differs from the manifest,
+    so an untouched workbook costs a stat call rather than a full read.
+    """
+    stat = os.stat(path)
+    if manifest and manifest["mtime"] == stat.st_mtime and manifest["size"] == stat.st_size:
+        return manifest["mtime"], manifest["size"], manifest["sha1"]
+    return stat.st_mtime, stat.st_size, file_hash(path)
+
+
+def _normalize_types(dataframe):
+    # Invoice and StockCode mix ints and strings in the workbook, which Parquet can not store as one column
+    for col, dtype in ONLINE_RETAIL_DTYPES.items():
+        if col in dataframe.columns:
+            if dtype == "string":
+                dataframe[col] = dataframe[col].astype(str).where(dataframe[col].notna()).astype("string")
+            else:
+                dataframe[col] = dataframe[col].astype(dtype)
+    if "InvoiceDate" in dataframe.columns:
+        dataframe["InvoiceDate"] = pd.to_datetime(dataframe["InvoiceDate"])
+    return dataframe
+
+
+def build_cache(path, sheet_name=ONLINE_RETAIL_SHEETS[0], cache_dir=None, force=False):
+    """
+    Convert one sheet of the workbook to Parquet if the cached copy is missing or stale.
+
+    Parameters:
+    -----------
+    path: str
+        Path of the online_retail_II.xlsx workbook
+    sheet_name: str
+        Sheet to convert
+    cache_dir: str, optional
+        Directory of the cache files, defaults to a .crm_cache folder next to the workbook
+    force: bool, optional
+        Convert again even if the cache is fresh
+
+    Returns:
+    --------
+    str: Path of the Parquet file
+    """
+    cache_dir, parquet_path, manifest_path = _cache_paths(path, sheet_name, cache_dir)
+
+    manifest = None
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+
+    mtime, size, sha1 = _source_key(path, manifest)
+    fresh = (manifest is not None and manifest["sha1"] == sha1 and os.path.exists(parquet_path)
+             and manifest.get("version") == CACHE_VERSION)
+
+    if force or not fresh:
+        os.makedirs(cache_dir, exist_ok=True)
+        dataframe = _normalize_types(pd.read_excel(path, sheet_name=sheet_name))
+        # Invoices are parsed once here, InvoiceNo and Cancelled replace str.contains("C") in later runs
+        dataframe = add_invoice_columns(dataframe)
+        dataframe.to_parquet(parquet_path, index=False)
+    elif manifest["mtime"] == mtime:
+        return parquet_path
+
+    # The content is unchanged when only the mtime moved, so the manifest is refreshed without converting again
+    with open(manifest_path, "w") as f:
+        json.dump({"source": os.path.abspath(path), "sheet_name": sheet_name,
+                   "mtime": mtime, "size": size, "sha1": sha1, "version": CACHE_VERSION}, f)
+    return parquet_path
+
+
+def load_online_retail(path, sheet_name=ONLINE_RETAIL_SHEETS[0], columns=None, cache_dir=None, compact=False,
+                       verbose=False):
+    """
+    Read one sheet of online_retail_II.xlsx through the Parquet cache.
+
+    Parameters:
+    -----------
+    path: str
+        Path of the online_retail_II.xlsx workbook
+    sheet_name: str
+        "Year 2009-2010" or "Year 2010-2011"
+    columns: list, optional
+        Columns to read, e.g. RFM_COLUMNS. Only these columns are read from disk.
+    cache_dir: str, optional
+        Directory of the cache files
+    compact: bool, optional
+        Cast to ONLINE_RETAIL_COMPACT (categorical strings, int32 quantities and ids, float32 prices),
+        see crmUtils.dtypes. verbose prints the bytes saved.
+
+    Returns:
+    --------
+    pandas.DataFrame
+    """
+    parquet_path = build_cache(path, sheet_name=sheet_name, cache_dir=cache_dir)
+    dataframe = pd.read_parquet(parquet_path, columns=columns)
+    if compact:
+        dataframe = compact_dtypes(dataframe, ONLINE_RETAIL_COMPACT, verbose=verbose)
+    return dataframe
+
+
+def warm_cache(path, sheet_names=ONLINE_RETAIL_SHEETS, cache_dir=None):
+    """Convert every sheet of the workbook, e.g. once at the start of the nightly job."""
+    return [build_cache(path, sheet_name=sheet, cache_dir=cache_dir) for sheet in sheet_names]
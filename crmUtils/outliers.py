@@ -0,0 +1,103 @@
+###############################################################
+# Vectorized Outlier Capping with Persisted Thresholds
+###############################################################
+
+# outlier_thresholds / replace_with_thresholds compute two quantiles per variable and do a masked .loc
+# assignment, one column at a time. OutlierCapper computes the quantiles of all columns in one
+# np.nanquantile call and caps each column with np.clip. The thresholds are kept (and can be saved),
+# so later batches, e.g. the chunks of a stream or the nightly delta, are capped with the same limits.
+
+import json
+
+import numpy as np
+import pandas as pd
+
+
+class OutlierCapper:
+    """
+    Cap columns at quantile + iqr_factor * inter-quantile range, like replace_with_thresholds.
+
+    Parameters:
+    -----------
+    lower_quantile, upper_quantile: float
+        The scripts use 0.01 and 0.99
+    iqr_factor: float
+        up_limit = q_upper + iqr_factor * (q_upper - q_lower), low_limit likewise
+    round_limits: bool
+        Round the limits to integers like the FLO variant, so capped order counts stay integers
+    cap_lower: bool
+        Also raise values below low_limit. The scripts only cap from above.
+
+    Example:
+    --------
+    capper = OutlierCapper(round_limits=True)
+    df = capper.fit_transform(df, ["order_num_total_ever_online", "order_num_total_ever_offline"])
+    capper.save("thresholds.json")
+    batch = OutlierCapper.load("thresholds.json").transform(batch)
+    """
+
+    def __init__(self, lower_quantile=0.01, upper_quantile=0.99, iqr_factor=1.5, round_limits=False,
+                 cap_lower=False):
+        self.lower_quantile = lower_quantile
+        self.upper_quantile = upper_quantile
+        self.iqr_factor = iqr_factor
+        self.round_limits = round_limits
+        self.cap_lower = cap_lower
+        self.thresholds_ = None
+
+    def fit(self, dataframe, columns):
+        """Learn low_limit and up_limit of every column with one np.nanquantile call."""
+        columns = list(columns)
+        values = np.column_stack([dataframe[col].to_numpy(dtype=np.float64, na_value=np.nan) for col in columns])
+        q_low, q_up = np.nanquantile(values, [self.lower_quantile, self.upper_quantile], axis=0)
+        interquartile_range = q_up - q_low
+        low_limit = q_low - self.iqr_factor * interquartile_range
+        up_limit = q_up + self.iqr_factor * interquartile_range
+        if self.round_limits:
+            # np.round rounds halves to even, the same as the built-in round of the FLO script
+            low_limit, up_limit = np.round(low_limit), np.round(up_limit)
+        self.thresholds_ = pd.DataFrame({"low_limit": low_limit, "up_limit": up_limit}, index=columns)
+        return self
+
+    def transform(self, dataframe, inplace=False):
+        """
+        Cap the fitted columns.
+
+        Integer columns stay integers when the limits are integers (round_limits), otherwise they become
+        float64 like the .loc assignment of a float limit did. inplace replaces the columns of dataframe
+        itself, otherwise a new frame is returned and dataframe is not modified.
+        """
+        if self.thresholds_ is None:
+            raise ValueError("The capper is not fitted yet.")
+        capped = {}
+        for col, (low_limit, up_limit) in self.thresholds_.iterrows():
+            values = dataframe[col].to_numpy()
+            if values.dtype.kind in "iu" and not (low_limit.is_integer() and up_limit.is_integer()):
+                values = values.astype(np.float64)
+            capped[col] = np.clip(values, low_limit if self.cap_lower else None, up_limit).astype(values.dtype)
+        if inplace:
+            for col, values in capped.items():
+                dataframe[col] = values
+            return dataframe
+        return dataframe.assign(**capped)
+
+    def fit_transform(self, dataframe, columns, inplace=False):
+        return self.fit(dataframe, columns).transform(dataframe, inplace=inplace)
+
+    def to_dict(self):
+        return {"lower_quantile": self.lower_quantile, "upper_quantile": self.upper_quantile,
+                "iqr_factor": self.iqr_factor, "round_limits": self.round_limits, "cap_lower": self.cap_lower,
+                "thresholds": self.thresholds_.to_dict(orient="index")}
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=1)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            config = json.load(f)
+        thresholds = config.pop("thresholds")
+        capper = cls(**config)
+        capper.thresholds_ = pd.DataFrame.from_dict(thresholds, orient="index")
+        return capper
@@ -0,0 +1,85 @@
+###############################################################
+# Parallel Per-Partition CLTV Aggregation
+###############################################################
+
+# The per-customer aggregates of create_cltv_c and create_cltv_p only need the rows of one customer.
+# The transactions are hash-partitioned by Customer ID, so every customer lives in exactly one partition,
+# and the partitions are reduced in a process pool. The partial results have disjoint customers
+# and are simply concatenated. Only the global parts stay on the calling process:
+# the total number of customers, the repeat/churn rate, the quantile segments and the model fits.
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from crmUtils.streaming import chunk_state
+from crmUtils.summary import cltv_summary
+
+
+def partition_by_customer(dataframe, n_partitions, customer_col="Customer ID"):
+    """
+    Split the rows into n_partitions frames by a hash of the customer id.
+
+    The row order within each partition is kept, so sums per customer add up in the same order
+    as on the whole frame.
+    """
+    # hash_pandas_object also hashes nullable (Int32) and categorical ids without converting them to objects
+    hashes = pd.util.hash_pandas_object(dataframe[customer_col], index=False).to_numpy()
+    partition = (hashes % np.uint64(n_partitions)).astype(np.int64)
+    order = np.argsort(partition, kind="stable")
+    bounds = np.searchsorted(partition[order], np.arange(n_partitions + 1))
+    return [dataframe.iloc[order[bounds[i]:bounds[i + 1]]] for i in range(n_partitions)]
+
+
+def _run(func, partitions, n_workers, kwargs):
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        futures = [executor.submit(func, partition, **kwargs) for partition in partitions]
+        results = [future.result() for future in futures]
+    # Keep one empty result when every partition comes back empty (e.g. cltv_summary drops every customer
+    # below min_frequency), so the columns and dtypes are still there
+    return pd.concat([result for result in results if len(result)] or results[:1]).sort_index()
+
+
+def parallel_apply(func, dataframe, n_workers=None, customer_col="Customer ID", **kwargs):
+    """
+    Run a per-customer aggregation on hash partitions of the data in a process pool.
+
+    Parameters:
+    -----------
+    func: callable
+        Module level function (it is pickled) taking a DataFrame and a customer_col keyword,
+        and returning one row per customer
+    dataframe: pandas.DataFrame
+        Cleaned transactions
+    n_workers: int, optional
+        Number of processes, defaults to the number of CPU cores. 1 runs serially in this process.
+    **kwargs:
+        Passed on to func
+
+    Returns:
+    --------
+    pandas.DataFrame: The results of all partitions, sorted by customer like the serial output
+    """
+    n_workers = n_workers or os.cpu_count() or 1
+    kwargs["customer_col"] = customer_col
+    if n_workers == 1:
+        return func(dataframe, **kwargs)
+    # With fewer customers than workers some hash partitions are empty, they are not dispatched
+    partitions = [part for part in partition_by_customer(dataframe, n_workers, customer_col) if len(part)]
+    if len(partitions) <= 1:
+        # An empty frame gives func's own empty result with the right columns
+        return func(dataframe, **kwargs)
+    return _run(func, partitions, min(n_workers, len(partitions)), kwargs)
+
+
+def parallel_state(dataframe, n_workers=None, customer_col="Customer ID"):
+    """chunk_state (invoices, units, total price, first/last date per customer) computed on all cores."""
+    return parallel_apply(chunk_state, dataframe, n_workers=n_workers, customer_col=customer_col)
+
+
+def parallel_cltv_summary(dataframe, today_date, freq="W", n_workers=None, customer_col="Customer ID", **kwargs):
+    """cltv_summary (recency, T, frequency, monetary) computed on all cores."""
+    return parallel_apply(cltv_summary, dataframe, n_workers=n_workers, customer_col=customer_col,
+                          today_date=today_date, freq=freq, **kwargs)
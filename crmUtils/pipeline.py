@@ -0,0 +1,354 @@
+###############################################################
+# Lazy, Stage-Cached Pipelines for the Whole-Process Functions
+###############################################################
+
+# create_rfm, create_cltv_c and create_cltv_p run loading, cleaning, aggregation, model fitting and
+# segmentation in one body, so changing only seg_map, profit or month redoes everything. Here each
+# function is a DAG of named stages. The key of a stage result is a sha1 over the stage name, its own
+# parameters and the keys of its inputs, and the key of the source data is a hash of its content. A stage
+# whose key was seen before is taken from an in-memory LRU or from a pickle on disk, so after a change
+# of month only predict and segment run again, after a change of seg_map only segment.
+# Stages run only when the requested target needs them, and the computed ones are timed by a profiler.
+
+import datetime as dt
+import hashlib
+import json
+import os
+from collections import OrderedDict
+
+import pandas as pd
+
+from crmUtils.bgnbd import BGNBDFitter
+from crmUtils.cleaning import clean_transactions
+from crmUtils.gamma_gamma import GammaGammaModel
+from crmUtils.outliers import OutlierCapper
+from crmUtils.parallel import parallel_cltv_summary, parallel_state
+from crmUtils.prediction import predict_horizons
+from crmUtils.profiling import NULL_PROFILER
+from crmUtils.quantiles import qcut_scores
+from crmUtils.rfm import rfm_metrics, rfm_scores
+from crmUtils.segments import SEG_MAP, assign_segments
+from crmUtils.streaming import cltv_c_from_state
+
+
+def frame_fingerprint(dataframe):
+    """sha1 hex digest of the columns, dtypes, index and values of a frame."""
+    sha1 = hashlib.sha1()
+    sha1.update(repr([(str(col), str(dtype)) for col, dtype in dataframe.dtypes.items()]).encode())
+    sha1.update(pd.util.hash_pandas_object(dataframe, index=True).to_numpy().tobytes())
+    return sha1.hexdigest()
+
+
+def _param_text(value):
+    # Stable text of a parameter value, dict order matters for seg_map so keys are not sorted
+    return json.dumps(value, default=repr)
+
+
+def _share(value):
+    # Callers and later stages get shallow copies, under copy-on-write their changes never reach the cache
+    return value.copy(deep=False) if isinstance(value, (pd.DataFrame, pd.Series)) else value
+
+
+class Stage:
+    """
+    One named step of a Pipeline.
+
+    Parameters:
+    -----------
+    name: str
+    func: callable
+        Called with the results of inputs as positional arguments and the stage parameters as keywords
+    inputs: tuple
+        Names of the upstream stages, "data" is the source frame
+    params: dict
+        Parameter name -> default value, part of the cache key
+    options: dict
+        Parameter name -> default value that does not change the result (e.g. n_workers, registry),
+        passed to func but not part of the cache key
+    persist: bool
+        Also keep the result on disk when the pipeline has a cache_dir
+    version: int
+        Bump it when func changes, so results cached by the old code are not used
+    """
+
+    def __init__(self, name, func, inputs=(), params=None, options=None, persist=True, version=1):
+        self.name = name
+        self.func = func
+        self.inputs = tuple(inputs)
+        self.params = dict(params or {})
+        self.options = dict(options or {})
+        self.persist = persist
+        self.version = version
+
+
+class Pipeline:
+    """
+    A DAG of stages with content-hashed results cached in memory (LRU) and optionally on disk.
+
+    Parameters:
+    -----------
+    name: str
+        Prefix of the cache files and the pipeline of the profiler records
+    stages: list
+        Stage objects in an order where inputs come before the stages using them
+    cache_dir: str, optional
+        Directory of the pickled stage results, no disk cache if None
+    max_items: int
+        Stage results kept in memory, the least recently used are evicted first
+    max_disk_items: int, optional
+        Files kept in cache_dir for this pipeline, the least recently used are deleted
+
+    Example:
+    --------
+    dag = cltv_p_dag(cache_dir=".crm_cache/cltv_p")
+    cltv_final = dag.run(df_, month=3)
+    cltv_final = dag.run(df_, month=6)   # only predict and segment run again
+    dag.last_run                          # {"summary": "memory", "fit": "memory", "predict": "computed", ...}
+    """
+
+    def __init__(self, name, stages, cache_dir=None, max_items=16, max_disk_items=None):
+        self.name = name
+        self.stages = OrderedDict((stage.name, stage) for stage in stages)
+        self.cache_dir = cache_dir
+        self.max_items = max_items
+        self.max_disk_items = max_disk_items
+        self._memory = OrderedDict()
+        self.last_run = {}
+        for stage in stages:
+            missing = [name for name in stage.inputs if name != "data" and name not in self.stages]
+            if missing:
+                raise ValueError(f"Stage {stage.name!r} uses unknown stages {missing}")
+
+    @property
+    def params(self):
+        """Every parameter and option of the stages with its default."""
+        merged = {}
+        for stage in self.stages.values():
+            merged.update(stage.params)
+            merged.update(stage.options)
+        return merged
+
+    def keys(self, data_key, params=None):
+        """Cache key of every stage for a source data key and parameter overrides."""
+        params = params or {}
+        keys = {"data": data_key}
+        for stage in self.stages.values():
+            sha1 = hashlib.sha1(f"{self.name}/{stage.name}/v{stage.version}".encode())
+            for name in sorted(stage.params):
+                sha1.update(f"{name}={_param_text(params.get(name, stage.params[name]))};".encode())
+            for name in stage.inputs:
+                sha1.update(keys[name].encode())
+            keys[stage.name] = sha1.hexdigest()
+        return keys
+
+    def _path(self, stage_name, key):
+        return os.path.join(self.cache_dir, f"{self.name}-{stage_name}-{key[:20]}.pkl")
+
+    def _remember(self, key, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_items:
+            self._memory.popitem(last=False)
+
+    def _load(self, stage, key):
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return "memory", self._memory[key]
+        if self.cache_dir is not None and stage.persist:
+            path = self._path(stage.name, key)
+            if os.path.exists(path):
+                value = pd.read_pickle(path)
+                # The mtime marks the last use for the disk eviction
+                os.utime(path)
+                self._remember(key, value)
+                return "disk", value
+        return None, None
+
+    def _store(self, stage, key, value):
+        self._remember(key, value)
+        if self.cache_dir is None or not stage.persist:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(stage.name, key)
+        # Written under a temporary name first, a crash never leaves a truncated cache file
+        pd.to_pickle(value, path + ".tmp")
+        os.replace(path + ".tmp", path)
+        if self.max_disk_items is not None:
+            files = [os.path.join(self.cache_dir, f) for f in os.listdir(self.cache_dir)
+                     if f.startswith(self.name + "-") and f.endswith(".pkl")]
+            for old in sorted(files, key=os.path.getmtime)[:max(len(files) - self.max_disk_items, 0)]:
+                os.remove(old)
+
+    def run(self, data, target=None, data_key=None, profiler=None, **params):
+        """
+        Compute target (the last stage by default) and the stages it depends on, using cached results.
+
+        Parameters:
+        -----------
+        data: pandas.DataFrame
+            Source frame of the stages whose input is "data"
+        target: str, optional
+            Stage whose result is returned
+        data_key: str, optional
+            Key of the source data, e.g. the sha1 of the loader cache, saves hashing the frame
+        profiler: crmUtils.profiling.Profiler, optional
+            Times the stages that are computed
+        **params:
+            Parameter and option overrides, see the params property
+
+        Returns:
+        --------
+        The result of target, DataFrames and Series as shallow copies of the cached result
+        """
+        unknown = set(params) - set(self.params)
+        if unknown:
+            raise TypeError(f"Unknown parameters {sorted(unknown)} of pipeline {self.name!r}")
+        target = target or next(reversed(self.stages))
+        profiler = (profiler or NULL_PROFILER).bind(pipeline=self.name)
+        keys = self.keys(data_key or frame_fingerprint(data), params)
+
+        self.last_run = {}
+        results = {"data": data}
+
+        def resolve(name):
+            if name in results:
+                return results[name]
+            stage = self.stages[name]
+            source, value = self._load(stage, keys[name])
+            if source is None:
+                inputs = [_share(resolve(input_name)) for input_name in stage.inputs]
+                kwargs = {key: params.get(key, default) for key, default in {**stage.params, **stage.options}.items()}
+                value = profiler.call(name, stage.func, *inputs, **kwargs)
+                self._store(stage, keys[name], value)
+                source = "computed"
+            self.last_run[name] = source
+            results[name] = value
+            return value
+
+        return _share(resolve(target))
+
+    def clear(self, disk=False):
+        """Forget the results kept in memory, and the files of this pipeline in cache_dir if disk is True."""
+        self._memory.clear()
+        if disk and self.cache_dir is not None and os.path.isdir(self.cache_dir):
+            for f in os.listdir(self.cache_dir):
+                if f.startswith(self.name + "-") and f.endswith(".pkl"):
+                    os.remove(os.path.join(self.cache_dir, f))
+
+
+ONLINE_RETAIL_TODAY = dt.datetime(2011, 12, 11)
+
+
+# create_rfm
+
+def _rfm_clean(data, net_cancelled):
+    return clean_transactions(data, net_cancelled=net_cancelled)
+
+
+def _rfm_metrics(cleaned, today_date):
+    rfm = rfm_metrics(cleaned, today_date)
+    return rfm[rfm["Monetary"] > 0]
+
+
+def _rfm_scores(rfm):
+    # Scores only, the segments are their own stage so a new seg_map does not score again
+    return rfm_scores(rfm, seg_map=None)
+
+
+def _rfm_segments(rfm, seg_map):
+    rfm = rfm.assign(segment=assign_segments(rfm["recency_score"], rfm["frequency_score"], seg_map=seg_map))
+    rfm = rfm[["segment", "Recency", "Frequency", "Monetary"]]
+    rfm.index = rfm.index.astype(int)
+    return rfm
+
+
+def rfm_dag(cache_dir=None, max_items=16, max_disk_items=None):
+    """create_rfm as clean -> metrics -> scores -> segment."""
+    return Pipeline("create_rfm", [
+        Stage("clean", _rfm_clean, ["data"], params={"net_cancelled": False}),
+        Stage("metrics", _rfm_metrics, ["clean"], params={"today_date": ONLINE_RETAIL_TODAY}),
+        Stage("scores", _rfm_scores, ["metrics"]),
+        Stage("segment", _rfm_segments, ["scores"], params={"seg_map": SEG_MAP}, persist=False),
+    ], cache_dir=cache_dir, max_items=max_items, max_disk_items=max_disk_items)
+
+
+# create_cltv_c
+
+def _cltv_c_clean(data, net_cancelled):
+    return clean_transactions(data, positive_quantity=True, net_cancelled=net_cancelled)
+
+
+def _cltv_c_aggregate(cleaned, n_workers):
+    return parallel_state(cleaned, n_workers=n_workers)
+
+
+def _cltv_c_value(state, profit):
+    # The same table as create_cltv_c_streaming and CustomerStateStore.cltv_c, segment included
+    return cltv_c_from_state(state, profit=profit)
+
+
+def cltv_c_dag(cache_dir=None, max_items=16, max_disk_items=None):
+    """create_cltv_c as clean -> aggregate -> value, the value stage also cuts the segments."""
+    return Pipeline("create_cltv_c", [
+        Stage("clean", _cltv_c_clean, ["data"], params={"net_cancelled": False}),
+        Stage("aggregate", _cltv_c_aggregate, ["clean"], options={"n_workers": 1}, version=2),
+        Stage("value", _cltv_c_value, ["aggregate"], params={"profit": 10}, version=2),
+    ], cache_dir=cache_dir, max_items=max_items, max_disk_items=max_disk_items)
+
+
+# create_cltv_p
+
+def _cltv_p_clean(data):
+    # TotalPrice is added after the capping
+    return clean_transactions(data, positive_quantity=True, positive_price=True, total_price=False)
+
+
+def _cltv_p_outliers(cleaned):
+    capped = OutlierCapper().fit_transform(cleaned, ["Quantity", "Price"])
+    return capped.assign(TotalPrice=capped["Quantity"] * capped["Price"])
+
+
+def _cltv_p_summary(capped, today_date, n_workers):
+    return parallel_cltv_summary(capped, today_date, freq="W", n_workers=n_workers)
+
+
+def _cltv_p_fit(summary, penalizer_coef, registry, today_date):
+    if registry is not None:
+        # Stored parameters are reused when the summary table and the penalizer did not change
+        return registry.fit_or_load("online_retail", summary["frequency"], summary["recency"], summary["T"],
+                                    summary["monetary"], penalizer_coef=penalizer_coef, today_date=today_date)
+    bgf = BGNBDFitter(penalizer_coef=penalizer_coef).fit(summary["frequency"], summary["recency"], summary["T"])
+    ggf = GammaGammaModel(penalizer_coef=penalizer_coef).fit(summary["frequency"], summary["monetary"])
+    return bgf, ggf
+
+
+def _cltv_p_predict(summary, models, month, discount_rate):
+    bgf, ggf = models
+    predictions = predict_horizons(bgf, ggf, summary["frequency"], summary["recency"], summary["T"],
+                                   summary["monetary"], horizons=(1, 4, 4 * 3), clv_months=(month,), freq="W",
+                                   discount_rate=discount_rate)
+    cltv_df = summary.assign(expected_purc_1_week=predictions["expected_purc_1"],
+                             expected_purc_1_month=predictions["expected_purc_4"],
+                             expected_purc_3_month=predictions["expected_purc_12"],
+                             expected_average_profit=predictions["expected_average_profit"])
+    cltv = predictions[f"clv_{month}"].rename("clv").reset_index()
+    return cltv_df.merge(cltv, on="Customer ID", how="left")
+
+
+def _cltv_p_segments(cltv_final):
+    return cltv_final.assign(segment=qcut_scores(cltv_final["clv"], 4, labels=["D", "C", "B", "A"]))
+
+
+def cltv_p_dag(cache_dir=None, max_items=16, max_disk_items=None):
+    """create_cltv_p as clean -> outliers -> summary -> fit -> predict -> segment."""
+    return Pipeline("create_cltv_p", [
+        Stage("clean", _cltv_p_clean, ["data"], version=2),
+        Stage("outliers", _cltv_p_outliers, ["clean"]),
+        Stage("summary", _cltv_p_summary, ["outliers"], params={"today_date": ONLINE_RETAIL_TODAY},
+              options={"n_workers": 1}),
+        # today_date is only recorded in the registry, the summary key already depends on it
+        Stage("fit", _cltv_p_fit, ["summary"], params={"penalizer_coef": 0.001},
+              options={"registry": None, "today_date": ONLINE_RETAIL_TODAY}),
+        Stage("predict", _cltv_p_predict, ["summary", "fit"], params={"month": 3, "discount_rate": 0.01}),
+        Stage("segment", _cltv_p_segments, ["predict"], persist=False),
+    ], cache_dir=cache_dir, max_items=max_items, max_disk_items=max_disk_items)
@@ -0,0 +1,142 @@
+###############################################################
+# Multi-Horizon BG/NBD and CLTV Prediction in One Pass
+###############################################################
+
+# create_cltv_p calls bgf.predict for 1, 4 and 12 weeks, and customer_lifetime_value calls it twice per
+# discounted month (the prediction at the end and at the start of the month). Each call recomputes the same
+# per-customer terms. Here every distinct time point is evaluated once on a (customers x time points) grid,
+# the monthly increments are one np.diff, and the discounted CLTV of every month count is one cumulative sum.
+
+import numpy as np
+import pandas as pd
+
+from crmUtils.predictors import PERIODS_PER_MONTH, expected_purchases
+
+
+def _params(model, names):
+    # params_ is a Series for the fitters and lifetimes, a dict for the predictors of a registry record
+    return np.array([model.params_[name] for name in names], dtype=np.float64)
+
+
+def _month_discounts(max_month, discount_rate, factor):
+    month_points = np.arange(1, max_month + 1) * factor
+    return 1 / (1 + discount_rate) ** (month_points / factor)
+
+
+def _monthly_increments(cumulative):
+    # Cumulative purchases at the month boundaries -> purchases within each month
+    return np.diff(np.concatenate([np.zeros((cumulative.shape[0], 1)), cumulative], axis=1), axis=1)
+
+
+def _discounted_clv(adjusted_m, monthly, discount):
+    # The discounted value accumulated month by month, column k - 1 is the CLTV of k months
+    return adjusted_m[:, None] * np.cumsum(monthly * discount[None, :], axis=1)
+
+
+def expected_average_profit(ggf, frequency, monetary_value):
+    """Gamma-Gamma expected average profit in float64, for any fitted model or registry predictor."""
+    p, q, v = _params(ggf, ["p", "q", "v"])
+    x = np.asarray(frequency, dtype=np.float64)
+    m = np.asarray(monetary_value, dtype=np.float64)
+    return p * (v + x * m) / (p * x + q - 1)
+
+
+def monthly_purchases(bgf, frequency, recency, T, months, freq="W", batch_size=1_000_000):
+    """
+    Expected purchases of each customer within each of the next months months.
+
+    The model is evaluated once. discount_clv turns the result into the CLTV of any discount rate,
+    which is how cltv_sweep evaluates several discount rates per fitted model.
+
+    Returns:
+    --------
+    numpy.ndarray: Shape (customers, months), column k - 1 holds the purchases of month k
+    """
+    x, t_x, T_ = (np.asarray(col, dtype=np.float64) for col in (frequency, recency, T))
+    month_points = np.arange(1, months + 1) * PERIODS_PER_MONTH[freq]
+    bgf_params = _params(bgf, ["r", "alpha", "a", "b"])
+    monthly = np.empty((len(x), months))
+    for start in range(0, len(x), batch_size):
+        batch = slice(start, start + batch_size)
+        cumulative = expected_purchases(bgf_params, month_points[None, :], x[batch, None], t_x[batch, None],
+                                        T_[batch, None])
+        monthly[batch] = _monthly_increments(cumulative)
+    return monthly
+
+
+def discount_clv(monthly, adjusted_profit, clv_months, discount_rate=0.01, freq="W"):
+    """
+    Discounted CLTV from the output of monthly_purchases, the same values as predict_horizons.
+
+    Returns:
+    --------
+    numpy.ndarray: Shape (customers, len(clv_months)), one column per month count
+    """
+    discount = _month_discounts(monthly.shape[1], discount_rate, PERIODS_PER_MONTH[freq])
+    clv = _discounted_clv(np.asarray(adjusted_profit, dtype=np.float64), monthly, discount)
+    return clv[:, [month - 1 for month in clv_months]]
+
+
+def predict_horizons(bgf, ggf, frequency, recency, T, monetary_value, horizons=(1, 4, 12), clv_months=(3,),
+                     discount_rate=0.01, freq="W", batch_size=1_000_000):
+    """
+    Expected purchases for several horizons and discounted CLTV for several month counts.
+
+    Parameters:
+    -----------
+    bgf: fitted BGNBDFitter or lifetimes.BetaGeoFitter
+    ggf: fitted GammaGammaModel or lifetimes.GammaGammaFitter, may be None if clv_months is empty
+    frequency, recency, T, monetary_value: array_like
+        Customer summary, recency and T in freq units
+    horizons: iterable
+        Horizons of the expected purchases, in freq units (weeks for the scripts)
+    clv_months: iterable
+        Month counts of the CLTV, the time argument of customer_lifetime_value
+    discount_rate: float
+        Monthly discount rate
+    freq: str
+        Time unit of recency and T, "W", "M", "D" or "H"
+    batch_size: int
+        Customers per batch, bounds the size of the time point grid
+
+    Returns:
+    --------
+    pandas.DataFrame: Columns expected_purc_<h> for each horizon, expected_average_profit and clv_<m> for each
+                      month count, indexed like frequency if it is a Series
+    """
+    horizons = list(horizons)
+    clv_months = list(clv_months)
+    index = frequency.index if isinstance(frequency, pd.Series) else None
+    x, t_x, T_ = (np.asarray(col, dtype=np.float64) for col in (frequency, recency, T))
+    m = np.asarray(monetary_value, dtype=np.float64)
+
+    factor = PERIODS_PER_MONTH[freq]
+    max_month = max(clv_months, default=0)
+    month_points = np.arange(1, max_month + 1) * factor
+    # Every distinct time point once: the purchase horizons and the month boundaries of the CLTV
+    time_points, inverse = np.unique(np.r_[np.asarray(horizons, dtype=np.float64), month_points], return_inverse=True)
+    horizon_cols = inverse[:len(horizons)]
+    month_cols = inverse[len(horizons):]
+    discount = _month_discounts(max_month, discount_rate, factor)
+
+    bgf_params = _params(bgf, ["r", "alpha", "a", "b"])
+    if clv_months:
+        adjusted_m = expected_average_profit(ggf, x, m)
+
+    result = {f"expected_purc_{h}": np.empty(len(x)) for h in horizons}
+    if clv_months:
+        result["expected_average_profit"] = adjusted_m
+        result.update({f"clv_{month}": np.empty(len(x)) for month in clv_months})
+
+    for start in range(0, len(x), batch_size):
+        batch = slice(start, start + batch_size)
+        grid = expected_purchases(bgf_params, time_points[None, :], x[batch, None], t_x[batch, None], T_[batch, None])
+        for h, col in zip(horizons, horizon_cols):
+            result[f"expected_purc_{h}"][batch] = grid[:, col]
+        if clv_months:
+            # Purchases within each month, then the discounted value accumulated month by month
+            clv = _discounted_clv(adjusted_m[batch], _monthly_increments(grid[:, month_cols]), discount)
+            for month in clv_months:
+                result[f"clv_{month}"][batch] = clv[:, month - 1]
+
+    return pd.DataFrame(result, index=index)
@@ -0,0 +1,140 @@
+###############################################################
+# Predictions from Fitted BG/NBD and Gamma-Gamma Parameters
+###############################################################
+
+# Predicting with fitted parameters needs NumPy and scipy.special.hyp2f1 only. The fitters need
+# scipy.optimize and pandas, which take most of a second to import. The prediction side lives here,
+# so the scorer imports nothing else, and the models of a ModelRegistry record are BGNBDPredictor and
+# GammaGammaPredictor objects that never import the optimizer. BGNBDFitter and GammaGammaModel
+# inherit their prediction methods from these classes.
+
+import sys
+
+import numpy as np
+from scipy.special import expit, hyp2f1
+
+# Periods per month for the time unit of recency and T, as in lifetimes.customer_lifetime_value
+PERIODS_PER_MONTH = {"W": 4.345, "M": 1.0, "D": 30, "H": 30 * 24}
+
+
+def expected_purchases(params, t, frequency, recency, T):
+    """
+    Expected number of purchases in the next t periods, equation (10) of Fader, Hardie and Lee (2005).
+
+    All arguments broadcast, e.g. frequency[:, None] against t[None, :] evaluates several horizons at once.
+    Only the hypergeometric term depends on t, the other customer terms are computed once per customer.
+    """
+    r, alpha, a, b = params
+    x = frequency
+    _a = r + x
+    _b = b + x
+    _c = a + b + x - 1
+    _z = t / (alpha + T + t)
+    ln_hyp_term = np.log(hyp2f1(_a, _b, _c, _z))
+    # An equivalent form is used where the first one overflows
+    ln_hyp_term_alt = np.log(hyp2f1(_c - _a, _c - _b, _c, _z)) + (_c - _a - _b) * np.log(1 - _z)
+    ln_hyp_term = np.where(np.isinf(ln_hyp_term), ln_hyp_term_alt, ln_hyp_term)
+
+    first_term = (a + b + x - 1) / (a - 1)
+    second_term = 1 - np.exp(ln_hyp_term + (r + x) * np.log((alpha + T) / (alpha + t + T)))
+    numerator = first_term * second_term
+    denominator = 1 + (x > 0) * (a / (b + x - 1)) * ((alpha + T) / (alpha + recency)) ** (r + x)
+    return numerator / denominator
+
+
+class BGNBDPredictor:
+    """
+    Predictions of a BG/NBD model with given parameters, the lifetimes.BetaGeoFitter prediction interface.
+    BGNBDFitter adds fit to it, ModelRegistry loads stored parameters into it without any fitting code.
+
+    Example:
+    --------
+    bgf = BGNBDPredictor({"r": 1.37, "alpha": 10.7, "a": 0.25, "b": 2.86})
+    bgf.predict(4, frequency=5, recency=30.5, T=52.0)
+    """
+
+    param_names = ["r", "alpha", "a", "b"]
+
+    def __init__(self, params=None):
+        self.params_ = None if params is None else {k: float(params[k]) for k in self.param_names}
+
+    def _unload_params(self):
+        if self.params_ is None:
+            raise ValueError("The model is not fitted yet.")
+        return np.array([self.params_[k] for k in self.param_names], dtype=np.float64)
+
+    def conditional_expected_number_of_purchases_up_to_time(self, t, frequency, recency, T):
+        """Expected number of purchases in the next t periods, equation (10) of Fader, Hardie and Lee (2005)."""
+        return expected_purchases(self._unload_params(), t, frequency, recency, T)
+
+    predict = conditional_expected_number_of_purchases_up_to_time
+
+    def conditional_probability_alive(self, frequency, recency, T):
+        """Probability that a customer with the given history is still alive."""
+        r, alpha, a, b = self._unload_params()
+        log_div = ((r + frequency) * np.log((alpha + T) / (alpha + recency))
+                   + np.log(a / (b + np.maximum(frequency, 1) - 1)))
+        return np.where(frequency == 0, 1.0, expit(-log_div))
+
+
+class GammaGammaPredictor:
+    """
+    Predictions of a Gamma-Gamma model with given parameters, the lifetimes.GammaGammaFitter prediction
+    interface. GammaGammaModel adds fit to it.
+
+    Example:
+    --------
+    ggf = GammaGammaPredictor({"p": 14.1, "q": 0.71, "v": 13.9})
+    ggf.customer_lifetime_value(bgf, frequency, recency, T, monetary, time=3, freq="W")
+    """
+
+    param_names = ["p", "q", "v"]
+
+    def __init__(self, params=None):
+        self.params_ = None if params is None else {k: float(params[k]) for k in self.param_names}
+
+    def _unload_params(self):
+        if self.params_ is None:
+            raise ValueError("The model is not fitted yet.")
+        return np.array([self.params_[k] for k in self.param_names], dtype=np.float64)
+
+    def conditional_expected_average_profit(self, frequency, monetary_value):
+        """
+        Expected average profit per purchase.
+
+        The weighted average of the customer's own mean and the population mean,
+        (1 - w) * v * p / (q - 1) + w * m with w = p * x / (p * x + q - 1),
+        reduces to the single expression p * (v + x * m) / (p * x + q - 1).
+        float32 input gives float32 output.
+        """
+        p, q, v = self._unload_params()
+        x = frequency
+        m = monetary_value
+        dtype = getattr(m, "dtype", np.float64)
+        if dtype == np.float32:
+            p, q, v = np.float32(p), np.float32(q), np.float32(v)
+        return p * (v + x * m) / (p * x + q - 1)
+
+    def customer_lifetime_value(self, transaction_prediction_model, frequency, recency, T, monetary_value,
+                                time=12, discount_rate=0.01, freq="D"):
+        """
+        Discounted CLTV over time months, same as lifetimes.GammaGammaFitter.customer_lifetime_value.
+
+        transaction_prediction_model is a fitted BG/NBD model (BGNBDFitter, BGNBDPredictor or BetaGeoFitter),
+        freq is the time unit of recency and T.
+        """
+        adjusted_monetary_value = self.conditional_expected_average_profit(frequency, monetary_value)
+        factor = PERIODS_PER_MONTH[freq]
+
+        clv = 0
+        for i in np.arange(1, time + 1) * factor:
+            # The predictions are cumulative, so the previous period is subtracted
+            expected_number_of_transactions = (transaction_prediction_model.predict(i, frequency, recency, T)
+                                               - transaction_prediction_model.predict(i - factor, frequency, recency, T))
+            clv = clv + (adjusted_monetary_value * expected_number_of_transactions) / (1 + discount_rate) ** (i / factor)
+
+        # A Series can only come in when pandas is loaded, this module does not import it
+        pd = sys.modules.get("pandas")
+        if pd is not None and isinstance(frequency, pd.Series):
+            return pd.Series(np.asarray(clv, dtype=np.float64), index=frequency.index, name="clv")
+        return clv
@@ -0,0 +1,248 @@
+###############################################################
+# Quantile Binning with Exact and Approximate (KLL) Modes
+###############################################################
+
+# RFM scores come from pd.qcut on Recency and Monetary and on Frequency.rank(method="first"),
+# and CLTV segments from pd.qcut(cltv, 4, labels=["D", "C", "B", "A"]). Each call sorts the whole column.
+# QuantileBinner learns the bin edges chunk by chunk, either exactly (all values are kept)
+# or approximately with a mergeable KLL sketch of bounded size.
+
+# Rank error of the approximate mode:
+# KLL with k = 200 keeps at most about 3k items per sketch, whatever the number of values.
+# A quantile it returns has a normalized rank error of about 1.7% (99% confidence, after any number
+# of merges). A customer can therefore land in the neighbouring bin only if its rank is within
+# about 1.7% of n from a bin edge. The error shrinks roughly as 1/k.
+
+# rank(method="first") also needs, for each distinct value, how many equal values earlier chunks held.
+# These tie counts are two sorted arrays (value, count) updated with NumPy. Their size is the number of
+# distinct values, so rank_first is limited to integer values (order counts such as Frequency) with at
+# most max_tie_values distinct values. This keeps the approximate mode bounded in memory.
+
+import numpy as np
+import pandas as pd
+
+MAX_TIE_VALUES = 1_000_000
+
+
+class KLLSketch:
+    """
+    Mergeable quantile sketch (Karnin, Lang, Liberty 2016) with NumPy compactors.
+
+    Level h holds items that each stand for 2**h values. When a level is over its capacity
+    it is sorted, and every other item (random offset) is promoted to the next level.
+    """
+
+    def __init__(self, k=200, seed=None):
+        self.k = k
+        self.n = 0
+        self.levels = [np.empty(0)]
+        self.min = np.inf
+        self.max = -np.inf
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, h):
+        depth = len(self.levels) - h - 1
+        return max(2, int(np.ceil(self.k * (2 / 3) ** depth)))
+
+    def _compress(self):
+        h = 0
+        while h < len(self.levels):
+            if len(self.levels[h]) > self._capacity(h):
+                if h + 1 == len(self.levels):
+                    self.levels.append(np.empty(0))
+                items = np.sort(self.levels[h])
+                # An odd item stays on its level
+                keep = items[:len(items) % 2]
+                items = items[len(items) % 2:]
+                promoted = items[self._rng.integers(2)::2]
+                self.levels[h] = keep
+                self.levels[h + 1] = np.concatenate([self.levels[h + 1], promoted])
+            h += 1
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return self
+        self.n += len(values)
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compress()
+        return self
+
+    def merge(self, other):
+        """Merge another sketch into this one, e.g. the sketches of several chunks or workers."""
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for h, items in enumerate(other.levels):
+            self.levels[h] = np.concatenate([self.levels[h], items])
+        self.n += other.n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress()
+        return self
+
+    def _weighted(self):
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level), 2.0 ** h) for h, level in enumerate(self.levels)])
+        order = np.argsort(items, kind="stable")
+        return items[order], np.cumsum(weights[order])
+
+    def quantile(self, qs):
+        """Approximate quantiles, the lowest and highest are the exact min and max."""
+        qs = np.asarray(qs, dtype=np.float64)
+        items, cum_weights = self._weighted()
+        idx = np.searchsorted(cum_weights, qs * cum_weights[-1], side="left")
+        result = items[np.clip(idx, 0, len(items) - 1)]
+        result = np.where(qs <= 0, self.min, result)
+        return np.where(qs >= 1, self.max, result)
+
+    def rank(self, values):
+        """Approximate number of values strictly less than each of values."""
+        items, cum_weights = self._weighted()
+        idx = np.searchsorted(items, np.asarray(values, dtype=np.float64), side="left")
+        # The weights are scaled so that they add up to the exact count n
+        return np.where(idx > 0, cum_weights[np.maximum(idx - 1, 0)], 0.0) * self.n / cum_weights[-1]
+
+
+class QuantileBinner:
+    """
+    Quantile binning that can be fitted chunk by chunk and on several workers.
+
+    Parameters:
+    -----------
+    q: int
+        Number of bins
+    labels: list, optional
+        Labels of the bins from lowest to highest, e.g. [5, 4, 3, 2, 1] for recency
+    method: str
+        "exact" keeps every value and gives the pd.qcut bins, "approx" keeps a KLL sketch
+    rank_first: bool
+        Bin rank(method="first") instead of the values, as done for Frequency. Ties are ordered
+        by the order of the values given to transform, which must then be the fitting order.
+        The values must be integers, see the tie count note at the top of this module.
+    k: int
+        Size parameter of the KLL sketch, see the rank error note at the top of this module
+    max_tie_values: int
+        With rank_first, the most distinct values whose tie counts are kept. More raise a ValueError.
+
+    Example:
+    --------
+    binner = QuantileBinner(5, labels=[1, 2, 3, 4, 5], method="approx")
+    for chunk in chunks: binner.partial_fit(chunk["Monetary"])
+    scores = [binner.transform(chunk["Monetary"]) for chunk in chunks]
+    """
+
+    def __init__(self, q=5, labels=None, method="exact", rank_first=False, k=200, seed=None,
+                 max_tie_values=MAX_TIE_VALUES):
+        if method not in ("exact", "approx"):
+            raise ValueError(f"method must be 'exact' or 'approx', got {method!r}")
+        self.q = q
+        self.labels = labels if labels is not None else list(range(q))
+        self.method = method
+        self.rank_first = rank_first
+        self.sketch = KLLSketch(k=k, seed=seed) if method == "approx" else None
+        self._values = []
+        self._sorted = None
+        self.max_tie_values = max_tie_values
+        self._reset_ties()
+
+    @property
+    def n(self):
+        return self.sketch.n if self.sketch is not None else len(self._sorted_values())
+
+    def _sorted_values(self):
+        if self._sorted is None:
+            self._sorted = np.sort(np.concatenate(self._values)) if self._values else np.empty(0)
+        return self._sorted
+
+    def partial_fit(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        if self.sketch is not None:
+            self.sketch.update(values)
+        else:
+            self._values.append(values[~np.isnan(values)])
+            self._sorted = None
+        return self
+
+    def merge(self, other):
+        if self.sketch is not None:
+            self.sketch.merge(other.sketch)
+        else:
+            self._values.extend(other._values)
+            self._sorted = None
+        return self
+
+    def edges(self):
+        """Bin edges from the lowest to the highest value (or rank)."""
+        qs = np.linspace(0, 1, self.q + 1)
+        if self.rank_first:
+            # Ranks 1..n are uniform, their quantiles need no sketch
+            return 1 + qs * (self.n - 1)
+        if self.sketch is not None:
+            return self.sketch.quantile(qs)
+        return np.quantile(self._sorted_values(), qs)
+
+    def _rank_below(self, values):
+        if self.sketch is not None:
+            return self.sketch.rank(values)
+        return np.searchsorted(self._sorted_values(), values, side="left").astype(np.float64)
+
+    def _reset_ties(self):
+        # Sorted distinct values given to transform so far and the number of times each was given
+        self._tie_values = np.empty(0)
+        self._tie_counts = np.empty(0, dtype=np.int64)
+
+    def _first_ranks(self, values):
+        # rank(method="first") = values below + equal values of earlier calls + position among the equal
+        # values of this call + 1. The first two are looked up once per distinct value.
+        valid = ~np.isnan(values)
+        codes, uniques = pd.factorize(values[valid])
+        if not np.array_equal(uniques, np.round(uniques)):
+            raise ValueError("rank_first needs integer values such as order counts")
+        offsets = pd.Series(codes).groupby(codes, sort=False).cumcount().to_numpy()
+
+        pos = np.searchsorted(self._tie_values, uniques)
+        found = pos < len(self._tie_values)
+        found[found] = self._tie_values[pos[found]] == uniques[found]
+        seen = np.zeros(len(uniques), dtype=np.int64)
+        seen[found] = self._tie_counts[pos[found]]
+
+        tie_values, inverse = np.unique(np.concatenate([self._tie_values, uniques]), return_inverse=True)
+        if len(tie_values) > self.max_tie_values:
+            raise ValueError(f"rank_first keeps tie counts of at most {self.max_tie_values} distinct values, "
+                             f"got {len(tie_values)}")
+        counts = np.bincount(codes, minlength=len(uniques))
+        self._tie_values = tie_values
+        self._tie_counts = np.bincount(inverse, weights=np.concatenate([self._tie_counts, counts]),
+                                       minlength=len(tie_values)).astype(np.int64)
+
+        ranks = np.full(len(values), np.nan)
+        ranks[valid] = (self._rank_below(uniques) + seen)[codes] + offsets + 1
+        return ranks
+
+    def transform(self, values):
+        """Bin codes of values as a Categorical with the labels, bins are right-closed like pd.qcut."""
+        values = np.asarray(values, dtype=np.float64)
+        positions = self._first_ranks(values) if self.rank_first else values
+        codes = np.searchsorted(self.edges()[1:-1], positions, side="left")
+        codes = np.where(np.isnan(positions), -1, codes)
+        return pd.Categorical.from_codes(codes, categories=self.labels)
+
+    def fit_transform(self, values):
+        self._reset_ties()
+        return self.partial_fit(values).transform(values)
+
+
+def qcut_scores(series, q, labels, method="exact", rank_first=False, k=200):
+    """
+    Drop-in replacement for pd.qcut(series, q, labels=labels) with an approximate mode.
+
+    method="exact" calls pd.qcut itself, so existing scores do not change.
+    """
+    if method == "exact":
+        values = series.rank(method="first") if rank_first else series
+        return pd.qcut(values, q, labels=labels)
+    binner = QuantileBinner(q, labels=labels, method=method, rank_first=rank_first, k=k)
+    return pd.Series(binner.fit_transform(series.to_numpy()), index=series.index, name=series.name)
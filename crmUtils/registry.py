@@ -0,0 +1,175 @@
+###############################################################
+# Versioned Registry of Fitted BG/NBD and Gamma-Gamma Parameters
+###############################################################
+
+# create_cltv_p and the case studies refit both models on every run, even on unchanged data.
+# The fitted parameters are small (r, alpha, a, b and p, q, v), so each fit is stored as a JSON file
+# together with a fingerprint of the summary table it was fitted on and the penalizer.
+# A run with the same fingerprint and penalizer loads the stored parameters instead of fitting.
+# Reading a record only needs json, and the models of a record only need crmUtils.predictors,
+# so scoring jobs do not import scipy.optimize or lifetimes.
+
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+
+def summary_fingerprint(*columns):
+    """
+    sha1 hex digest of the summary columns (frequency, recency, T, monetary).
+
+    The values are hashed as float64 in their row order, so the same summary gives the same
+    fingerprint whether it is float32 or float64, a Series or an array.
+    """
+    sha1 = hashlib.sha1()
+    for col in columns:
+        values = np.ascontiguousarray(np.asarray(col, dtype=np.float64))
+        sha1.update(str(values.shape).encode())
+        sha1.update(values.tobytes())
+    return sha1.hexdigest()
+
+
+def _record_key(fingerprint, penalizer_coef):
+    return f"{fingerprint}:{float(penalizer_coef)!r}"
+
+
+class ModelRegistry:
+    """
+    Fitted model parameters stored as <name>-v<version>.json files in one directory.
+
+    Every save gets the next version number of its name, older versions are kept.
+    index.json maps (fingerprint, penalizer) to the latest version fitted on it.
+
+    Example:
+    --------
+    registry = ModelRegistry("models")
+    bgf, ggf = registry.fit_or_load("online_retail", cltv_df["frequency"], cltv_df["recency"],
+                                    cltv_df["T"], cltv_df["monetary"], penalizer_coef=0.001)
+    """
+
+    def __init__(self, path="models"):
+        self.path = path
+        self._index_path = os.path.join(path, "index.json")
+
+    def _read_index(self):
+        if not os.path.exists(self._index_path):
+            return {}
+        with open(self._index_path) as f:
+            return json.load(f)
+
+    def _write_index(self, index):
+        # Written to a temporary file first so a reader never sees half an index
+        tmp_path = self._index_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(index, f, indent=1)
+        os.replace(tmp_path, self._index_path)
+
+    def _record_path(self, name, version):
+        return os.path.join(self.path, f"{name}-v{version:04d}.json")
+
+    def versions(self, name):
+        """Stored versions of name, oldest first."""
+        if not os.path.isdir(self.path):
+            return []
+        prefix = f"{name}-v"
+        return sorted(int(file[len(prefix):-len(".json")]) for file in os.listdir(self.path)
+                      if file.startswith(prefix) and file.endswith(".json"))
+
+    def save(self, name, fingerprint, penalizer_coef, bgnbd_params, gamma_gamma_params, **metadata):
+        """
+        Store a fit as the next version of name.
+
+        Parameters:
+        -----------
+        name: str
+            Name of the model, e.g. "online_retail" or "flo"
+        fingerprint: str
+            summary_fingerprint of the summary table the models were fitted on
+        penalizer_coef: float
+        bgnbd_params, gamma_gamma_params: dict or pandas.Series
+            r, alpha, a, b and p, q, v
+        **metadata:
+            Stored as they are, e.g. today_date or the number of customers
+
+        Returns:
+        --------
+        int: The version number
+        """
+        os.makedirs(self.path, exist_ok=True)
+        version = max(self.versions(name), default=0) + 1
+        record = {"name": name,
+                  "version": version,
+                  "fingerprint": fingerprint,
+                  "penalizer_coef": float(penalizer_coef),
+                  "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                  "bgnbd": {k: float(v) for k, v in dict(bgnbd_params).items()},
+                  "gamma_gamma": {k: float(v) for k, v in dict(gamma_gamma_params).items()},
+                  "metadata": metadata}
+        with open(self._record_path(name, version), "w") as f:
+            json.dump(record, f, indent=1, default=str)
+
+        index = self._read_index()
+        index.setdefault(name, {})[_record_key(fingerprint, penalizer_coef)] = version
+        self._write_index(index)
+        return version
+
+    def load(self, name, version=None):
+        """The record of a version of name as a dict, the latest version by default. Only json is needed."""
+        if version is None:
+            versions = self.versions(name)
+            if not versions:
+                raise FileNotFoundError(f"No stored model named {name!r} in {self.path}")
+            version = versions[-1]
+        with open(self._record_path(name, version)) as f:
+            return json.load(f)
+
+    def lookup(self, name, fingerprint, penalizer_coef):
+        """The record fitted on fingerprint with penalizer_coef, or None if there is none."""
+        version = self._read_index().get(name, {}).get(_record_key(fingerprint, penalizer_coef))
+        if version is None or not os.path.exists(self._record_path(name, version)):
+            return None
+        return self.load(name, version)
+
+    def fit_or_load(self, name, frequency, recency, T, monetary_value, penalizer_coef=0.001, refit=False,
+                    **metadata):
+        """
+        Fitted BGNBDFitter and GammaGammaModel for the summary, loaded from the registry when possible.
+
+        On a fingerprint miss both models are fitted, starting from the latest stored parameters of name
+        (yesterday's fit is usually close), and the fit is saved as a new version.
+
+        Returns:
+        --------
+        tuple: (BGNBDFitter, GammaGammaModel) after a fit, (BGNBDPredictor, GammaGammaPredictor) after a load
+        """
+        fingerprint = summary_fingerprint(frequency, recency, T, monetary_value)
+        record = None if refit else self.lookup(name, fingerprint, penalizer_coef)
+        if record is not None:
+            return models_from_record(record)
+
+        # The fitting stack is only imported on a miss, loading records does not need it
+        from crmUtils.bgnbd import BGNBDFitter
+        from crmUtils.gamma_gamma import GammaGammaModel
+
+        latest = self.load(name) if self.versions(name) else None
+        bgf = BGNBDFitter(penalizer_coef=penalizer_coef)
+        bgf.fit(frequency, recency, T, initial_params=latest["bgnbd"] if latest else None)
+        ggf = GammaGammaModel(penalizer_coef=penalizer_coef)
+        ggf.fit(frequency, monetary_value, initial_params=latest["gamma_gamma"] if latest else None)
+
+        self.save(name, fingerprint, penalizer_coef, bgf.params_, ggf.params_,
+                  n_customers=len(np.asarray(frequency)), **metadata)
+        return bgf, ggf
+
+
+def models_from_record(record):
+    """
+    BGNBDPredictor and GammaGammaPredictor with the parameters of a registry record, ready to predict.
+    They have the prediction methods of BGNBDFitter and GammaGammaModel and do not import scipy.optimize.
+    """
+    from crmUtils.predictors import BGNBDPredictor, GammaGammaPredictor
+
+    return BGNBDPredictor(record["bgnbd"]), GammaGammaPredictor(record["gamma_gamma"])
@@ -0,0 +1,182 @@
+###############################################################
+# RFM Metrics Without Python Lambdas
+###############################################################
+
+# groupby(...).agg({col: lambda ...}) calls a Python function once per customer.
+# Here Recency, Frequency and Monetary come from built-in groupby reductions (max, nunique, sum),
+# or from a sort-then-segment NumPy path. Recency is one vectorized date subtraction after the reduction.
+# Customer-level data such as flo_data_20k already has one row per customer, there the metrics are
+# plain column arithmetic and the groupby is skipped (customer_level=True).
+
+import numpy as np
+import pandas as pd
+
+from crmUtils.quantiles import qcut_scores
+from crmUtils.segments import SEG_MAP, assign_segments
+
+
+def rfm_metrics(dataframe, today_date, customer_col="Customer ID", date_col="InvoiceDate",
+                frequency_col="Invoice", monetary_col="TotalPrice", frequency_agg="nunique",
+                columns=("Recency", "Frequency", "Monetary"), method="groupby", customer_level=False):
+    """
+    Calculate Recency, Frequency and Monetary per customer.
+
+    Parameters:
+    -----------
+    dataframe: pandas.DataFrame
+        Transaction (or customer) level data
+    today_date: datetime
+        Analysis date, recency is the number of days between it and the last purchase
+    customer_col, date_col, frequency_col, monetary_col: str
+        Column names of the customer id, purchase date, frequency source and monetary source
+    frequency_agg: str
+        "nunique" counts distinct invoices (online_retail_II), "sum" adds up order counts (FLO)
+    columns: tuple
+        Names of the output columns, e.g. ("recency", "frequency", "monetary") for FLO
+    method: str
+        "groupby" uses pandas built-in reductions, "numpy" sorts once by customer and reduces the segments
+    customer_level: bool or str
+        True declares one row per customer (FLO), the metrics are computed from the columns directly
+        after checking that the ids are unique. "auto" checks the ids and falls back to method if they repeat.
+
+    Returns:
+    --------
+    pandas.DataFrame: One row per customer indexed by customer_col, same output as the lambda version
+    """
+    if customer_level == "auto":
+        customer_level = dataframe[customer_col].dropna().is_unique
+    if customer_level:
+        return _rfm_metrics_customer_level(dataframe, today_date, customer_col, date_col,
+                                           frequency_col, monetary_col, frequency_agg, columns)
+    if method == "numpy":
+        return _rfm_metrics_numpy(dataframe, today_date, customer_col, date_col,
+                                  frequency_col, monetary_col, frequency_agg, columns)
+
+    rfm = dataframe.groupby(customer_col).agg(last_date=(date_col, "max"),
+                                              frequency=(frequency_col, frequency_agg),
+                                              monetary=(monetary_col, "sum"))
+    recency = (pd.Timestamp(today_date) - rfm["last_date"]).dt.days
+    return pd.DataFrame({columns[0]: recency,
+                         columns[1]: rfm["frequency"],
+                         columns[2]: rfm["monetary"]})
+
+
+def rfm_scores(rfm, columns=("Recency", "Frequency", "Monetary"), seg_map=SEG_MAP, method="exact"):
+    """
+    Add recency_score, frequency_score, monetary_score and segment to an RFM metrics table.
+
+    Scores are the quintiles used in the scripts, frequency is ranked first because it has many ties.
+    method="approx" bins with a KLL sketch instead of a full sort, see crmUtils.quantiles.
+    seg_map=None only adds the scores, the segments can then be assigned later with assign_segments.
+    """
+    recency, frequency, monetary = columns
+    rfm["recency_score"] = qcut_scores(rfm[recency], 5, labels=[5, 4, 3, 2, 1], method=method)
+    rfm["frequency_score"] = qcut_scores(rfm[frequency], 5, labels=[1, 2, 3, 4, 5], method=method, rank_first=True)
+    rfm["monetary_score"] = qcut_scores(rfm[monetary], 5, labels=[1, 2, 3, 4, 5], method=method)
+    if seg_map is not None:
+        rfm["segment"] = assign_segments(rfm["recency_score"], rfm["frequency_score"], seg_map=seg_map)
+    return rfm
+
+
+def customer_segments(dataframe, customer_col="Customer ID", invoice_col=None):
+    """
+    Sort the rows once by customer (and invoice) for segment-wise NumPy reductions.
+    Rows without a customer id are left out of the order, like groupby does.
+
+    Returns:
+    --------
+    tuple:
+        customers: Unique customer ids in sorted order
+        order: Row order that groups each customer's rows together
+        starts: Start offset of each customer's segment in that order, usable with np.*.reduceat
+        new_invoice: Boolean flag of the first row of each distinct invoice in that order,
+                     None if invoice_col is not given
+        codes: Customer code of each row in the original row order, -1 for a missing id
+    """
+    customer_codes, customers = pd.factorize(dataframe[customer_col], sort=True)
+    customer_codes = customer_codes.astype(np.int64)
+    codes = customer_codes
+    # factorize codes missing ids as -1, they sort first and are sliced off
+    n_missing = np.count_nonzero(customer_codes < 0)
+    if n_missing == len(customer_codes):
+        # No rows with an id (an empty or fully filtered frame): no segments, the reductions return empty arrays
+        empty = np.empty(0, dtype=np.int64)
+        return customers, empty, empty, None if invoice_col is None else np.empty(0, dtype=bool), codes
+    if invoice_col is None:
+        order = np.argsort(customer_codes, kind="stable")[n_missing:]
+        customer_codes = customer_codes[order]
+        starts = np.flatnonzero(np.r_[True, customer_codes[1:] != customer_codes[:-1]])
+        return customers, order, starts, None, codes
+
+    invoices = dataframe[invoice_col]
+    if pd.api.types.is_integer_dtype(invoices.dtype):
+        invoice_codes = invoices.to_numpy(dtype=np.int64)
+        invoice_codes = invoice_codes - invoice_codes.min()
+    else:
+        invoice_codes = pd.factorize(invoices)[0].astype(np.int64)
+
+    # Sorting one (customer, invoice) key is much cheaper than a lexsort over two keys,
+    # and it puts the lines of one invoice next to each other
+    key = customer_codes * (invoice_codes.max() + 1) + invoice_codes
+    order = np.argsort(key)[n_missing:]
+    key = key[order]
+    customer_codes = customer_codes[order]
+
+    new_customer = np.r_[True, customer_codes[1:] != customer_codes[:-1]]
+    new_invoice = np.r_[True, key[1:] != key[:-1]]
+    return customers, order, np.flatnonzero(new_customer), new_invoice, codes
+
+
+def customer_sums(codes, values, n_customers):
+    """
+    Sum values per customer code in the original row order.
+
+    Adding up in row order makes the sums of a customer the same whether the customer is
+    computed from the whole frame or from a partition of it.
+    """
+    # bincount gives int64 zeros for an empty input, even with weights
+    return np.bincount(codes + 1, weights=values, minlength=n_customers + 1)[1:].astype(np.float64, copy=False)
+
+
+def _rfm_metrics_numpy(dataframe, today_date, customer_col, date_col,
+                       frequency_col, monetary_col, frequency_agg, columns):
+    invoice_col = frequency_col if frequency_agg == "nunique" else None
+    customers, order, starts, new_invoice, codes = customer_segments(dataframe, customer_col, invoice_col)
+
+    last_date = np.maximum.reduceat(dataframe[date_col].to_numpy(dtype="datetime64[ns]")[order], starts)
+    monetary = customer_sums(codes, dataframe[monetary_col].to_numpy(dtype=np.float64), len(customers))
+    if frequency_agg == "nunique":
+        frequency = np.add.reduceat(new_invoice.astype(np.int64), starts)
+    else:
+        frequency = np.add.reduceat(dataframe[frequency_col].to_numpy()[order], starts)
+
+    recency = (np.datetime64(pd.Timestamp(today_date), "ns") - last_date) // np.timedelta64(1, "D")
+    index = pd.Index(customers, name=customer_col)
+    return pd.DataFrame({columns[0]: recency,
+                         columns[1]: frequency,
+                         columns[2]: monetary}, index=index)
+
+
+def _rfm_metrics_customer_level(dataframe, today_date, customer_col, date_col,
+                                frequency_col, monetary_col, frequency_agg, columns):
+    # Only the four columns are touched. Rows are ordered by id and rows without an id are left out,
+    # like groupby does, so the scores that rank ties by position come out the same.
+    used = list(dict.fromkeys([customer_col, date_col, frequency_col, monetary_col]))
+    customers = dataframe[used].dropna(subset=[customer_col]).sort_values(customer_col, kind="stable")
+    index = pd.Index(customers[customer_col], name=customer_col)
+    # After the sort a repeated id sits next to itself, comparing neighbours is cheaper than hashing
+    ids = index.codes if isinstance(index, pd.CategoricalIndex) else index.array
+    repeats = int(np.asarray(ids[1:] == ids[:-1]).sum())
+    if repeats:
+        raise ValueError(f"customer_level=True needs one row per {customer_col}, {repeats} ids repeat")
+
+    recency = (pd.Timestamp(today_date) - customers[date_col]).dt.days
+    if frequency_agg == "nunique":
+        frequency = customers[frequency_col].notna().astype(np.int64)
+    else:
+        # A missing value adds nothing to a groupby sum
+        frequency = customers[frequency_col].fillna(0)
+    monetary = customers[monetary_col].fillna(0)
+    return pd.DataFrame({columns[0]: recency.to_numpy(),
+                         columns[1]: frequency.to_numpy(),
+                         columns[2]: monetary.to_numpy()}, index=index)
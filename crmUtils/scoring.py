@@ -0,0 +1,199 @@
+###############################################################
+# Low-Latency CLTV Scoring of Single Customers and Batches
+###############################################################
+
+# create_cltv_p fits both models and scores every customer of the dataset. At checkout only one
+# customer's (frequency, recency, T, monetary) is known, so CLTVScorer keeps the fitted parameters,
+# the discount weights of each month and the frozen quartile cut points of the segment, and scores
+# a customer with a handful of NumPy operations. A batch is scored in the same vectorized call.
+# serve() puts the scorer behind a local HTTP endpoint and benchmark_latency() measures it.
+
+import json
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from crmUtils.predictors import PERIODS_PER_MONTH, expected_purchases
+
+SEGMENT_LABELS = ["D", "C", "B", "A"]
+
+
+def freeze_cut_points(clv, q=4):
+    """Inner bin edges of pd.qcut(clv, q), e.g. the three quartiles the D/C/B/A segments are cut at."""
+    return np.quantile(np.asarray(clv, dtype=np.float64), np.linspace(0, 1, q + 1)[1:-1]).tolist()
+
+
+class CLTVScorer:
+    """
+    CLTV and segment of customers from stored model parameters, without any fitting.
+
+    Parameters:
+    -----------
+    bgnbd_params: dict
+        r, alpha, a, b of the BG/NBD model
+    gamma_gamma_params: dict
+        p, q, v of the Gamma-Gamma model
+    cut_points: list
+        Frozen inner bin edges of the segments, see freeze_cut_points
+    month, discount_rate, freq:
+        As in create_cltv_p, the CLTV horizon in months, the monthly discount rate and the time unit
+    labels: list
+        Segment labels from the lowest to the highest CLTV
+
+    Example:
+    --------
+    scorer = CLTVScorer.from_models(bgf, ggf, cltv_final["clv"], month=3)
+    scorer.save("cltv_scorer.json")
+    scorer = CLTVScorer.load("cltv_scorer.json")
+    scorer.score(frequency=5, recency=30.5, T=52.0, monetary=180.0)
+    """
+
+    def __init__(self, bgnbd_params, gamma_gamma_params, cut_points, month=3, discount_rate=0.01, freq="W",
+                 labels=SEGMENT_LABELS):
+        self.bgnbd_params = {k: float(bgnbd_params[k]) for k in ("r", "alpha", "a", "b")}
+        self.gamma_gamma_params = {k: float(gamma_gamma_params[k]) for k in ("p", "q", "v")}
+        self.cut_points = [float(c) for c in cut_points]
+        self.month = month
+        self.discount_rate = discount_rate
+        self.freq = freq
+        self.labels = list(labels)
+        if len(self.labels) != len(self.cut_points) + 1:
+            raise ValueError("labels must have one more element than cut_points")
+
+        # Everything that does not depend on the customer is computed once here
+        factor = PERIODS_PER_MONTH[freq]
+        self._params = np.array(list(self.bgnbd_params.values()))
+        self._time_points = np.arange(0, month + 1) * factor
+        self._discount = 1 / (1 + discount_rate) ** np.arange(1, month + 1)
+        self._edges = np.array(self.cut_points)
+        self._labels = np.array(self.labels, dtype=object)
+
+    @classmethod
+    def from_models(cls, bgf, ggf, clv, month=3, discount_rate=0.01, freq="W", labels=SEGMENT_LABELS):
+        """Scorer of fitted models, with the segment cut points frozen from the CLTV of the training customers."""
+        return cls(bgf.params_, ggf.params_, freeze_cut_points(clv, len(labels)),
+                   month=month, discount_rate=discount_rate, freq=freq, labels=labels)
+
+    def to_dict(self):
+        return {"bgnbd": self.bgnbd_params, "gamma_gamma": self.gamma_gamma_params,
+                "cut_points": self.cut_points, "month": self.month,
+                "discount_rate": self.discount_rate, "freq": self.freq, "labels": self.labels}
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=1)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            config = json.load(f)
+        return cls(config.pop("bgnbd"), config.pop("gamma_gamma"), **config)
+
+    def clv(self, frequency, recency, T, monetary):
+        """Discounted CLTV over month months, same as customer_lifetime_value. Arrays give arrays."""
+        x = np.asarray(frequency, dtype=np.float64)
+        m = np.asarray(monetary, dtype=np.float64)
+        p, q, v = self.gamma_gamma_params.values()
+        adjusted_m = p * (v + x * m) / (p * x + q - 1)
+
+        # Cumulative purchases at every month boundary, the first column is t = 0
+        grid = expected_purchases(self._params, self._time_points,
+                                  x[..., None], np.asarray(recency, dtype=np.float64)[..., None],
+                                  np.asarray(T, dtype=np.float64)[..., None])
+        return adjusted_m * (np.diff(grid, axis=-1) @ self._discount)
+
+    def segment(self, clv):
+        """Segment labels with the frozen cut points, bins are right-closed like pd.qcut."""
+        return self._labels[np.searchsorted(self._edges, clv, side="left")]
+
+    def score(self, frequency, recency, T, monetary):
+        """CLTV and segment of one customer as a dict."""
+        clv = float(self.clv(frequency, recency, T, monetary))
+        return {"clv": clv, "segment": self.labels[int(np.searchsorted(self._edges, clv, side="left"))]}
+
+    def score_batch(self, frequency, recency, T, monetary):
+        """CLTV and segment arrays of many customers in one vectorized call."""
+        clv = self.clv(frequency, recency, T, monetary)
+        return {"clv": clv, "segment": self.segment(clv)}
+
+
+def _handler(scorer):
+    class ScoringHandler(BaseHTTPRequestHandler):
+        # POST /score with {"frequency": ..., "recency": ..., "T": ..., "monetary": ...},
+        # numbers score one customer, lists score a batch
+        def do_POST(self):
+            if self.path != "/score":
+                self.send_error(404)
+                return
+            try:
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                args = [body[k] for k in ("frequency", "recency", "T", "monetary")]
+                if isinstance(args[0], list):
+                    result = scorer.score_batch(*args)
+                    result = {"clv": result["clv"].tolist(), "segment": result["segment"].tolist()}
+                else:
+                    result = scorer.score(*args)
+            except (KeyError, TypeError, ValueError) as e:
+                self.send_error(400, str(e))
+                return
+            payload = json.dumps(result).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    return ScoringHandler
+
+
+def serve(scorer, host="127.0.0.1", port=8000):
+    """
+    Serve the scorer on a local HTTP endpoint until interrupted.
+
+    Example:
+    --------
+    curl -X POST localhost:8000/score -d '{"frequency": 5, "recency": 30.5, "T": 52, "monetary": 180}'
+    """
+    server = ThreadingHTTPServer((host, port), _handler(scorer))
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+def benchmark_latency(scorer, n_single=10_000, batch_size=10_000, n_batches=20, seed=0):
+    """
+    Latency of in-process scoring on random customers.
+
+    Returns:
+    --------
+    dict: Median and 99th percentile of a single score() call in microseconds,
+          and the median time of a score_batch() call of batch_size customers in milliseconds
+    """
+    rng = np.random.default_rng(seed)
+    frequency = rng.integers(2, 30, batch_size).astype(np.float64)
+    T = rng.uniform(10, 100, batch_size)
+    recency = T * rng.uniform(0, 1, batch_size)
+    monetary = rng.uniform(5, 500, batch_size)
+
+    single = np.empty(n_single)
+    for i in range(n_single):
+        j = i % batch_size
+        start = time.perf_counter()
+        scorer.score(frequency[j], recency[j], T[j], monetary[j])
+        single[i] = time.perf_counter() - start
+
+    batch = np.empty(n_batches)
+    for i in range(n_batches):
+        start = time.perf_counter()
+        scorer.score_batch(frequency, recency, T, monetary)
+        batch[i] = time.perf_counter() - start
+
+    return {"single_p50_us": float(np.median(single) * 1e6),
+            "single_p99_us": float(np.quantile(single, 0.99) * 1e6),
+            "batch_size": batch_size,
+            "batch_p50_ms": float(np.median(batch) * 1e3)}
@@ -0,0 +1,77 @@
+###############################################################
+# Segment Assignment with a Lookup Table
+###############################################################
+
+# rfm["RF_Score"].replace(seg_map, regex=True) runs every regex over a string column
+# built by concatenating the scores. The seg_map is applied once to all 25 (RF) or 125 (RFM)
+# possible score strings instead, and the results are stored in an integer lookup array
+# indexed directly by the integer scores.
+
+from functools import lru_cache
+from itertools import product
+
+import numpy as np
+import pandas as pd
+
+SEG_MAP = {r'[1-2][1-2]': 'hibernating',
+           r'[1-2][3-4]': 'at_Risk',
+           r'[1-2]5': 'cant_loose',
+           r'3[1-2]': 'about_to_sleep',
+           r'33': 'need_attention',
+           r'[3-4][4-5]': 'loyal_customers',
+           r'41': 'promising',
+           r'51': 'new_customers',
+           r'[4-5][2-3]': 'potential_loyalists',
+           r'5[4-5]': 'champions'}
+
+
+@lru_cache(maxsize=None)
+def _compile(seg_items, n_scores, n_levels):
+    score_strings = ["".join(map(str, scores)) for scores in product(range(1, n_levels + 1), repeat=n_scores)]
+    # Series.replace itself defines the meaning of the regex dict, so the table matches it exactly
+    labels = pd.Series(score_strings).replace(dict(seg_items), regex=True)
+    codes, categories = pd.factorize(labels)
+    return codes.astype(np.int16).reshape((n_levels,) * n_scores), list(categories)
+
+
+def compile_seg_map(seg_map=SEG_MAP, n_scores=2, n_levels=5):
+    """
+    Turn a regex seg_map into a lookup array.
+
+    Parameters:
+    -----------
+    seg_map: dict
+        Regex to segment name mapping, in the format used by the scripts
+    n_scores: int
+        2 for RF scores, 3 for RFM scores
+    n_levels: int
+        Number of score levels, the scripts use 5
+
+    Returns:
+    --------
+    tuple:
+        table: Integer array of shape (n_levels,) * n_scores, table[r - 1, f - 1] is a segment code
+        categories: Segment names, categories[code] is the name of a code
+    """
+    return _compile(tuple(seg_map.items()), n_scores, n_levels)
+
+
+def assign_segments(*scores, seg_map=SEG_MAP, n_levels=5):
+    """
+    Assign segments from integer score columns without building score strings.
+
+    Parameters:
+    -----------
+    *scores: pandas.Series
+        recency_score and frequency_score (and monetary_score for an RFM seg_map), as given by pd.qcut
+    seg_map: dict
+        Regex to segment name mapping
+
+    Returns:
+    --------
+    pandas.Series: Categorical segment column with the index of the first score
+    """
+    table, categories = compile_seg_map(seg_map, n_scores=len(scores), n_levels=n_levels)
+    positions = tuple(np.asarray(score, dtype=np.int64) - 1 for score in scores)
+    return pd.Series(pd.Categorical.from_codes(table[positions], categories=categories),
+                     index=scores[0].index, name="segment")
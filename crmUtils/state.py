@@ -0,0 +1,146 @@
+###############################################################
+# Incremental RFM / CLTV Updates from Daily Delta Batches
+###############################################################
+
+# create_rfm and create_cltv_c are rerun over the whole history every night although only
+# one day of invoices arrives. The per-customer state is persisted instead, each delta batch is
+# folded into it, and the scores and segments are recomputed from the state alone.
+# The nightly cost then depends on the size of the delta and the number of customers, not on the history.
+
+import os
+
+import pandas as pd
+
+from crmUtils.cleaning import cancelled_invoices
+from crmUtils.rfm import rfm_scores
+from crmUtils.streaming import STATE_AGG, chunk_state, clean_chunk, cltv_c_from_state, rfm_from_state
+
+CANCELLATION_AGG = {"cancelled_unit": "sum",
+                    "cancelled_price": "sum"}
+
+# create_cltv_c also drops the lines with Quantity <= 0, its totals are kept next to those of create_rfm
+POSITIVE_AGG = {"positive_frequency": "sum",
+                "positive_unit": "sum",
+                "positive_price": "sum"}
+
+
+class CustomerStateStore:
+    """
+    Per-customer purchase state persisted as a Parquet file.
+
+    Columns:
+    --------
+    first_date, last_date: First and last purchase date
+    frequency: Number of distinct (non-cancelled) invoices
+    total_unit, total_price: Units and price of the non-cancelled lines, as used by create_rfm
+    cancelled_unit, cancelled_price: Units and price of the cancellation lines (negative)
+    positive_frequency, positive_unit, positive_price: The same over the lines with Quantity > 0,
+        as used by create_cltv_c
+
+    net_totals() adds the two up to cancellation-adjusted totals.
+
+    An invoice is assumed to arrive completely in one delta batch, so distinct invoice counts of
+    the batches can be added up.
+
+    Example:
+    --------
+    store = CustomerStateStore("customer_state.parquet")
+    store.update(todays_transactions)
+    store.save()
+    rfm = store.rfm(dt.datetime(2011, 12, 11))
+    """
+
+    def __init__(self, path=None, customer_col="Customer ID"):
+        self.path = path
+        self.customer_col = customer_col
+        self.state = self._empty()
+        if path is not None and os.path.exists(path):
+            self.state = pd.read_parquet(path)
+
+    def _empty(self):
+        columns = list(STATE_AGG) + list(CANCELLATION_AGG) + list(POSITIVE_AGG)
+        return pd.DataFrame(columns=columns, index=pd.Index([], name=self.customer_col))
+
+    def update(self, delta_df):
+        """
+        Fold a batch of new transactions into the state.
+
+        Parameters:
+        -----------
+        delta_df: pandas.DataFrame
+            Raw transactions with Invoice, InvoiceDate, Quantity, Price and Customer ID columns.
+            The frame is not modified.
+
+        Returns:
+        --------
+        CustomerStateStore: self, so calls can be chained
+        """
+        delta_df = delta_df.dropna(subset=[self.customer_col])
+        cancelled = cancelled_invoices(delta_df["Invoice"])
+
+        purchases = clean_chunk(delta_df[~cancelled])
+        cancellations = delta_df[cancelled]
+        delta_state = chunk_state(purchases, self.customer_col)
+        delta_positive = chunk_state(purchases[purchases["Quantity"] > 0], self.customer_col)
+        delta_positive = delta_positive[["frequency", "total_unit", "total_price"]].set_axis(list(POSITIVE_AGG),
+                                                                                             axis=1)
+        delta_cancel = pd.DataFrame({"cancelled_unit": cancellations["Quantity"],
+                                     "cancelled_price": cancellations["Quantity"] * cancellations["Price"],
+                                     self.customer_col: cancellations[self.customer_col]})
+        delta_cancel = delta_cancel.groupby(self.customer_col).sum()
+
+        delta_state = delta_state.join(delta_positive, how="left").join(delta_cancel, how="outer")
+        for col in ["frequency", "total_unit", "total_price", *CANCELLATION_AGG, *POSITIVE_AGG]:
+            delta_state[col] = delta_state[col].fillna(0)
+
+        if len(self.state):
+            combined = pd.concat([self.state[delta_state.columns], delta_state])
+            self.state = combined.groupby(level=0).agg({**STATE_AGG, **CANCELLATION_AGG, **POSITIVE_AGG})
+        else:
+            self.state = delta_state
+        for col in ["frequency", "positive_frequency"]:
+            self.state[col] = self.state[col].astype("int64")
+        return self
+
+    def save(self, path=None):
+        """Write the state to path (or the path the store was opened with)."""
+        path = path or self.path
+        self.state.to_parquet(path)
+        return path
+
+    @property
+    def purchasers(self):
+        # Customers that only have cancellations have no purchase dates
+        return self.state[self.state["first_date"].notna()]
+
+    def net_totals(self):
+        """Cancellation-adjusted unit and price totals per customer."""
+        return pd.DataFrame({"net_unit": self.state["total_unit"] + self.state["cancelled_unit"],
+                             "net_price": self.state["total_price"] + self.state["cancelled_price"]})
+
+    def rfm(self, today_date, net=False, method="exact"):
+        """
+        Recompute the create_rfm output (segment, Recency, Frequency, Monetary) from the state.
+
+        If net is True, Monetary is the cancellation-adjusted total price.
+        method="approx" scores with KLL sketches, see crmUtils.quantiles.
+        """
+        state = self.purchasers
+        if net:
+            state = state.assign(total_price=state["total_price"] + state["cancelled_price"])
+        rfm = rfm_from_state(state, today_date)
+        rfm = rfm[rfm["Monetary"] > 0].copy()
+        rfm = rfm_scores(rfm, method=method)
+        rfm = rfm[["segment", "Recency", "Frequency", "Monetary"]]
+        rfm.index = rfm.index.astype(int)
+        return rfm
+
+    def cltv_c(self, profit=10, method="exact"):
+        """
+        Recompute the create_cltv_c output from the state.
+
+        Like create_cltv_c it only counts the lines with Quantity > 0, customers without any are left out.
+        """
+        state = self.state[self.state["positive_frequency"] > 0]
+        state = state[list(POSITIVE_AGG)].set_axis(["frequency", "total_unit", "total_price"], axis=1)
+        return cltv_c_from_state(state, profit=profit, method=method)
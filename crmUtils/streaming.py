@@ -0,0 +1,153 @@
+###############################################################
+# Streaming RFM for Transaction Files Larger than RAM
+###############################################################
+
+# The transaction source is read in chunks (CSV chunks or Parquet row groups).
+# Only a per-customer running state is kept: first and last purchase date, number of distinct invoices,
+# total unit and total price. The states of the chunks are merged into it one by one,
+# so peak memory is bounded by the number of customers and the chunk size, not by the number of transactions.
+
+import pandas as pd
+
+from crmUtils.cleaning import clean_transactions
+from crmUtils.quantiles import qcut_scores
+
+STATE_AGG = {"first_date": "min",
+             "last_date": "max",
+             "frequency": "sum",
+             "total_unit": "sum",
+             "total_price": "sum"}
+
+
+def iter_transactions(source, chunksize=1_000_000, columns=None, date_col="InvoiceDate"):
+    """
+    Yield the transactions of a source chunk by chunk.
+
+    Parameters:
+    -----------
+    source: str or iterable
+        Path of a .parquet file (read one row group at a time), path of a CSV file
+        (read chunksize rows at a time), or an iterable of DataFrames that is passed through
+    chunksize: int
+        Number of rows per CSV chunk
+    columns: list, optional
+        Columns to read
+    """
+    if not isinstance(source, str):
+        yield from source
+    elif source.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(source)
+        for i in range(parquet_file.num_row_groups):
+            yield parquet_file.read_row_group(i, columns=columns).to_pandas()
+    else:
+        yield from pd.read_csv(source, chunksize=chunksize, usecols=columns,
+                               parse_dates=[date_col], dtype={"Invoice": str})
+
+
+def clean_chunk(chunk, positive_quantity=False):
+    """Apply the row-level data preparation of create_rfm (and create_cltv_c) to one chunk."""
+    return clean_transactions(chunk, positive_quantity=positive_quantity)
+
+
+def chunk_state(chunk, customer_col="Customer ID"):
+    """Reduce one cleaned chunk to the per-customer state."""
+    return chunk.groupby(customer_col).agg(first_date=("InvoiceDate", "min"),
+                                           last_date=("InvoiceDate", "max"),
+                                           frequency=("Invoice", "nunique"),
+                                           total_unit=("Quantity", "sum"),
+                                           total_price=("TotalPrice", "sum"))
+
+
+def merge_states(*states):
+    """Merge per-customer states, e.g. of several chunks or several workers."""
+    states = [state for state in states if state is not None and len(state)]
+    if not states:
+        return None
+    if len(states) == 1:
+        return states[0]
+    return pd.concat(states).groupby(level=0).agg(STATE_AGG)
+
+
+def stream_state(source, chunksize=1_000_000, positive_quantity=False, invoices_contiguous=True,
+                 customer_col="Customer ID", columns=None):
+    """
+    Fold a chunked transaction source into a per-customer state.
+
+    Parameters:
+    -----------
+    source: str or iterable
+        See iter_transactions
+    positive_quantity: bool
+        Drop lines with Quantity <= 0 as create_cltv_c does
+    invoices_contiguous: bool
+        The lines of one invoice are next to each other in the source, as in the online_retail_II export.
+        The lines of the last invoice of a chunk are then held back and added to the next chunk,
+        so an invoice is never split between two chunks and distinct invoice counts can simply be added up.
+        If False, the distinct (customer, invoice) pairs are kept instead, which is exact for any row order
+        but grows with the number of invoices.
+
+    Returns:
+    --------
+    pandas.DataFrame: Columns first_date, last_date, frequency, total_unit, total_price indexed by customer_col
+    """
+    state = None
+    carry = None
+    pairs = None
+    for chunk in iter_transactions(source, chunksize=chunksize, columns=columns):
+        chunk = clean_chunk(chunk, positive_quantity=positive_quantity)
+        if invoices_contiguous:
+            if carry is not None:
+                chunk = pd.concat([carry, chunk])
+            if len(chunk) == 0:
+                continue
+            tail = chunk["Invoice"] == chunk["Invoice"].iloc[-1]
+            carry, chunk = chunk[tail], chunk[~tail]
+        else:
+            chunk_pairs = chunk[[customer_col, "Invoice"]].drop_duplicates()
+            pairs = chunk_pairs if pairs is None else pd.concat([pairs, chunk_pairs]).drop_duplicates()
+        state = merge_states(state, chunk_state(chunk, customer_col))
+
+    if carry is not None:
+        state = merge_states(state, chunk_state(carry, customer_col))
+    if state is None:
+        return pd.DataFrame(columns=list(STATE_AGG))
+    if pairs is not None:
+        state["frequency"] = pairs.groupby(customer_col).size()
+    return state
+
+
+def rfm_from_state(state, today_date, columns=("Recency", "Frequency", "Monetary")):
+    """Turn a per-customer state into the Recency / Frequency / Monetary table of create_rfm."""
+    return pd.DataFrame({columns[0]: (pd.Timestamp(today_date) - state["last_date"]).dt.days,
+                         columns[1]: state["frequency"],
+                         columns[2]: state["total_price"]})
+
+
+def cltv_c_from_state(state, profit=10, method="exact"):
+    """
+    Turn a per-customer state into the CLTV table of create_cltv_c.
+
+    method="approx" cuts the segments with a KLL sketch instead of a full sort.
+    """
+    cltv_c = pd.DataFrame({"total_transaction": state["frequency"],
+                           "total_unit": state["total_unit"],
+                           "total_price": state["total_price"]})
+
+    cltv_c["average_order_value"] = cltv_c["total_price"] / cltv_c["total_transaction"]
+    cltv_c["purchase_frequency"] = cltv_c["total_transaction"] / cltv_c.shape[0]
+    repeat_rate = cltv_c[cltv_c.total_transaction > 1].shape[0] / cltv_c.shape[0]
+    churn_rate = 1 - repeat_rate
+    cltv_c["profit_margin"] = cltv_c["total_price"] * profit
+    cltv_c["customer_value"] = cltv_c["average_order_value"] * cltv_c["purchase_frequency"]
+    cltv_c["cltv"] = (cltv_c["customer_value"] / churn_rate) * cltv_c["profit_margin"]
+    cltv_c["segment"] = qcut_scores(cltv_c["cltv"], 4, labels=["D", "C", "B", "A"], method=method)
+    return cltv_c
+
+
+def stream_rfm_metrics(source, today_date, chunksize=1_000_000, invoices_contiguous=True,
+                       columns=("Recency", "Frequency", "Monetary")):
+    """Recency / Frequency / Monetary of a chunked source, equal to rfm_metrics on the whole cleaned data."""
+    state = stream_state(source, chunksize=chunksize, invoices_contiguous=invoices_contiguous)
+    return rfm_from_state(state, today_date, columns=columns)
@@ -0,0 +1,70 @@
+###############################################################
+# BG/NBD Customer Summary (recency, T, frequency, monetary)
+###############################################################
+
+# Builds the lifetimes-style summary table of create_cltv_p in one pass over the transactions
+# sorted by customer, instead of two date lambdas, an Invoice nunique lambda and a sum lambda.
+
+#recency: Time between the first and the last purchase of the customer
+#T: Age of the customer, time between the first purchase and the analysis date
+#frequency: Total number of purchases (distinct invoices)
+#monetary: Average earning per purchase
+
+import numpy as np
+import pandas as pd
+
+from crmUtils.rfm import customer_segments, customer_sums
+
+DAY_NS = 86_400 * 10**9
+
+# Length of one period in days, "M" is the average month of the Gregorian calendar
+PERIOD_DAYS = {"D": 1, "W": 7, "M": 365.25 / 12}
+
+
+def cltv_summary(dataframe, today_date, freq="W", min_frequency=2, customer_col="Customer ID",
+                 date_col="InvoiceDate", invoice_col="Invoice", price_col="TotalPrice", dtype=np.float32):
+    """
+    Build the recency / T / frequency / monetary table used by BetaGeoFitter and GammaGammaFitter.
+
+    Day differences are computed with integer nanosecond arithmetic and floored to whole days,
+    the same as Timedelta.days in the lambda version. They are converted to periods only at the end.
+
+    Parameters:
+    -----------
+    dataframe: pandas.DataFrame
+        Cleaned transactions with customer, date, invoice and TotalPrice columns
+    today_date: datetime
+        Analysis date
+    freq: str
+        Period unit of recency and T, "D" (daily), "W" (weekly) or "M" (monthly)
+    min_frequency: int
+        Customers with fewer purchases are dropped, the scripts keep frequency > 1
+    dtype: numpy dtype
+        Output dtype, float32 by default
+
+    Returns:
+    --------
+    pandas.DataFrame: Columns recency, T, frequency, monetary indexed by customer_col
+    """
+    if freq not in PERIOD_DAYS:
+        raise ValueError(f"freq must be one of {list(PERIOD_DAYS)}, got {freq!r}")
+
+    customers, order, starts, new_invoice, codes = customer_segments(dataframe, customer_col, invoice_col)
+
+    dates = dataframe[date_col].to_numpy(dtype="datetime64[ns]").view(np.int64)[order]
+    first = np.minimum.reduceat(dates, starts)
+    last = np.maximum.reduceat(dates, starts)
+    frequency = np.add.reduceat(new_invoice.astype(np.int64), starts)
+    total_price = customer_sums(codes, dataframe[price_col].to_numpy(dtype=np.float64), len(customers))
+
+    today_ns = np.datetime64(pd.Timestamp(today_date), "ns").astype(np.int64)
+    recency_days = (last - first) // DAY_NS
+    T_days = (today_ns - first) // DAY_NS
+
+    period = PERIOD_DAYS[freq]
+    summary = pd.DataFrame({"recency": (recency_days / period).astype(dtype),
+                            "T": (T_days / period).astype(dtype),
+                            "frequency": frequency.astype(dtype),
+                            "monetary": (total_price / frequency).astype(dtype)},
+                           index=pd.Index(customers, name=customer_col))
+    return summary[summary["frequency"] >= min_frequency]
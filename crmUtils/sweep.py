@@ -0,0 +1,140 @@
+###############################################################
+# Parameter Sweeps over CLTV Horizon, Discount Rate, Penalizer and Margin
+###############################################################
+
+# Comparing scenarios meant rerunning create_cltv_p with another month, or editing penalizer_coef and
+# discount_rate by hand, and every rerun fitted both models again. The fit only depends on the
+# penalizer, and the discount rate only weights the purchases of each month, so a sweep fits each
+# distinct penalizer once (in parallel processes), evaluates the expected purchases of every month once
+# per penalizer, applies each discount vector to those monthly increments, and scales by the profit
+# margins, which multiply the CLTV linearly.
+# The result is one long table with a row per customer and scenario.
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from crmUtils.bgnbd import BGNBDFitter, compress_customers
+from crmUtils.gamma_gamma import GammaGammaModel
+from crmUtils.prediction import discount_clv, expected_average_profit, monthly_purchases
+
+SCENARIO_COLUMNS = ["penalizer_coef", "month", "discount_rate", "profit_margin"]
+
+
+def _fit_pair(penalizer_coef, bgnbd_columns, gamma_gamma_columns):
+    # Module level, so the process pool can pickle it. The inputs are compressed once by the caller.
+    *bgnbd_values, bgnbd_weights = bgnbd_columns
+    *gamma_gamma_values, gamma_gamma_weights = gamma_gamma_columns
+    bgf = BGNBDFitter(penalizer_coef=penalizer_coef).fit(*bgnbd_values, weights=bgnbd_weights)
+    ggf = GammaGammaModel(penalizer_coef=penalizer_coef).fit(*gamma_gamma_values, weights=gamma_gamma_weights)
+    return bgf, ggf
+
+
+def fit_penalizers(frequency, recency, T, monetary_value, penalizers=(0.001,), n_workers=None, registry=None,
+                   name="online_retail"):
+    """
+    Fit BGNBDFitter and GammaGammaModel once for each distinct penalizer.
+
+    Parameters:
+    -----------
+    frequency, recency, T, monetary_value: array_like
+        Customer summary
+    penalizers: iterable
+        penalizer_coef values, duplicates are fitted once
+    n_workers: int, optional
+        Processes of the fits, defaults to the number of CPU cores. 1 fits serially in this process.
+    registry: crmUtils.registry.ModelRegistry, optional
+        Load stored fits of the same summary and penalizer (and store new ones) under name, serially
+
+    Returns:
+    --------
+    dict: penalizer_coef -> (BGNBDFitter, GammaGammaModel)
+    """
+    penalizers = list(dict.fromkeys(float(p) for p in penalizers))
+    if registry is not None:
+        return {p: registry.fit_or_load(name, frequency, recency, T, monetary_value, penalizer_coef=p)
+                for p in penalizers}
+
+    # Identical customers are grouped once for all fits, the fitters skip their own grouping
+    x = np.asarray(frequency)
+    bgnbd_columns = compress_customers(x.astype(int), np.asarray(recency), np.asarray(T))
+    gamma_gamma_columns = compress_customers(x, np.asarray(monetary_value))
+
+    n_workers = min(n_workers or os.cpu_count() or 1, len(penalizers))
+    if n_workers <= 1:
+        return {p: _fit_pair(p, bgnbd_columns, gamma_gamma_columns) for p in penalizers}
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        futures = {p: executor.submit(_fit_pair, p, bgnbd_columns, gamma_gamma_columns) for p in penalizers}
+        return {p: future.result() for p, future in futures.items()}
+
+
+def cltv_sweep(frequency, recency, T, monetary_value, months=(3,), discount_rates=(0.01,), penalizers=(0.001,),
+               profit_margins=(1.0,), freq="W", n_workers=None, registry=None):
+    """
+    Discounted CLTV of every customer for every combination of the grids.
+
+    Parameters:
+    -----------
+    frequency, recency, T, monetary_value: array_like
+        Customer summary, e.g. the columns of cltv_summary, recency and T in freq units
+    months: iterable
+        CLTV horizons in months, the month argument of create_cltv_p
+    discount_rates: iterable
+        Monthly discount rates
+    penalizers: iterable
+        penalizer_coef values of both models
+    profit_margins: iterable
+        Share of the revenue that is profit, 1.0 is the CLTV of the scripts
+    freq: str
+        Time unit of recency and T
+    n_workers, registry:
+        See fit_penalizers
+
+    Returns:
+    --------
+    pandas.DataFrame: Columns customer (the index of frequency if it is a Series), penalizer_coef, month,
+                      discount_rate, profit_margin, expected_average_profit and clv, one row per
+                      customer and scenario
+    """
+    months = sorted(set(months))
+    margins = np.asarray(list(profit_margins), dtype=np.float64)
+    models = fit_penalizers(frequency, recency, T, monetary_value, penalizers=penalizers, n_workers=n_workers,
+                            registry=registry)
+
+    customers = frequency.index if isinstance(frequency, pd.Series) else pd.RangeIndex(len(frequency))
+    customer_col = customers.name or "customer"
+    n = len(customers)
+
+    parts = []
+    per_customer = len(months) * len(margins)
+    for penalizer_coef, (bgf, ggf) in models.items():
+        # The hypergeometric grid is evaluated once per penalizer, each discount rate reweights its months
+        purchases = monthly_purchases(bgf, frequency, recency, T, months[-1], freq=freq)
+        profit = expected_average_profit(ggf, frequency, monetary_value)
+        for discount_rate in discount_rates:
+            # customers x months, then x margins: the margin runs fastest, then the month, then the customer
+            clv = discount_clv(purchases, profit, months, discount_rate=discount_rate, freq=freq)
+            clv = (clv[:, :, None] * margins[None, None, :]).ravel()
+            parts.append(pd.DataFrame({
+                customer_col: np.repeat(customers.to_numpy(), per_customer),
+                "penalizer_coef": penalizer_coef,
+                "month": np.tile(np.repeat(months, len(margins)), n),
+                "discount_rate": float(discount_rate),
+                "profit_margin": np.tile(margins, n * len(months)),
+                "expected_average_profit": np.repeat(profit, per_customer),
+                "clv": clv}))
+    return pd.concat(parts, ignore_index=True)
+
+
+def sweep_summary(sweep, q=4):
+    """
+    One row per scenario of a cltv_sweep table: customers, total, mean and median CLTV,
+    and the CLTV cut points between the q segments (D / C / B / A for q=4).
+    """
+    grouped = sweep.groupby(SCENARIO_COLUMNS, sort=False)["clv"]
+    summary = grouped.agg(customers="size", total_clv="sum", mean_clv="mean", median_clv="median")
+    cut_points = grouped.quantile([i / q for i in range(1, q)]).unstack()
+    cut_points.columns = [f"clv_q{int(round(c * 100))}" for c in cut_points.columns]
+    return summary.join(cut_points).reset_index()
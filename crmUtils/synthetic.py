@@ -0,0 +1,154 @@
+###############################################################
+# Synthetic online_retail_II and flo_data_20k Data
+###############################################################
+
+# The tests and the benchmarks need the data of the scripts without the files themselves, the benchmarks
+# at sizes far beyond the real files (10k to 50M rows). The generators build frames with the same columns and the compact
+# dtypes the scripts load them with: categorical strings, int32 counts, float32 prices and values.
+# Everything is drawn with vectorized NumPy calls from one seed, so a size is generated in seconds
+# and the same seed gives the same frame on every run and every commit.
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+FLO_CATEGORIES = ["KADIN", "ERKEK", "COCUK", "AKTIFCOCUK", "AKTIFSPOR"]
+
+FLO_CHANNELS = ["Android App", "Desktop", "Ios App", "Mobile"]
+
+
+def _strings(values, prefix=""):
+    # Integer -> string conversion in Arrow, a Python loop takes minutes at 50M values
+    strings = pc.cast(pa.array(values), pa.string())
+    if prefix:
+        strings = pc.binary_join_element_wise(prefix, strings, "")
+    return strings.to_numpy(zero_copy_only=False)
+
+
+def _skewed_choice(rng, n_values, size, alpha=1.2):
+    # A few customers place many orders and most place few, like the real data
+    weights = 1.0 / np.arange(1, n_values + 1) ** (1 / alpha)
+    return rng.permutation(n_values)[rng.choice(n_values, size=size, p=weights / weights.sum())]
+
+
+def online_retail_transactions(n_rows, n_customers=None, seed=0, start="2009-12-01", end="2011-12-09",
+                               lines_per_invoice=20, guest_rate=0.2, cancel_rate=0.02, n_products=4000,
+                               n_countries=40):
+    """
+    Transactions in the layout of load_online_retail(..., compact=True).
+
+    Invoices are numbered in date order and their lines are next to each other. Cancelled invoices carry
+    a "C" prefix and negative quantities, guest invoices have no Customer ID, and a few lines have a zero
+    price. InvoiceNo and Cancelled are filled in like the Parquet cache does.
+
+    Parameters:
+    -----------
+    n_rows: int
+        Number of invoice lines
+    n_customers: int, optional
+        Defaults to one customer per 100 lines, about the ratio of the real data
+    seed: int
+        Seed of the random generator
+    start, end: str
+        Range of InvoiceDate. The scripts analyse at 2011-12-11, so the default ends before it.
+    lines_per_invoice: int
+        Average number of lines of an invoice
+    guest_rate, cancel_rate: float
+        Share of the invoices without a customer and of the cancelled invoices
+
+    Returns:
+    --------
+    pandas.DataFrame
+    """
+    rng = np.random.default_rng(seed)
+    n_customers = n_customers or max(50, n_rows // 100)
+    n_invoices = max(1, n_rows // lines_per_invoice)
+
+    # Invoice of every line, sorted so the lines of an invoice are contiguous
+    invoice = np.sort(rng.integers(0, n_invoices, n_rows, dtype=np.int64))
+    cancelled = rng.random(n_invoices) < cancel_rate
+    number = 489434 + np.arange(n_invoices, dtype=np.int64)
+    invoices = pd.Index(_strings(number)).where(~cancelled, pd.Index(_strings(number, prefix="C")))
+
+    span = (pd.Timestamp(end) - pd.Timestamp(start)).value
+    offsets = np.sort(rng.integers(0, span, n_invoices, dtype=np.int64))
+    dates = np.datetime64(pd.Timestamp(start), "ns") + (offsets // 60_000_000_000 * 60_000_000_000).astype("m8[ns]")
+
+    customer = 12346 + _skewed_choice(rng, n_customers, n_invoices)
+    guest = rng.random(n_invoices) < guest_rate
+    country = np.minimum(rng.geometric(0.3, n_customers) - 1, n_countries - 1).astype(np.int8)
+
+    quantity = np.minimum(rng.geometric(0.12, n_rows), 10_000).astype(np.int32)
+    quantity[cancelled[invoice]] *= -1
+    product = _skewed_choice(rng, n_products, n_rows).astype(np.int16)
+    product_price = np.round(rng.lognormal(0.8, 0.9, n_products), 2)
+    price = product_price[product]
+    price[rng.random(n_rows) < 0.003] = 0
+
+    stock_codes = pd.Index(_strings(np.arange(n_products) + 20000))
+    descriptions = pd.Index(_strings(np.arange(n_products), prefix="PRODUCT "))
+    countries = pd.Index(_strings(np.arange(n_countries), prefix="Country "))
+    return pd.DataFrame({
+        "Invoice": pd.Categorical.from_codes(invoice.astype(np.int32), invoices),
+        "StockCode": pd.Categorical.from_codes(product, stock_codes),
+        "Description": pd.Categorical.from_codes(product, descriptions),
+        "Quantity": quantity,
+        "InvoiceDate": dates[invoice],
+        "Price": price.astype(np.float32),
+        "Customer ID": pd.arrays.IntegerArray(customer[invoice].astype(np.int32), guest[invoice]),
+        "Country": pd.Categorical.from_codes(country[customer[invoice] - 12346], countries),
+        "InvoiceNo": number[invoice].astype(np.int32),
+        "Cancelled": cancelled[invoice]})
+
+
+def flo_customers(n_rows, seed=0, start="2013-01-01", end="2021-05-30"):
+    """
+    Customers in the layout of flo_data_20k.csv cast to crmUtils.dtypes.FLO_COMPACT.
+
+    One row per master_id. last_order_date is the later of the online and offline last order dates,
+    both channels have at least one order, and interested_in_categories_12 holds lists like
+    "[KADIN, AKTIFSPOR]".
+
+    Parameters:
+    -----------
+    n_rows: int
+        Number of customers
+    seed: int
+        Seed of the random generator
+    start, end: str
+        Range of the order dates, the FLO scripts analyse at 2021-06-01
+
+    Returns:
+    --------
+    pandas.DataFrame
+    """
+    rng = np.random.default_rng(seed)
+    start, end = np.datetime64(pd.Timestamp(start), "D"), np.datetime64(pd.Timestamp(end), "D")
+    span = int((end - start) // np.timedelta64(1, "D"))
+
+    first = start + rng.integers(0, span, n_rows).astype("m8[D]")
+    remaining = ((end - first) // np.timedelta64(1, "D")).astype(np.int64)
+    online = first + (rng.random(n_rows) * (remaining + 1)).astype(np.int64).astype("m8[D]")
+    offline = first + (rng.random(n_rows) * (remaining + 1)).astype(np.int64).astype("m8[D]")
+
+    # Every non-empty subset of the categories as a list string, the empty list for a fifth of the customers
+    lists = ["[]"] + ["[" + ", ".join(c for i, c in enumerate(FLO_CATEGORIES) if subset >> i & 1) + "]"
+                      for subset in range(1, 1 << len(FLO_CATEGORIES))]
+    list_codes = np.where(rng.random(n_rows) < 0.2, 0, rng.integers(1, len(lists), n_rows))
+    channel = rng.integers(0, len(FLO_CHANNELS), n_rows)
+    last_channel = np.where(rng.random(n_rows) < 0.3, len(FLO_CHANNELS), channel)
+
+    return pd.DataFrame({
+        "master_id": _strings(np.arange(n_rows), prefix="cc"),
+        "order_channel": pd.Categorical.from_codes(channel, FLO_CHANNELS),
+        "last_order_channel": pd.Categorical.from_codes(last_channel, FLO_CHANNELS + ["Offline"]),
+        "first_order_date": first.astype("datetime64[ns]"),
+        "last_order_date": np.maximum(online, offline).astype("datetime64[ns]"),
+        "last_order_date_online": online.astype("datetime64[ns]"),
+        "last_order_date_offline": offline.astype("datetime64[ns]"),
+        "order_num_total_ever_online": np.minimum(rng.geometric(0.35, n_rows), 200).astype(np.int32),
+        "order_num_total_ever_offline": np.minimum(rng.geometric(0.6, n_rows), 100).astype(np.int32),
+        "customer_value_total_ever_offline": np.round(rng.lognormal(5.0, 0.8, n_rows), 2).astype(np.float32),
+        "customer_value_total_ever_online": np.round(rng.lognormal(5.3, 0.9, n_rows), 2).astype(np.float32),
+        "interested_in_categories_12": pd.Categorical.from_codes(list_codes, lists)})
@@ -0,0 +1,19 @@
+import pandas as pd
+
+from crmUtils.benchmark import PIPELINES, compare, load_results, run_benchmarks, save_results
+
+
+def test_run_save_and_compare(tmp_path):
+    report = run_benchmarks(sizes=[5_000], repeat=2, workdir=str(tmp_path), verbose=False)
+    results = pd.DataFrame(report["results"])
+    assert set(PIPELINES) <= set(results["pipeline"])
+    assert (results["seconds"] >= 0).all()
+
+    path = save_results(report, str(tmp_path / "report.json"))
+    baseline = load_results(path)
+    pd.testing.assert_frame_equal(baseline, results)
+    table = compare(baseline, results)
+    assert (table["time_ratio"] == 1).all() and not table["regression"].any()
+
+    slower = results.assign(seconds=results["seconds"] * 2 + 1)
+    assert compare(baseline, slower)["regression"].all()
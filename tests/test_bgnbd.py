@@ -0,0 +1,44 @@
+import datetime as dt
+
+import numpy as np
+import pytest
+from lifetimes import BetaGeoFitter
+
+from crmUtils.bgnbd import BGNBDFitter
+from crmUtils.streaming import clean_chunk
+from crmUtils.summary import cltv_summary
+from crmUtils.synthetic import online_retail_transactions
+
+TODAY = dt.datetime(2011, 12, 11)
+
+
+@pytest.fixture(scope="module")
+def summary():
+    # The weekly summary of create_cltv_p
+    df = clean_chunk(online_retail_transactions(50_000, seed=3, start="2010-06-01"), positive_quantity=True)
+    return cltv_summary(df[df["Price"] > 0], TODAY, freq="W").astype("float64")
+
+
+@pytest.fixture(scope="module")
+def fitted(summary):
+    args = summary["frequency"], summary["recency"], summary["T"]
+    return BGNBDFitter(penalizer_coef=0.001).fit(*args), BetaGeoFitter(penalizer_coef=0.001).fit(*args)
+
+
+def test_params_match_beta_geo_fitter(fitted):
+    bgf_native, bgf = fitted
+    # 4e-7 relative measured, see BGNBDFitter.fit
+    np.testing.assert_allclose(bgf_native.params_[bgf.params_.index], bgf.params_, rtol=1e-5)
+
+
+def test_predictions_match_beta_geo_fitter(fitted, summary):
+    bgf_native, bgf = fitted
+    args = summary["frequency"], summary["recency"], summary["T"]
+    np.testing.assert_allclose(bgf_native.predict(12, *args), bgf.predict(12, *args), rtol=1e-5)
+    np.testing.assert_allclose(bgf_native.conditional_probability_alive(*args),
+                               bgf.conditional_probability_alive(*args), rtol=1e-5)
+
+
+def test_predict_requires_fit():
+    with pytest.raises(ValueError):
+        BGNBDFitter().predict(4, 1, 10.0, 20.0)
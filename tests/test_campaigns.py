@@ -0,0 +1,73 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from crmUtils.campaigns import CampaignEngine, load_campaigns
+from crmUtils.flo import flo_cltv_prediction
+from crmUtils.synthetic import flo_customers
+
+# The two campaigns of FLO_CLTV_Prediction.py
+CAMPAIGNS = [
+    {"name": "vip_program_customers",
+     "where": [["cltv_segment", "==", "A"],
+               ["frequency", ">", "median"],
+               ["monetary_cltv_avg", ">", "p75"]]},
+    {"name": "new_customer_welcome_campaign",
+     "where": [["recency_cltv_weekly", "<=", 30],
+               ["frequency", ">=", 2],
+               ["cltv_segment", "not in", ["A", "B"]]]}]
+
+
+@pytest.fixture(scope="module")
+def customers():
+    return flo_customers(5_000, seed=7)
+
+
+@pytest.fixture(scope="module")
+def cltv_df(customers):
+    return flo_cltv_prediction(customers)
+
+
+def test_run_matches_pandas_filters(cltv_df, tmp_path):
+    # The filters of the script
+    vip = cltv_df[(cltv_df["cltv_segment"] == "A")
+                  & (cltv_df["frequency"] > cltv_df["frequency"].median())
+                  & (cltv_df["monetary_cltv_avg"] > cltv_df["monetary_cltv_avg"].quantile(0.75))]
+    new = cltv_df[(cltv_df["recency_cltv_weekly"] <= 30) & (cltv_df["frequency"] >= 2)
+                  & ~cltv_df["cltv_segment"].isin(["A", "B"])]
+
+    path = tmp_path / "campaigns.json"
+    path.write_text(json.dumps(CAMPAIGNS))
+    targets = CampaignEngine(cltv_df, "customer_id").run(load_campaigns(path))
+    np.testing.assert_array_equal(targets["vip_program_customers"], vip["customer_id"].to_numpy())
+    np.testing.assert_array_equal(targets["new_customer_welcome_campaign"], new["customer_id"].to_numpy())
+
+
+def test_category_predicates(customers):
+    engine = CampaignEngine(customers, "master_id", category_col="interested_in_categories_12")
+    targets = engine.run([{"name": "women", "where": [["order_channel", "in", ["Mobile"]]],
+                           "categories": {"any_of": ["KADIN"]}}])
+    expected = customers[(customers["order_channel"] == "Mobile")
+                         & customers["interested_in_categories_12"].astype(str).str.contains("KADIN")]
+    np.testing.assert_array_equal(targets["women"], expected["master_id"].to_numpy())
+
+
+def test_unknown_operator_and_statistic(cltv_df):
+    engine = CampaignEngine(cltv_df, "customer_id")
+    with pytest.raises(ValueError):
+        engine.condition("frequency", "~", 2)
+    with pytest.raises(ValueError):
+        engine.condition("frequency", ">", "mode")
+
+
+def test_export_writes_the_csv_files_of_the_script(cltv_df, tmp_path):
+    CampaignEngine(cltv_df, "customer_id").export(CAMPAIGNS, str(tmp_path), format="csv")
+    vip = cltv_df[(cltv_df["cltv_segment"] == "A")
+                  & (cltv_df["frequency"] > cltv_df["frequency"].median())
+                  & (cltv_df["monetary_cltv_avg"] > cltv_df["monetary_cltv_avg"].quantile(0.75))]
+    # The to_csv call the script had, the Arrow writer only quotes the strings
+    vip["customer_id"].to_csv(tmp_path / "expected.csv", index=False)
+    pd.testing.assert_frame_equal(pd.read_csv(tmp_path / "vip_program_customers.csv"),
+                                  pd.read_csv(tmp_path / "expected.csv"))
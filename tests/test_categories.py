@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from crmUtils.categories import CategoryIndex, parse_category_list
+from crmUtils.synthetic import flo_customers
+
+
+@pytest.fixture(scope="module")
+def customers():
+    df = flo_customers(5_000, seed=6)
+    lists = df["interested_in_categories_12"].astype(object)
+    lists[::97] = np.nan
+    segment = np.random.default_rng(6).random(len(df)) < 0.4
+    return df["master_id"], lists, segment
+
+
+@pytest.mark.parametrize("pattern, any_of", [("KADIN", ["KADIN"]),
+                                             ("ERKEK|COCUK|AKTIFCOCUK", ["ERKEK", "COCUK", "AKTIFCOCUK"])])
+def test_select_matches_str_contains(customers, pattern, any_of):
+    master_id, lists, segment = customers
+    # The targeting of FLO_RFM.py
+    expected = master_id[segment & lists.str.contains(pattern, na=False)]
+    index = CategoryIndex(master_id, lists)
+    np.testing.assert_array_equal(index.select(any_of=any_of, within=segment), expected.to_numpy())
+
+
+def test_all_of_and_none_of_match_parsed_lists(customers):
+    master_id, lists, _ = customers
+    parsed = [set(parse_category_list(text)) for text in lists]
+    index = CategoryIndex(master_id, lists)
+    np.testing.assert_array_equal(index.match(all_of=["KADIN", "AKTIFSPOR"]),
+                                  [{"KADIN", "AKTIFSPOR"} <= items for items in parsed])
+    np.testing.assert_array_equal(index.match(none_of=["ERKEK"]), ["ERKEK" not in items for items in parsed])
+    assert not index.match(all_of=["KADIN", "UNKNOWN"]).any()
+    np.testing.assert_array_equal(index.positions("COCUK"),
+                                  np.flatnonzero(["COCUK" in items for items in parsed]))
@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from crmUtils.cleaning import add_invoice_columns, cancelled_invoices, clean_transactions, net_cancellations
+from crmUtils.synthetic import online_retail_transactions
+
+
+@pytest.fixture(scope="module")
+def transactions():
+    # The layout of read_excel: object invoices and float64 ids, with a few missing ids and prices
+    df = online_retail_transactions(20_000, seed=15).astype({"Invoice": str, "Customer ID": "float64",
+                                                              "Price": "float64"})
+    df = df.drop(columns=["InvoiceNo", "Cancelled"])
+    rng = np.random.default_rng(15)
+    df.loc[rng.random(len(df)) < 0.01, "Price"] = np.nan
+    df.loc[rng.random(len(df)) < 0.02, "Price"] = 0.0
+    return df
+
+
+def _script_preparation(dataframe, positive_quantity, positive_price):
+    # The data preparation of create_cltv_c / create_cltv_p: in place dropna, then one filter per condition
+    df = dataframe.copy()
+    df.dropna(inplace=True)
+    df = df[~df["Invoice"].str.contains("C", na=False)]
+    if positive_quantity:
+        df = df[df["Quantity"] > 0]
+    if positive_price:
+        df = df[df["Price"] > 0]
+    df["TotalPrice"] = df["Quantity"] * df["Price"]
+    return df
+
+
+@pytest.mark.parametrize("positive_quantity, positive_price", [(False, False), (True, False), (True, True)])
+def test_clean_transactions_matches_the_scripts(transactions, positive_quantity, positive_price):
+    expected = _script_preparation(transactions, positive_quantity, positive_price)
+    cleaned = clean_transactions(transactions, positive_quantity=positive_quantity, positive_price=positive_price)
+    pd.testing.assert_frame_equal(cleaned, expected)
+
+
+def test_input_is_not_modified(transactions):
+    before = transactions.copy()
+    cleaned = clean_transactions(transactions, positive_quantity=True, positive_price=True)
+    cleaned.loc[cleaned.index[0], "Quantity"] = -1
+    pd.testing.assert_frame_equal(transactions, before)
+
+    # Every row survives: a shallow copy that still does not write through
+    kept = transactions.dropna()
+    kept = kept[kept["Quantity"] > 0]
+    cleaned = clean_transactions(kept, drop_cancelled=False, total_price=False)
+    cleaned["Quantity"] = 0
+    assert (kept["Quantity"] > 0).all()
+
+
+@pytest.mark.parametrize("dtype", ["object", "category"])
+def test_cancelled_invoices_matches_str_contains(transactions, dtype):
+    invoices = pd.concat([transactions["Invoice"], pd.Series(["A563185", None, "C489449"])],
+                         ignore_index=True).astype(dtype)
+    expected = invoices.astype(object).str.contains("C", na=False).astype(bool)
+    pd.testing.assert_series_equal(cancelled_invoices(invoices), expected)
+
+
+def test_cached_invoice_columns_give_the_same_rows(transactions):
+    cached = add_invoice_columns(transactions)
+    numbers = pd.to_numeric(transactions["Invoice"].str.lstrip("C")).to_numpy()
+    np.testing.assert_array_equal(cached["InvoiceNo"], numbers)
+    pd.testing.assert_frame_equal(clean_transactions(cached).drop(columns=["InvoiceNo", "Cancelled"]),
+                                  clean_transactions(transactions))
+
+
+def test_net_cancellations():
+    day = pd.Timestamp("2010-12-01")
+    purchases = pd.DataFrame({"Customer ID": [1.0, 1.0, 1.0, 2.0],
+                              "StockCode": ["A", "A", "B", "A"],
+                              "InvoiceDate": [day, day + pd.Timedelta(days=2), day, day],
+                              "Quantity": [5, 4, 3, 6]})
+    cancellations = pd.DataFrame({"Customer ID": [1.0, 1.0, 2.0, 2.0],
+                                  "StockCode": ["A", "B", "A", "A"],
+                                  "InvoiceDate": [day + pd.Timedelta(days=3), day + pd.Timedelta(days=1),
+                                                  day - pd.Timedelta(days=1), day + pd.Timedelta(days=1)],
+                                  "Quantity": [-2, -3, -9, -1]})
+    # The latest earlier line of the customer and StockCode is netted, a complete return drops the line,
+    # a cancellation before every purchase is ignored
+    netted = net_cancellations(purchases, cancellations)
+    assert netted.index.tolist() == [0, 1, 3]
+    assert netted["Quantity"].tolist() == [5, 2, 5]
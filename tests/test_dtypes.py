@@ -0,0 +1,58 @@
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from crmUtils.dtypes import FLO_COMPACT, ONLINE_RETAIL_COMPACT, compact_dtypes, memory_report
+from crmUtils.rfm import rfm_metrics
+from crmUtils.streaming import chunk_state, clean_chunk
+from crmUtils.synthetic import flo_customers, online_retail_transactions
+
+TODAY = dt.datetime(2011, 12, 11)
+
+
+@pytest.fixture(scope="module")
+def transactions():
+    # The layout of read_excel: object strings and float64 ids and prices
+    df = online_retail_transactions(30_000, seed=14)
+    return df.astype({"Invoice": str, "StockCode": str, "Description": str, "Country": str,
+                      "Customer ID": "float64", "Price": "float64"}).drop(columns=["InvoiceNo", "Cancelled"])
+
+
+def test_compact_dtypes_follow_the_plan(transactions):
+    before = transactions.copy()
+    compact = compact_dtypes(transactions)
+    pd.testing.assert_frame_equal(transactions, before)
+    for col in compact.columns:
+        assert compact[col].dtype == ONLINE_RETAIL_COMPACT[col]
+
+    report = memory_report(transactions, compact)
+    assert report.loc["total", "bytes_after"] < report.loc["total", "bytes_before"] / 2
+    # Casting again converts nothing
+    assert compact_dtypes(compact) is compact
+
+
+def test_rfm_and_state_on_compact_frames(transactions):
+    compact = compact_dtypes(transactions)
+    expected, rfm = rfm_metrics(clean_chunk(transactions), TODAY), rfm_metrics(clean_chunk(compact), TODAY)
+    np.testing.assert_array_equal(rfm.index, expected.index)
+    np.testing.assert_array_equal(rfm[["Recency", "Frequency"]], expected[["Recency", "Frequency"]])
+    # float32 prices keep the cents to about 1e-7 relative
+    np.testing.assert_allclose(rfm["Monetary"], expected["Monetary"], rtol=1e-6)
+
+    expected = chunk_state(clean_chunk(transactions, positive_quantity=True))
+    state = chunk_state(clean_chunk(compact, positive_quantity=True))
+    np.testing.assert_array_equal(state["total_unit"], expected["total_unit"])
+    np.testing.assert_allclose(state["total_price"], expected["total_price"], rtol=1e-6)
+
+
+def test_flo_compact(tmp_path):
+    path = tmp_path / "flo_data_20k.csv"
+    flo_customers(3_000, seed=14).to_csv(path, index=False)
+    df = pd.read_csv(path)
+    compact = compact_dtypes(df, FLO_COMPACT)
+    for col, dtype in FLO_COMPACT.items():
+        assert compact[col].dtype == dtype
+    np.testing.assert_allclose(compact["customer_value_total_ever_online"], df["customer_value_total_ever_online"],
+                               rtol=1e-6)
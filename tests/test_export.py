@@ -0,0 +1,63 @@
+import datetime as dt
+import io
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import pytest
+
+from crmUtils.export import export_frame, export_many
+from crmUtils.cleaning import clean_transactions
+from crmUtils.rfm import rfm_metrics, rfm_scores
+from crmUtils.synthetic import online_retail_transactions
+
+
+@pytest.fixture(scope="module")
+def rfm():
+    # The output of create_rfm
+    rfm = rfm_metrics(clean_transactions(online_retail_transactions(20_000, seed=20)), dt.datetime(2011, 12, 11))
+    rfm = rfm_scores(rfm[rfm["Monetary"] > 0].copy())[["segment", "Recency", "Frequency", "Monetary"]]
+    rfm.index = rfm.index.astype(int)
+    return rfm
+
+
+@pytest.mark.parametrize("format", ["csv", "csv.gz", "csv.zst"])
+def test_csv_reads_back_like_to_csv(rfm, tmp_path, format):
+    expected = tmp_path / "rfm_pandas.csv"
+    rfm.to_csv(expected)
+    result = export_frame(rfm, str(tmp_path / "rfm"), format=format)
+    assert result["rows"] == len(rfm) and result["path"].endswith("." + format)
+    # Decompressed by Arrow, pandas needs the zstandard package for .zst
+    with pa.input_stream(result["path"], compression="detect") as source:
+        written = pd.read_csv(io.BytesIO(source.read()))
+    pd.testing.assert_frame_equal(written, pd.read_csv(expected))
+
+
+def test_parquet_and_arrow_round_trip(rfm, tmp_path):
+    parquet = export_frame(rfm, str(tmp_path / "rfm"))
+    pd.testing.assert_frame_equal(pd.read_parquet(parquet["path"]), rfm.reset_index())
+    arrow = export_frame(rfm, str(tmp_path / "rfm"), format="arrow")
+    with ipc.open_file(arrow["path"]) as reader:
+        pd.testing.assert_frame_equal(reader.read_pandas(), rfm.reset_index())
+
+
+def test_one_file_per_segment(rfm, tmp_path):
+    export_frame(rfm, str(tmp_path / "rfm"), columns=["Recency", "Monetary"], partition_by="segment")
+    for segment, group in rfm.groupby("segment"):
+        part = pd.read_parquet(tmp_path / "rfm" / f"segment={segment}" / "part-0.parquet")
+        pd.testing.assert_frame_equal(part, group.reset_index()[["Customer ID", "Recency", "Monetary"]])
+
+
+def test_export_many(rfm, tmp_path):
+    champions = rfm.index[rfm["segment"] == "champions"].to_series(name="Customer ID")
+    report = export_many({"rfm": {"frame": rfm, "path": str(tmp_path / "rfm")},
+                          "champions": {"frame": champions, "path": str(tmp_path / "champions"),
+                                        "format": "csv", "index": False}})
+    assert report.loc["total", "rows"] == len(rfm) + len(champions)
+    np.testing.assert_array_equal(pd.read_csv(tmp_path / "champions.csv")["Customer ID"], champions)
+
+
+def test_unknown_format(rfm, tmp_path):
+    with pytest.raises(ValueError):
+        export_frame(rfm, str(tmp_path / "rfm"), format="xlsx")
@@ -0,0 +1,109 @@
+import datetime as dt
+
+import numpy as np
+import pandas as pd
+import pytest
+from lifetimes import BetaGeoFitter, GammaGammaFitter
+
+from crmUtils.flo import flo_cltv_prediction, flo_rfm_analysis
+from crmUtils.segments import SEG_MAP
+from crmUtils.synthetic import flo_customers
+
+TODAY = dt.datetime(2021, 6, 1)
+
+
+@pytest.fixture(scope="module", params=["compact", "csv"])
+def customers(request, tmp_path_factory):
+    df = flo_customers(5_000, seed=21)
+    if request.param == "csv":
+        # The layout of read_csv: date strings, float64 values and object categories
+        path = tmp_path_factory.mktemp("flo") / "flo_data_20k.csv"
+        df.to_csv(path, index=False)
+        df = pd.read_csv(path)
+    return df
+
+
+def _create_rfm_analysis(dataframe):
+    # create_rfm_analysis of FLO_RFM.py before flo_rfm_analysis
+    df = dataframe.copy()
+    df["TotalPrice"] = df["customer_value_total_ever_offline"] + df["customer_value_total_ever_online"]
+    df["TotalOrder"] = df["order_num_total_ever_offline"] + df["order_num_total_ever_online"]
+    for col in ["first_order_date", "last_order_date", "last_order_date_online", "last_order_date_offline"]:
+        df[col] = pd.to_datetime(df[col])
+
+    rfm = df.groupby("master_id").agg({
+        "last_order_date": lambda date: (TODAY - date.max()).days,
+        "TotalOrder": lambda order: order.sum(),
+        "TotalPrice": lambda price: price.sum()})
+    rfm.columns = ["recency", "frequency", "monetary"]
+    rfm["recency_score"] = pd.qcut(rfm["recency"], 5, labels=[5, 4, 3, 2, 1])
+    rfm["frequency_score"] = pd.qcut(rfm["frequency"].rank(method="first"), 5, labels=[1, 2, 3, 4, 5])
+    rfm["monetary_score"] = pd.qcut(rfm["monetary"], 5, labels=[1, 2, 3, 4, 5])
+    rfm["RF_Score"] = rfm["recency_score"].astype(str) + rfm["frequency_score"].astype(str)
+    rfm["segment"] = rfm["RF_Score"].replace(SEG_MAP, regex=True)
+
+    rfm_final = rfm.merge(df[["master_id", "interested_in_categories_12"]], on="master_id", how="left")
+    categories = rfm_final["interested_in_categories_12"].astype(str)
+    new_brand_targets = rfm_final[rfm_final["segment"].isin(["loyal_customers", "champions"])
+                                  & categories.str.contains("KADIN")]["master_id"]
+    discount_targets = rfm_final[rfm_final["segment"].isin(["cant_loose", "hibernating", "new_customers"])
+                                 & categories.str.contains("ERKEK|COCUK|AKTIFCOCUK", na=False)]["master_id"]
+    return rfm_final, new_brand_targets, discount_targets
+
+
+def test_flo_rfm_analysis_matches_create_rfm_analysis(customers):
+    expected, expected_new_brand, expected_discount = _create_rfm_analysis(customers)
+    _, rfm_final, new_brand_targets, discount_targets = flo_rfm_analysis(customers)
+
+    rfm_final = rfm_final.set_index("master_id").loc[expected["master_id"]]
+    for col in ["recency", "frequency", "monetary"]:
+        np.testing.assert_allclose(rfm_final[col], expected[col], rtol=1e-6)
+    for col in ["recency_score", "frequency_score", "monetary_score"]:
+        np.testing.assert_array_equal(rfm_final[col].astype(int), expected[col].astype(int))
+    np.testing.assert_array_equal(rfm_final["RF_Score"].astype(str), expected["RF_Score"])
+    np.testing.assert_array_equal(rfm_final["segment"].astype(str), expected["segment"])
+    assert set(new_brand_targets) == set(expected_new_brand)
+    assert set(discount_targets) == set(expected_discount)
+
+
+def _cltv_prediction(dataframe):
+    # The CLTV prediction of FLO_CLTV_Prediction.py with lifetimes
+    df = dataframe.copy()
+    for col in ["order_num_total_ever_online", "order_num_total_ever_offline",
+                "customer_value_total_ever_offline", "customer_value_total_ever_online"]:
+        quartile1, quartile3 = df[col].quantile(0.01), df[col].quantile(0.99)
+        up_limit = round(quartile3 + 1.5 * (quartile3 - quartile1))
+        df.loc[df[col] > up_limit, col] = up_limit
+    df["total_customer_value"] = df["customer_value_total_ever_offline"] + df["customer_value_total_ever_online"]
+    df["total_customer_order"] = df["order_num_total_ever_offline"] + df["order_num_total_ever_online"]
+    for col in ["first_order_date", "last_order_date"]:
+        df[col] = pd.to_datetime(df[col])
+
+    cltv_df = pd.DataFrame({"customer_id": df["master_id"],
+                            "recency_cltv_weekly": (df["last_order_date"] - df["first_order_date"]).dt.days / 7,
+                            "T_weekly": (TODAY - df["first_order_date"]).dt.days / 7,
+                            "frequency": df["total_customer_order"].astype("float64"),
+                            "monetary_cltv_avg": (df["total_customer_value"]
+                                                  / df["total_customer_order"]).astype("float64")})
+    args = cltv_df["frequency"], cltv_df["recency_cltv_weekly"], cltv_df["T_weekly"]
+    bgf = BetaGeoFitter(penalizer_coef=0.001).fit(*args)
+    ggf = GammaGammaFitter(penalizer_coef=0.001).fit(cltv_df["frequency"], cltv_df["monetary_cltv_avg"])
+    cltv_df["exp_sales_3_month"] = bgf.predict(12, *args)
+    cltv_df["exp_sales_6_month"] = bgf.predict(24, *args)
+    cltv_df["cltv"] = ggf.customer_lifetime_value(bgf, *args, cltv_df["monetary_cltv_avg"], time=6, freq="W",
+                                                  discount_rate=0.01)
+    cltv_df["cltv_segment"] = pd.qcut(cltv_df["cltv"], 4, ["D", "C", "B", "A"])
+    return cltv_df
+
+
+def test_flo_cltv_prediction_matches_lifetimes(customers):
+    expected = _cltv_prediction(customers)
+    cltv_df = flo_cltv_prediction(customers)
+
+    np.testing.assert_array_equal(cltv_df["customer_id"], expected["customer_id"])
+    for col in ["recency_cltv_weekly", "T_weekly", "frequency", "monetary_cltv_avg"]:
+        np.testing.assert_allclose(cltv_df[col], expected[col], rtol=1e-6)
+    # The fits stop at the same tolerances but not at the same iterate
+    for col in ["exp_sales_3_month", "exp_sales_6_month", "cltv"]:
+        np.testing.assert_allclose(cltv_df[col], expected[col], rtol=1e-5)
+    np.testing.assert_array_equal(cltv_df["cltv_segment"].astype(str), expected["cltv_segment"].astype(str))
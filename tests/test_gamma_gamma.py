@@ -0,0 +1,50 @@
+import datetime as dt
+
+import numpy as np
+import pytest
+from lifetimes import BetaGeoFitter, GammaGammaFitter
+
+from crmUtils.gamma_gamma import GammaGammaModel
+from crmUtils.streaming import clean_chunk
+from crmUtils.summary import cltv_summary
+from crmUtils.synthetic import online_retail_transactions
+
+TODAY = dt.datetime(2011, 12, 11)
+
+
+@pytest.fixture(scope="module")
+def summary():
+    # The weekly summary of create_cltv_p
+    df = clean_chunk(online_retail_transactions(50_000, seed=4, start="2010-06-01"), positive_quantity=True)
+    return cltv_summary(df[df["Price"] > 0], TODAY, freq="W").astype("float64")
+
+
+@pytest.fixture(scope="module")
+def fitted(summary):
+    args = summary["frequency"], summary["monetary"]
+    return GammaGammaModel(penalizer_coef=0.001).fit(*args), GammaGammaFitter(penalizer_coef=0.001).fit(*args)
+
+
+def test_params_match_gamma_gamma_fitter(fitted):
+    ggf_native, ggf = fitted
+    # 2e-7 relative measured, see GammaGammaModel.fit
+    np.testing.assert_allclose(ggf_native.params_[ggf.params_.index], ggf.params_, rtol=1e-5)
+
+
+def test_predictions_match_gamma_gamma_fitter(fitted, summary):
+    ggf_native, ggf = fitted
+    np.testing.assert_allclose(
+        ggf_native.conditional_expected_average_profit(summary["frequency"], summary["monetary"]),
+        ggf.conditional_expected_average_profit(summary["frequency"], summary["monetary"]), rtol=1e-5)
+
+    bgf = BetaGeoFitter(penalizer_coef=0.001).fit(summary["frequency"], summary["recency"], summary["T"])
+    args = bgf, summary["frequency"], summary["recency"], summary["T"], summary["monetary"]
+    np.testing.assert_allclose(ggf_native.customer_lifetime_value(*args, time=3, freq="W"),
+                               ggf.customer_lifetime_value(*args, time=3, freq="W"), rtol=1e-5)
+
+
+def test_float32_input_gives_float32_profit(fitted, summary):
+    ggf_native, _ = fitted
+    profit = ggf_native.conditional_expected_average_profit(summary["frequency"].astype("float32"),
+                                                            summary["monetary"].astype("float32"))
+    assert profit.dtype == np.float32
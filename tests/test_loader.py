@@ -0,0 +1,82 @@
+import os
+
+import pandas as pd
+import pytest
+
+import crmUtils.loader as loader
+from crmUtils.dtypes import ONLINE_RETAIL_COMPACT
+from crmUtils.loader import ONLINE_RETAIL_SHEETS, RFM_COLUMNS, load_online_retail, warm_cache
+from crmUtils.pipeline import rfm_dag
+from crmUtils.synthetic import online_retail_transactions
+
+pytest.importorskip("openpyxl")
+
+
+def _sheet(seed):
+    # The workbook mixes int and str invoices and stock codes, and has float ids with missing values
+    df = online_retail_transactions(2_000, seed=seed).drop(columns=["InvoiceNo", "Cancelled"])
+    invoices = df["Invoice"].astype(str)
+    return df.astype({"Customer ID": "float64", "Price": "float64", "Quantity": "int64",
+                      "Description": str, "Country": str}).assign(
+        Invoice=[int(i) if i.isdigit() else i for i in invoices],
+        StockCode=[int(s) if str(s).isdigit() else str(s) for s in df["StockCode"].astype(str)])
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    path = tmp_path / "online_retail_II.xlsx"
+    with pd.ExcelWriter(path) as writer:
+        for seed, sheet in enumerate(ONLINE_RETAIL_SHEETS):
+            _sheet(seed).to_excel(writer, sheet_name=sheet, index=False)
+    return str(path)
+
+
+@pytest.fixture
+def read_excel_calls(monkeypatch):
+    calls = []
+    read_excel = pd.read_excel
+
+    def counting(*args, **kwargs):
+        calls.append(kwargs.get("sheet_name"))
+        return read_excel(*args, **kwargs)
+
+    monkeypatch.setattr(loader.pd, "read_excel", counting)
+    return calls
+
+
+def test_cached_sheet_matches_read_excel(workbook):
+    expected = pd.read_excel(workbook, sheet_name=ONLINE_RETAIL_SHEETS[1])
+    df = load_online_retail(workbook, sheet_name=ONLINE_RETAIL_SHEETS[1])
+    assert df["Invoice"].astype(str).tolist() == expected["Invoice"].astype(str).tolist()
+    assert df["Cancelled"].tolist() == expected["Invoice"].astype(str).str.contains("C").tolist()
+    pd.testing.assert_series_equal(df["Price"], expected["Price"])
+    pd.testing.assert_series_equal(df["Customer ID"], expected["Customer ID"])
+
+    assert df.columns.tolist()[:len(expected.columns)] == expected.columns.tolist()
+    projected = load_online_retail(workbook, sheet_name=ONLINE_RETAIL_SHEETS[1], columns=RFM_COLUMNS)
+    assert projected.columns.tolist() == RFM_COLUMNS
+    # Enough for every variant of create_rfm
+    assert not rfm_dag().run(projected, net_cancelled=True).empty
+    compact = load_online_retail(workbook, sheet_name=ONLINE_RETAIL_SHEETS[1], compact=True)
+    assert all(compact[col].dtype == dtype for col, dtype in ONLINE_RETAIL_COMPACT.items())
+
+
+def test_workbook_is_converted_once(workbook, read_excel_calls):
+    warm_cache(workbook)
+    assert read_excel_calls == ONLINE_RETAIL_SHEETS
+    load_online_retail(workbook)
+    assert len(read_excel_calls) == 2
+
+    # A new mtime with the same content only refreshes the manifest
+    stat = os.stat(workbook)
+    os.utime(workbook, (stat.st_atime, stat.st_mtime + 10))
+    load_online_retail(workbook)
+    load_online_retail(workbook)
+    assert len(read_excel_calls) == 2
+
+    # A new content is converted again
+    with pd.ExcelWriter(workbook) as writer:
+        _sheet(5).to_excel(writer, sheet_name=ONLINE_RETAIL_SHEETS[0], index=False)
+    df = load_online_retail(workbook)
+    assert read_excel_calls[2:] == [ONLINE_RETAIL_SHEETS[0]]
+    assert len(df) == len(_sheet(5))
@@ -0,0 +1,57 @@
+import pandas as pd
+import pytest
+
+from crmUtils.flo import FLO_OUTLIER_COLUMNS
+from crmUtils.outliers import OutlierCapper
+from crmUtils.synthetic import flo_customers, online_retail_transactions
+
+
+def outlier_thresholds(dataframe, variable, round_limits):
+    # The helpers of CltvPrediction.py and FLO_CLTV_Prediction.py (round_limits)
+    quartile1 = dataframe[variable].quantile(0.01)
+    quartile3 = dataframe[variable].quantile(0.99)
+    interquartile_range = quartile3 - quartile1
+    up_limit = quartile3 + 1.5 * interquartile_range
+    low_limit = quartile1 - 1.5 * interquartile_range
+    if round_limits:
+        return round(low_limit), round(up_limit)
+    return low_limit, up_limit
+
+
+def replace_with_thresholds(dataframe, variable, round_limits=False):
+    low_limit, up_limit = outlier_thresholds(dataframe, variable, round_limits)
+    dataframe.loc[(dataframe[variable] > up_limit), variable] = up_limit
+
+
+@pytest.mark.parametrize("round_limits", [False, True])
+def test_flo_capping_matches_replace_with_thresholds(round_limits):
+    # The layout of read_csv: float64 counts and values
+    df = flo_customers(5_000, seed=12).astype({col: "float64" for col in FLO_OUTLIER_COLUMNS})
+    # A few heavy customers above the limits of every column
+    df.loc[df.index[::250], FLO_OUTLIER_COLUMNS] *= 40
+    expected = df.copy()
+    for col in FLO_OUTLIER_COLUMNS:
+        replace_with_thresholds(expected, col, round_limits=round_limits)
+
+    capped = OutlierCapper(round_limits=round_limits).fit_transform(df, FLO_OUTLIER_COLUMNS)
+    pd.testing.assert_frame_equal(capped, expected)
+
+
+def test_online_retail_capping_and_saved_thresholds(tmp_path):
+    columns = ["Quantity", "Price"]
+    df = online_retail_transactions(30_000, seed=12)[columns].astype("float64")
+    df = df[(df["Quantity"] > 0) & (df["Price"] > 0)]
+    expected = df.copy()
+    for col in columns:
+        replace_with_thresholds(expected, col)
+
+    capper = OutlierCapper()
+    pd.testing.assert_frame_equal(capper.fit_transform(df, columns), expected)
+    capper.save(tmp_path / "thresholds.json")
+    pd.testing.assert_frame_equal(OutlierCapper.load(tmp_path / "thresholds.json").transform(df), expected)
+
+
+def test_integer_counts_stay_integer_with_rounded_limits():
+    df = flo_customers(5_000, seed=12)
+    capped = OutlierCapper(round_limits=True).fit_transform(df, ["order_num_total_ever_online"])
+    assert capped["order_num_total_ever_online"].dtype == df["order_num_total_ever_online"].dtype
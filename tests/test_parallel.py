@@ -0,0 +1,47 @@
+import datetime as dt
+
+import pandas as pd
+import pytest
+
+from crmUtils.parallel import parallel_cltv_summary, parallel_state, partition_by_customer
+from crmUtils.streaming import chunk_state, clean_chunk
+from crmUtils.summary import cltv_summary
+from crmUtils.synthetic import online_retail_transactions
+
+TODAY = dt.datetime(2011, 12, 11)
+
+
+@pytest.fixture(scope="module")
+def cleaned():
+    df = online_retail_transactions(40_000, seed=8)
+    df = clean_chunk(df, positive_quantity=True)
+    return df[df["Price"] > 0]
+
+
+def test_every_customer_is_in_one_partition(cleaned):
+    partitions = partition_by_customer(cleaned, 3)
+    assert sum(len(partition) for partition in partitions) == len(cleaned)
+    customers = [set(partition["Customer ID"]) for partition in partitions]
+    assert sum(len(ids) for ids in customers) == cleaned["Customer ID"].nunique()
+
+
+@pytest.mark.parametrize("n_workers", [1, 3])
+def test_parallel_results_match_one_process(cleaned, n_workers):
+    pd.testing.assert_frame_equal(parallel_state(cleaned, n_workers=n_workers), chunk_state(cleaned))
+    pd.testing.assert_frame_equal(parallel_cltv_summary(cleaned, TODAY, n_workers=n_workers),
+                                  cltv_summary(cleaned, TODAY, freq="W"))
+
+
+@pytest.mark.parametrize("n_customers", [0, 1, 3])
+def test_fewer_customers_than_workers(cleaned, n_customers):
+    customers = cleaned["Customer ID"].drop_duplicates().iloc[:n_customers]
+    few = cleaned[cleaned["Customer ID"].isin(customers)]
+    pd.testing.assert_frame_equal(parallel_state(few, n_workers=8), chunk_state(few))
+    pd.testing.assert_frame_equal(parallel_cltv_summary(few, TODAY, n_workers=8), cltv_summary(few, TODAY, freq="W"))
+
+
+def test_every_partition_summary_is_empty(cleaned):
+    # min_frequency drops every customer in every partition
+    expected = cltv_summary(cleaned, TODAY, freq="W", min_frequency=10**6)
+    assert expected.empty
+    pd.testing.assert_frame_equal(parallel_cltv_summary(cleaned, TODAY, n_workers=3, min_frequency=10**6), expected)
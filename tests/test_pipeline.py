@@ -0,0 +1,51 @@
+import pandas as pd
+import pytest
+
+from crmUtils.pipeline import Pipeline, Stage, cltv_p_dag, rfm_dag
+from crmUtils.segments import SEG_MAP
+from crmUtils.synthetic import online_retail_transactions
+
+
+@pytest.fixture(scope="module")
+def transactions():
+    return online_retail_transactions(30_000, seed=23, start="2010-06-01")
+
+
+def test_new_month_only_predicts_and_segments_again(transactions, tmp_path):
+    dag = cltv_p_dag(cache_dir=str(tmp_path))
+    cltv_3 = dag.run(transactions, month=3)
+    assert set(dag.last_run.values()) == {"computed"}
+
+    cltv_6 = dag.run(transactions, month=6)
+    # The stages upstream of a cached result are not even looked up
+    assert dag.last_run == {"summary": "memory", "fit": "memory", "predict": "computed", "segment": "computed"}
+    pd.testing.assert_frame_equal(cltv_6, cltv_p_dag().run(transactions, month=6))
+
+    # A new process finds the persisted stages on disk, the segments are not persisted
+    dag = cltv_p_dag(cache_dir=str(tmp_path))
+    pd.testing.assert_frame_equal(dag.run(transactions, month=3), cltv_3)
+    assert dag.last_run == {"predict": "disk", "segment": "computed"}
+
+
+def test_new_seg_map_only_segments_again(transactions):
+    dag = rfm_dag()
+    dag.run(transactions)
+    seg_map = {**SEG_MAP, r"33": "needs_attention"}
+    rfm = dag.run(transactions, seg_map=seg_map)
+    assert dag.last_run == {"scores": "memory", "segment": "computed"}
+    assert "needs_attention" in set(rfm["segment"]) and "need_attention" not in set(rfm["segment"])
+
+
+def test_results_are_not_changed_through_the_cache(transactions):
+    dag = rfm_dag()
+    rfm = dag.run(transactions)
+    expected = rfm.copy()
+    rfm["Monetary"] = 0
+    pd.testing.assert_frame_equal(dag.run(transactions), expected)
+
+
+def test_unknown_parameters_and_stages():
+    with pytest.raises(TypeError):
+        rfm_dag().run(pd.DataFrame(), month=3)
+    with pytest.raises(ValueError):
+        Pipeline("broken", [Stage("segment", lambda scores: scores, ["scores"])])
@@ -0,0 +1,54 @@
+import datetime as dt
+
+import numpy as np
+import pytest
+from lifetimes import BetaGeoFitter, GammaGammaFitter
+
+from crmUtils.prediction import predict_horizons
+from crmUtils.streaming import clean_chunk
+from crmUtils.summary import cltv_summary
+from crmUtils.synthetic import online_retail_transactions
+
+TODAY = dt.datetime(2011, 12, 11)
+
+
+@pytest.fixture(scope="module")
+def summary():
+    # The weekly summary of create_cltv_p
+    df = clean_chunk(online_retail_transactions(50_000, seed=5, start="2010-06-01"), positive_quantity=True)
+    return cltv_summary(df[df["Price"] > 0], TODAY, freq="W").astype("float64")
+
+
+@pytest.fixture(scope="module")
+def models(summary):
+    bgf = BetaGeoFitter(penalizer_coef=0.001).fit(summary["frequency"], summary["recency"], summary["T"])
+    ggf = GammaGammaFitter(penalizer_coef=0.01).fit(summary["frequency"], summary["monetary"])
+    return bgf, ggf
+
+
+@pytest.mark.parametrize("batch_size", [1_000_000, 37])
+def test_predict_horizons_matches_lifetimes(models, summary, batch_size):
+    bgf, ggf = models
+    args = summary["frequency"], summary["recency"], summary["T"]
+    predictions = predict_horizons(bgf, ggf, *args, summary["monetary"], horizons=(1, 4, 12),
+                                   clv_months=(3, 6), freq="W", discount_rate=0.01, batch_size=batch_size)
+
+    assert predictions.index.equals(summary.index)
+    for h in (1, 4, 12):
+        np.testing.assert_allclose(predictions[f"expected_purc_{h}"], bgf.predict(h, *args), rtol=1e-10)
+    np.testing.assert_allclose(predictions["expected_average_profit"],
+                               ggf.conditional_expected_average_profit(summary["frequency"], summary["monetary"]),
+                               rtol=1e-10)
+    for months in (3, 6):
+        clv = ggf.customer_lifetime_value(bgf, *args, summary["monetary"], time=months, freq="W", discount_rate=0.01)
+        np.testing.assert_allclose(predictions[f"clv_{months}"], clv, rtol=1e-10)
+
+
+def test_purchases_only_without_gamma_gamma(models, summary):
+    # The scripts predict the purchases before the Gamma-Gamma model is fitted
+    bgf, _ = models
+    args = summary["frequency"], summary["recency"], summary["T"]
+    purchases = predict_horizons(bgf, None, *args, summary["monetary"], horizons=(12, 24), clv_months=())
+    assert purchases.columns.tolist() == ["expected_purc_12", "expected_purc_24"]
+    for h in (12, 24):
+        np.testing.assert_allclose(purchases[f"expected_purc_{h}"], bgf.predict(h, *args), rtol=1e-10)
@@ -0,0 +1,50 @@
+import json
+
+import pandas as pd
+import pytest
+
+from crmUtils.flo import flo_cltv_prediction
+from crmUtils.pipeline import cltv_p_dag
+from crmUtils.profiling import NULL_PROFILER, JSONSink, Profiler, StatsSink
+from crmUtils.synthetic import flo_customers, online_retail_transactions
+
+
+def test_pipeline_stages_are_recorded(tmp_path):
+    stats = StatsSink()
+    path = tmp_path / "profile.jsonl"
+    profiler = Profiler(stats, JSONSink(str(path)), run_id="test")
+    df = online_retail_transactions(20_000, seed=22, start="2010-06-01")
+    cltv_final = cltv_p_dag().run(df, profiler=profiler)
+
+    assert [r["stage"] for r in stats.records] == ["clean", "outliers", "summary", "fit", "predict", "segment"]
+    assert all(r["pipeline"] == "create_cltv_p" and r["run_id"] == "test" for r in stats.records)
+    assert stats.records[0]["rows_in"] == len(df)
+    assert stats.records[-1]["rows_out"] == len(cltv_final)
+    assert [json.loads(line)["stage"] for line in path.read_text().splitlines()] == \
+        [r["stage"] for r in stats.records]
+
+    summary = stats.summary()
+    assert summary["calls"].tolist() == [1] * 6
+    assert (summary["total_seconds"] >= 0).all()
+
+
+def test_profiling_does_not_change_results():
+    df = flo_customers(3_000, seed=22)
+    stats = StatsSink()
+    pd.testing.assert_frame_equal(flo_cltv_prediction(df, profiler=Profiler(stats, memory=False)),
+                                  flo_cltv_prediction(df))
+    assert [r["stage"] for r in stats.records] == ["clean", "summary", "fit", "predict", "segment"]
+    assert all(r["peak_rss_mb"] is None for r in stats.records)
+
+
+def test_failed_stage_is_recorded():
+    stats = StatsSink()
+    with pytest.raises(ZeroDivisionError):
+        Profiler(stats).call("divide", lambda x: x / 0, 1)
+    assert stats.records[0]["error"] == "ZeroDivisionError"
+
+
+def test_null_profiler_runs_the_function():
+    assert NULL_PROFILER.bind(pipeline="x").call("stage", len, [1, 2]) == 2
+    with NULL_PROFILER.stage("stage") as stage:
+        stage.rows_out = 1
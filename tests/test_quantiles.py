@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from crmUtils.quantiles import QuantileBinner, qcut_scores
+
+LABELS = [1, 2, 3, 4, 5]
+
+
+@pytest.fixture(scope="module")
+def frequency():
+    # Order counts with many ties and a few missing values
+    values = np.random.default_rng(9).zipf(1.8, 50_000).clip(max=500).astype(float)
+    values[::101] = np.nan
+    return pd.Series(values)
+
+
+def test_exact_matches_qcut():
+    monetary = pd.Series(np.random.default_rng(9).lognormal(5, 1, 20_000))
+    binner = QuantileBinner(5, labels=LABELS)
+    for chunk in np.array_split(monetary.to_numpy(), 4):
+        binner.partial_fit(chunk)
+    np.testing.assert_array_equal(binner.transform(monetary.to_numpy()).codes,
+                                  pd.qcut(monetary, 5, labels=LABELS).cat.codes)
+
+
+def test_chunked_rank_first_matches_qcut_of_first_ranks(frequency):
+    expected = pd.qcut(frequency.rank(method="first"), 5, labels=LABELS).cat.codes.to_numpy()
+    chunks = np.array_split(frequency.to_numpy(), 5)
+    binner = QuantileBinner(5, labels=LABELS, rank_first=True)
+    for chunk in chunks:
+        binner.partial_fit(chunk)
+    codes = np.concatenate([binner.transform(chunk).codes for chunk in chunks])
+    np.testing.assert_array_equal(codes, expected)
+    np.testing.assert_array_equal(binner._tie_values, np.unique(frequency.dropna()))
+
+
+def test_approx_rank_first_is_close(frequency):
+    expected = pd.qcut(frequency.rank(method="first"), 5, labels=LABELS).cat.codes.to_numpy()
+    codes = qcut_scores(frequency, 5, labels=LABELS, method="approx", rank_first=True).cat.codes.to_numpy()
+    assert np.mean(codes != expected) < 0.05
+
+
+def test_rank_first_needs_bounded_integer_values(frequency):
+    with pytest.raises(ValueError):
+        QuantileBinner(5, rank_first=True).fit_transform(frequency.to_numpy() + 0.5)
+    with pytest.raises(ValueError):
+        QuantileBinner(5, rank_first=True, max_tie_values=10).fit_transform(frequency.to_numpy())
@@ -0,0 +1,55 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from crmUtils.pipeline import cltv_p_dag
+from crmUtils.predictors import BGNBDPredictor, GammaGammaPredictor
+from crmUtils.registry import ModelRegistry, models_from_record
+from crmUtils.synthetic import online_retail_transactions
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+
+
+@pytest.fixture(scope="module")
+def summary():
+    df = online_retail_transactions(50_000, seed=13, start="2010-06-01")
+    s = cltv_p_dag().run(df, target="summary")
+    return s["frequency"], s["recency"], s["T"], s["monetary"]
+
+
+def test_fit_then_load(summary, tmp_path):
+    registry = ModelRegistry(str(tmp_path))
+    bgf, ggf = registry.fit_or_load("online_retail", *summary, penalizer_coef=0.001)
+    loaded_bgf, loaded_ggf = registry.fit_or_load("online_retail", *summary, penalizer_coef=0.001)
+    assert registry.versions("online_retail") == [1]
+    assert isinstance(loaded_bgf, BGNBDPredictor) and isinstance(loaded_ggf, GammaGammaPredictor)
+
+    frequency, recency, T, monetary = summary
+    np.testing.assert_array_equal(loaded_bgf.predict(12, frequency, recency, T),
+                                  bgf.predict(12, frequency, recency, T))
+    np.testing.assert_array_equal(loaded_ggf.customer_lifetime_value(loaded_bgf, *summary, time=3, freq="W"),
+                                  ggf.customer_lifetime_value(bgf, *summary, time=3, freq="W"))
+
+    # Another penalizer or a refit is a new version
+    registry.fit_or_load("online_retail", *summary, penalizer_coef=0.01)
+    registry.fit_or_load("online_retail", *summary, penalizer_coef=0.001, refit=True)
+    assert registry.versions("online_retail") == [1, 2, 3]
+    assert registry.load("online_retail")["penalizer_coef"] == 0.001
+
+
+def test_loading_does_not_import_the_optimizer(summary, tmp_path):
+    ModelRegistry(str(tmp_path)).fit_or_load("online_retail", *summary, penalizer_coef=0.001)
+    code = ("import sys\n"
+            "from crmUtils.registry import ModelRegistry, models_from_record\n"
+            f"bgf, ggf = models_from_record(ModelRegistry({str(tmp_path)!r}).load('online_retail'))\n"
+            "bgf.predict(4, 3.0, 20.0, 40.0)\n"
+            "assert 'scipy.optimize' not in sys.modules, 'scipy.optimize was imported'\n")
+    subprocess.run([sys.executable, "-c", code], check=True, cwd=REPO_ROOT)
+
+
+def test_models_from_record_needs_every_parameter():
+    with pytest.raises(KeyError):
+        models_from_record({"bgnbd": {"r": 1.0}, "gamma_gamma": {"p": 1.0, "q": 2.0, "v": 3.0}})
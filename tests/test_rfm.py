@@ -0,0 +1,79 @@
+import datetime as dt
+
+import pandas as pd
+import pytest
+
+from crmUtils.flo import FLO_TODAY, preprocess_flo
+from crmUtils.rfm import rfm_metrics
+from crmUtils.synthetic import flo_customers, online_retail_transactions
+
+TODAY = dt.datetime(2011, 12, 11)
+
+
+def _prepared(compact):
+    # Data preparation of CustomerSegmentationWithRFM.py on synthetic online_retail_II lines
+    df = online_retail_transactions(20_000, seed=1)
+    if not compact:
+        # The layout of read_excel: object strings and float64 ids and prices
+        df = df.astype({"Invoice": str, "StockCode": str, "Description": str, "Country": str,
+                        "Customer ID": "float64", "Price": "float64"})
+    df = df.dropna(subset=["Customer ID"])
+    df = df[~df["Invoice"].astype(str).str.contains("C", na=False)]
+    return df.assign(TotalPrice=df["Quantity"] * df["Price"])
+
+
+def _lambda_rfm(df, today_date):
+    # The groupby with Python lambdas the scripts used before rfm_metrics
+    rfm = df.groupby("Customer ID", observed=True).agg({
+        "InvoiceDate": lambda InvoiceDate: (today_date - InvoiceDate.max()).days,
+        "Invoice": lambda Invoice: Invoice.nunique(),
+        "TotalPrice": lambda TotalPrice: TotalPrice.sum()})
+    rfm.columns = ["Recency", "Frequency", "Monetary"]
+    return rfm
+
+
+@pytest.mark.parametrize("compact", [True, False])
+@pytest.mark.parametrize("method", ["groupby", "numpy"])
+def test_rfm_metrics_matches_lambda_groupby(method, compact):
+    df = _prepared(compact)
+    pd.testing.assert_frame_equal(rfm_metrics(df, TODAY, method=method), _lambda_rfm(df, TODAY))
+
+
+@pytest.mark.parametrize("compact", [True, False])
+def test_rfm_metrics_of_no_customers_is_empty(compact):
+    # An empty and a fully filtered frame give the empty frame of the groupby
+    df = _prepared(compact)
+    for empty in [df.iloc[:0], df[df["Quantity"] > 10**9]]:
+        rfm = rfm_metrics(empty, TODAY, method="numpy")
+        assert rfm.empty
+        pd.testing.assert_frame_equal(rfm, rfm_metrics(empty, TODAY))
+
+
+def _flo_lambda_rfm(df, today_date):
+    # The groupby with Python lambdas of FLO_RFM.py
+    rfm = df.groupby("master_id").agg({"last_order_date": lambda date: (today_date - date.max()).days,
+                                       "TotalOrder": lambda order: order.sum(),
+                                       "TotalPrice": lambda price: price.sum()})
+    rfm.columns = ["recency", "frequency", "monetary"]
+    return rfm
+
+
+@pytest.mark.parametrize("customer_level", [True, "auto"])
+def test_customer_level_matches_lambda_groupby(customer_level):
+    df = preprocess_flo(flo_customers(5_000, seed=1))
+    rfm = rfm_metrics(df, FLO_TODAY, customer_col="master_id", date_col="last_order_date",
+                      frequency_col="TotalOrder", monetary_col="TotalPrice", frequency_agg="sum",
+                      columns=("recency", "frequency", "monetary"), customer_level=customer_level)
+    pd.testing.assert_frame_equal(rfm, _flo_lambda_rfm(df, FLO_TODAY))
+
+
+def test_customer_level_repeated_ids():
+    df = preprocess_flo(flo_customers(1_000, seed=1))
+    df = pd.concat([df, df.iloc[:10]])
+    kwargs = dict(customer_col="master_id", date_col="last_order_date", frequency_col="TotalOrder",
+                  monetary_col="TotalPrice", frequency_agg="sum", columns=("recency", "frequency", "monetary"))
+    with pytest.raises(ValueError):
+        rfm_metrics(df, FLO_TODAY, customer_level=True, **kwargs)
+    # "auto" falls back to the groupby
+    pd.testing.assert_frame_equal(rfm_metrics(df, FLO_TODAY, customer_level="auto", **kwargs),
+                                  _flo_lambda_rfm(df, FLO_TODAY))
@@ -0,0 +1,53 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from crmUtils.bgnbd import BGNBDFitter
+from crmUtils.gamma_gamma import GammaGammaModel
+from crmUtils.pipeline import cltv_p_dag
+from crmUtils.prediction import predict_horizons
+from crmUtils.scoring import CLTVScorer, freeze_cut_points
+from crmUtils.synthetic import online_retail_transactions
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+
+
+@pytest.fixture(scope="module")
+def fitted():
+    df = online_retail_transactions(50_000, seed=14, start="2010-06-01")
+    summary = cltv_p_dag().run(df, target="summary").astype("float64")
+    bgf = BGNBDFitter(penalizer_coef=0.001).fit(summary["frequency"], summary["recency"], summary["T"])
+    ggf = GammaGammaModel(penalizer_coef=0.001).fit(summary["frequency"], summary["monetary"])
+    return summary, bgf, ggf
+
+
+def test_scorer_matches_batch_prediction(fitted, tmp_path):
+    summary, bgf, ggf = fitted
+    args = summary["frequency"], summary["recency"], summary["T"], summary["monetary"]
+    clv = predict_horizons(bgf, ggf, *args, horizons=(), clv_months=(3,))["clv_3"]
+    segments = pd.qcut(clv, 4, labels=["D", "C", "B", "A"])
+
+    scorer = CLTVScorer.from_models(bgf, ggf, clv, month=3)
+    scorer.save(tmp_path / "cltv_scorer.json")
+    scorer = CLTVScorer.load(tmp_path / "cltv_scorer.json")
+
+    batch = scorer.score_batch(*args)
+    np.testing.assert_allclose(batch["clv"], clv, rtol=1e-12)
+    # A customer exactly on a quartile edge can fall on either side by the last bit of its CLTV
+    edges = np.array(freeze_cut_points(clv))
+    off_edge = ~np.isclose(clv.to_numpy()[:, None], edges[None, :], rtol=1e-12, atol=0).any(axis=1)
+    np.testing.assert_array_equal(np.asarray(batch["segment"])[off_edge], segments.astype(str).to_numpy()[off_edge])
+    single = scorer.score(*(col.iloc[0] for col in args))
+    assert single == {"clv": pytest.approx(clv.iloc[0], rel=1e-12), "segment": segments.iloc[0]}
+
+
+def test_scoring_import_is_light():
+    code = ("import sys\n"
+            "import crmUtils.scoring\n"
+            "loaded = {'pandas', 'scipy.optimize'} & set(sys.modules)\n"
+            "assert not loaded, loaded\n")
+    subprocess.run([sys.executable, "-c", code], check=True, cwd=REPO_ROOT)
@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from crmUtils.segments import SEG_MAP, assign_segments
+
+# An RFM seg_map with a regex that leaves some score strings unmatched, they keep the score string
+RFM_SEG_MAP = {r'5[4-5][4-5]': 'champions',
+               r'[1-2].[1-2]': 'low_value',
+               r'3..': 'middle'}
+
+
+def _scores(n_scores, size=5_000, seed=0):
+    rng = np.random.default_rng(seed)
+    index = pd.Index(rng.permutation(size) + 12346.0, name="Customer ID")
+    return [pd.Series(pd.Categorical(rng.integers(1, 6, size), categories=[1, 2, 3, 4, 5]), index=index)
+            for _ in range(n_scores)]
+
+
+@pytest.mark.parametrize("seg_map, n_scores", [(SEG_MAP, 2), (RFM_SEG_MAP, 3)])
+def test_assign_segments_matches_regex_replace(seg_map, n_scores):
+    scores = _scores(n_scores)
+    # The string column and regex replace of the scripts
+    score_string = scores[0].astype(str)
+    for score in scores[1:]:
+        score_string = score_string + score.astype(str)
+    expected = score_string.replace(seg_map, regex=True)
+
+    segments = assign_segments(*scores, seg_map=seg_map)
+    assert isinstance(segments.dtype, pd.CategoricalDtype)
+    pd.testing.assert_series_equal(segments.astype(str), expected, check_names=False)
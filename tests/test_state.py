@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from crmUtils.pipeline import cltv_c_dag, rfm_dag
+from crmUtils.state import CustomerStateStore
+from crmUtils.synthetic import online_retail_transactions
+
+
+@pytest.fixture(scope="module")
+def transactions():
+    # The read_excel layout (float ids), with returns outside cancellation invoices and a customer
+    # whose only lines have Quantity 0, which create_cltv_c leaves out
+    df = online_retail_transactions(100_000, seed=10).astype({"Customer ID": "float64"})
+    rng = np.random.default_rng(10)
+    returns = ~df["Cancelled"] & (rng.random(len(df)) < 0.05)
+    df.loc[returns, "Quantity"] = -rng.integers(0, 3, returns.sum()).astype(np.int32)
+    zero_only = df["Customer ID"] == df["Customer ID"].dropna().iloc[0]
+    df.loc[zero_only & ~df["Cancelled"], "Quantity"] = 0
+    return df
+
+
+@pytest.fixture(scope="module")
+def store(transactions, tmp_path_factory):
+    path = tmp_path_factory.mktemp("state") / "customer_state.parquet"
+    store = CustomerStateStore()
+    for i, (_, batch) in enumerate(transactions.groupby(transactions["InvoiceDate"].dt.to_period("M"))):
+        store.update(batch)
+        if i == 5:
+            store.save(path)
+            store = CustomerStateStore(path)
+    return store
+
+
+def test_rfm_matches_create_rfm(store, transactions):
+    pd.testing.assert_frame_equal(store.rfm(pd.Timestamp(2011, 12, 11)), rfm_dag().run(transactions),
+                                  check_dtype=False)
+
+
+def test_cltv_c_matches_create_cltv_c(store, transactions):
+    pd.testing.assert_frame_equal(store.cltv_c(), cltv_c_dag().run(transactions), check_dtype=False)
@@ -0,0 +1,49 @@
+import datetime as dt
+
+import pandas as pd
+import pytest
+
+from crmUtils.rfm import rfm_metrics
+from crmUtils.streaming import clean_chunk, stream_rfm_metrics, stream_state
+from crmUtils.synthetic import online_retail_transactions
+
+TODAY = dt.datetime(2011, 12, 11)
+
+
+@pytest.fixture(scope="module")
+def transactions():
+    return online_retail_transactions(60_000, seed=11)
+
+
+@pytest.fixture(scope="module")
+def parquet_path(transactions, tmp_path_factory):
+    path = tmp_path_factory.mktemp("streaming") / "online_retail_II.parquet"
+    transactions.to_parquet(path, row_group_size=7_000)
+    return str(path)
+
+
+def _chunks(df, size):
+    return (df.iloc[start:start + size] for start in range(0, len(df), size))
+
+
+@pytest.mark.parametrize("invoices_contiguous", [True, False])
+def test_stream_rfm_metrics_matches_rfm_metrics(transactions, invoices_contiguous):
+    expected = rfm_metrics(clean_chunk(transactions), TODAY)
+    rfm = stream_rfm_metrics(_chunks(transactions, 4_999), TODAY, invoices_contiguous=invoices_contiguous)
+    pd.testing.assert_frame_equal(rfm, expected)
+
+
+def test_stream_parquet_row_groups(transactions, parquet_path):
+    expected = rfm_metrics(clean_chunk(transactions), TODAY)
+    pd.testing.assert_frame_equal(stream_rfm_metrics(parquet_path, TODAY), expected)
+
+
+def test_streamed_state_matches_create_cltv_c(transactions):
+    # The groupby with Python lambdas of create_cltv_c
+    df = clean_chunk(transactions, positive_quantity=True)
+    expected = df.groupby("Customer ID").agg({"Invoice": lambda x: x.nunique(),
+                                              "Quantity": lambda x: x.sum(),
+                                              "TotalPrice": lambda x: x.sum()})
+    expected.columns = ["frequency", "total_unit", "total_price"]
+    state = stream_state(_chunks(transactions, 4_999), positive_quantity=True)
+    pd.testing.assert_frame_equal(state[["frequency", "total_unit", "total_price"]], expected, check_dtype=False)
@@ -0,0 +1,53 @@
+import datetime as dt
+
+import pandas as pd
+import pytest
+
+from crmUtils.summary import cltv_summary
+from crmUtils.synthetic import online_retail_transactions
+
+TODAY = dt.datetime(2011, 12, 11)
+
+
+def _prepared():
+    # Data preparation of CltvPrediction.py on synthetic online_retail_II lines
+    df = online_retail_transactions(20_000, seed=2)
+    df = df.dropna(subset=["Customer ID"])
+    df = df[~df["Invoice"].astype(str).str.contains("C", na=False)]
+    df = df[(df["Quantity"] > 0) & (df["Price"] > 0)]
+    return df.assign(TotalPrice=df["Quantity"] * df["Price"])
+
+
+def _lambda_summary(df, today_date, days):
+    # The groupby with Python lambdas of CltvPrediction.py
+    cltv_df = df.groupby("Customer ID", observed=True).agg({
+        "InvoiceDate": [lambda date: (date.max() - date.min()).days,
+                        lambda date: (today_date - date.min()).days],
+        "Invoice": lambda date: date.nunique(),
+        "TotalPrice": lambda price: price.sum()})
+    cltv_df.columns = ["recency", "T", "frequency", "monetary"]
+    cltv_df["monetary"] = cltv_df["monetary"] / cltv_df["frequency"]
+    cltv_df = cltv_df[cltv_df["frequency"] > 1]
+    cltv_df["recency"] = cltv_df["recency"] / days
+    cltv_df["T"] = cltv_df["T"] / days
+    return cltv_df
+
+
+@pytest.mark.parametrize("freq, days", [("D", 1), ("W", 7)])
+def test_cltv_summary_matches_lambda_groupby(freq, days):
+    df = _prepared()
+    pd.testing.assert_frame_equal(cltv_summary(df, TODAY, freq=freq), _lambda_summary(df, TODAY, days),
+                                  check_dtype=False)
+
+
+def test_cltv_summary_rejects_unknown_freq():
+    with pytest.raises(ValueError):
+        cltv_summary(_prepared(), TODAY, freq="Y")
+
+
+@pytest.mark.parametrize("where", ["empty", "filtered", "no_ids"])
+def test_cltv_summary_of_no_customers_is_empty(where):
+    df = _prepared()
+    df = {"empty": df.iloc[:0], "filtered": df[df["Price"] < 0],
+          "no_ids": df.assign(**{"Customer ID": df["Customer ID"].where(df["Price"] < 0)})}[where]
+    pd.testing.assert_frame_equal(cltv_summary(df, TODAY), cltv_summary(_prepared(), TODAY).iloc[:0])
@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+from crmUtils.pipeline import cltv_p_dag
+from crmUtils.prediction import predict_horizons
+from crmUtils.sweep import cltv_sweep, fit_penalizers
+from crmUtils.synthetic import online_retail_transactions
+
+
+@pytest.fixture(scope="module")
+def summary():
+    df = online_retail_transactions(50_000, seed=8, start="2010-06-01")
+    return cltv_p_dag().run(df, target="summary")
+
+
+def test_sweep_matches_predict_horizons(summary):
+    args = summary["frequency"], summary["recency"], summary["T"], summary["monetary"]
+    sweep = cltv_sweep(*args, months=(1, 3, 6), discount_rates=(0.0, 0.01, 0.05), penalizers=(0.001, 0.01),
+                       profit_margins=(0.25, 1.0), n_workers=1)
+    assert len(sweep) == len(summary) * 3 * 3 * 2 * 2
+
+    models = fit_penalizers(*args, penalizers=(0.001, 0.01), n_workers=1)
+    for (penalizer_coef, discount_rate, margin), scenario in sweep.groupby(
+            ["penalizer_coef", "discount_rate", "profit_margin"]):
+        predictions = predict_horizons(*models[penalizer_coef], *args, horizons=(), clv_months=(1, 3, 6),
+                                       discount_rate=discount_rate)
+        for month in (1, 3, 6):
+            rows = scenario[scenario["month"] == month]
+            np.testing.assert_array_equal(rows["Customer ID"], summary.index)
+            np.testing.assert_allclose(rows["clv"], predictions[f"clv_{month}"] * margin, rtol=1e-12)
+            np.testing.assert_array_equal(rows["expected_average_profit"], predictions["expected_average_profit"])